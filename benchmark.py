@@ -0,0 +1,159 @@
+# Use this to measure what encrypting transfers costs compared to plaintext on the same machine.
+import os
+import sys
+import time
+import shutil
+import socket
+import hashlib
+import argparse
+import tempfile
+import threading
+import statistics
+import contextlib
+import io
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from termcolor import colored
+
+curr_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(curr_dir))
+
+from user import User
+from security import SecureTransport, SecureChannel
+
+class TransferBenchmark(object):
+    """
+    Class measuring the data path of a file transfer over loopback TCP, in plaintext and over a `SecureChannel`
+    negotiated by two real `SecureTransport`s. The sender sends `chunk_size` bytes per call and the receiver reads
+    `recv_size` bytes per call, like `DataSharing._send_file` and `DataSharing.file_receiving`; with `full`, the
+    receiver also hashes and writes what it receives, as `file_receiving` does.
+    """
+    def __init__(self, size:int=256*1024*1024, chunk_size:int=64*1024, recv_size:int=4*1024, runs:int=5, full:bool=False):
+        """
+        Args:
+            size (int): Bytes sent per run. Defaults to 256MB.
+            chunk_size (int): Bytes per send call. Defaults to 64KB (`Radar.transfer_plan` of an unmeasured link).
+            recv_size (int): Bytes per receive call. Defaults to 4KB (the default `file_packet_size` of `DataSharing`).
+            runs (int): Runs per mode; the median is reported. Defaults to 5.
+            full (bool): Whether the receiver hashes and writes the data to disk. Defaults to False.
+        """
+        assert size > 0 and chunk_size > 0 and recv_size > 0 and runs > 0, "sizes and runs must be positive"
+        self.size = size
+        self.chunk_size = chunk_size
+        self.recv_size = recv_size
+        self.runs = runs
+        self.full = full
+        self.root_dir = tempfile.mkdtemp(prefix="interact_bench_")
+        self.payload = os.urandom(chunk_size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.transports = {}
+            for name in ("Sender", "Receiver"):
+                user = User(root_usr_dir=os.path.join(self.root_dir, name))
+                user.update_user(name=name, ip_address='127.0.0.1', file_transfer_port=0)
+                self.transports[name] = SecureTransport(os.path.join(self.root_dir, name), user)
+
+    def _receive(self, server:socket.socket, secure:bool, result:dict):
+        sock, _ = server.accept()
+        if secure:
+            sock = self.transports["Receiver"].accept(sock)
+        digest = hashlib.sha256()
+        received = 0
+        with sock, open(os.path.join(self.root_dir, "received.bin"), 'wb') if self.full else contextlib.nullcontext() as f:
+            while received < self.size:
+                data = sock.recv(self.recv_size)
+                if not data:
+                    break
+                if f is not None:
+                    digest.update(data)
+                    f.write(data)
+                received += len(data)
+        result['received'] = received
+
+    def run_once(self, secure:bool):
+        """
+        Sends `size` bytes once.
+
+        Returns:
+            float: Throughput in bytes per second, from the first byte sent (after the handshake) to the last byte received.
+        """
+        server = socket.create_server(('127.0.0.1', 0))
+        result = {}
+        receiver = threading.Thread(target=self._receive, args=(server, secure, result), daemon=True)
+        receiver.start()
+        sock = socket.create_connection(server.getsockname())
+        if secure:
+            sock = self.transports["Sender"].connect(sock, "Receiver")
+        with sock:
+            start = time.perf_counter()
+            sent = 0
+            while sent < self.size:
+                sock.sendall(self.payload[:self.size - sent])
+                sent += min(self.chunk_size, self.size - sent)
+            receiver.join()
+            elapsed = time.perf_counter() - start
+        server.close()
+        assert result['received'] == self.size, "the receiver did not get all the data"
+        return self.size / elapsed
+
+    def crypto_seconds_per_gb(self):
+        """
+        Measures the CPU time of encrypting and decrypting 1GB in `SecureChannel` frames, without any I/O.
+        """
+        cipher = AESGCM(os.urandom(32))
+        frame = os.urandom(SecureChannel.MAX_FRAME_SIZE)
+        nonce, header = bytes(12), bytes(4)
+        count = 256 * 1024 * 1024 // len(frame)
+        start = time.process_time()
+        for _ in range(count):
+            cipher.decrypt(nonce, cipher.encrypt(nonce, frame, header), header)
+        return (time.process_time() - start) * (1024 ** 3) / (count * len(frame))
+
+    def run(self):
+        """
+        Runs every mode `runs` times, alternating plaintext and encrypted runs so both see the same conditions.
+
+        Returns:
+            dict: Median `plaintext` and `encrypted` throughputs (bytes/s), the `overhead` of encryption (fraction of
+            the plaintext throughput lost) and `crypto_seconds_per_gb`.
+        """
+        results = {False: [], True: []}
+        self.run_once(False) # warm up
+        for _ in range(self.runs):
+            for secure in (False, True):
+                results[secure].append(self.run_once(secure))
+        plaintext, encrypted = statistics.median(results[False]), statistics.median(results[True])
+        return {
+            'plaintext': plaintext,
+            'encrypted': encrypted,
+            'overhead': 1 - encrypted / plaintext,
+            'crypto_seconds_per_gb': self.crypto_seconds_per_gb()
+        }
+
+    def close(self):
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare plaintext and encrypted transfer throughput over loopback.")
+    parser.add_argument('--size', type=int, default=256, help="Megabytes sent per run.")
+    parser.add_argument('--chunk', type=int, default=64*1024, help="Bytes per send call.")
+    parser.add_argument('--recv-size', type=int, default=4*1024, help="Bytes per receive call.")
+    parser.add_argument('--runs', type=int, default=5, help="Runs per mode (the median is reported).")
+    parser.add_argument('--full', action='store_true', help="Hash and write the received data to disk, like a real transfer.")
+    parser.add_argument('--target', type=float, default=10.0, help="Largest acceptable overhead of encryption, in percent.")
+    args = parser.parse_args()
+
+    benchmark = TransferBenchmark(size=args.size * 1024 * 1024, chunk_size=args.chunk, recv_size=args.recv_size, runs=args.runs, full=args.full)
+    try:
+        result = benchmark.run()
+    finally:
+        benchmark.close()
+    plaintext, encrypted = result['plaintext'] / 1024 ** 2, result['encrypted'] / 1024 ** 2
+    crypto = result['crypto_seconds_per_gb']
+    budget = args.target / 100 / crypto * 1024 # MB/s that fit in the target share of one core
+    overhead = 100 * result['overhead']
+    met = overhead < args.target
+    print(f"Plaintext: {colored(f'{plaintext:.0f} MB/s', 'light_yellow')}")
+    print(f"Encrypted: {colored(f'{encrypted:.0f} MB/s', 'light_yellow')}")
+    print(f"Encrypting and decrypting: {colored(f'{crypto:.2f} CPU s/GB', 'light_cyan')} "
+          f"- links up to {colored(f'{budget:.0f} MB/s', 'light_cyan')} cost less than {args.target:.0f}% of one core")
+    print(f"Overhead of encryption: {colored(f'{overhead:.1f}%', 'green' if met else 'red')} "
+          f"({'meets' if met else 'misses'} the {args.target:.0f}% target)")
@@ -1,3 +1,485 @@
 # Use this to create functions and classes to handle communication in the Social Interact setup.
 # Note that the communication needs to be handled in a way that it can be used across different devices and platforms.
-# The communication should be secure, reliable and efficient.
\ No newline at end of file
+# The communication should be secure, reliable and efficient.
+import os
+import sys
+import json
+import socket
+import struct
+import random
+import hashlib
+import threading
+import time
+import pandas as pd
+from termcolor import colored
+
+curr_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(curr_dir))
+
+from user import User
+from group import GroupStore
+from security import SecureTransport
+
+class ReplicaState(object):
+    """
+    Class holding the versioned view of the state that devices keep in sync - groups, communities and contacts.
+    """
+    NUM_BUCKETS = 256
+    MAX_CLOCK_STEP = 1000 # how far ahead of the local clock a received version may be
+
+    def __init__(self, root_dir:str, curr_device:User, group_store:GroupStore):
+        """
+        Initialises the replica state. \\
+        Every entry (`group:<name>`, `community:<name>`, `contact:<name>`) carries a version `(counter, origin)`:
+        a Lamport counter and the name of the device that made the change, so concurrent changes are resolved the
+        same way on every device (the higher version wins). Local changes are detected by hashing the entries and
+        comparing against the hash recorded with their version. Deleted groups and communities are kept as
+        tombstones (no value) so the deletion spreads as well. \\
+        Entries are spread over `NUM_BUCKETS` buckets; each bucket hash is the XOR of the hashes of its entries'
+        versions and is updated incrementally, so the digest of the whole state (a one-level Merkle tree) is
+        always at hand.
+
+        Args:
+            root_dir (str): The root directory where the data is stored. Versions are kept in `<root_dir>/sync`.
+            curr_device (User): The current device.
+            group_store (GroupStore): The groups of the current device.
+        """
+        self.curr_device = curr_device
+        self.group_store = group_store
+        self.community_file = os.path.join(group_store.root_grp_dir, "communities.csv")
+        self.sync_dir = os.path.join(root_dir, "sync")
+        if not os.path.exists(self.sync_dir):
+            os.makedirs(self.sync_dir)
+        self.versions_file = os.path.join(self.sync_dir, "versions.json")
+        self.lock = threading.RLock()
+
+        self.versions = {} # key -> [counter, origin, value hash (None for tombstones)]
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.clock = 0
+        if os.path.exists(self.versions_file):
+            with open(self.versions_file, 'r', encoding='utf-8') as f:
+                for key, version in json.load(f).items():
+                    self._set_version(key, version)
+
+    @staticmethod
+    def _value_hash(value):
+        return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _entry_hash(key:str, version:list):
+        return int.from_bytes(hashlib.sha256(f"{key}|{version[0]}|{version[1]}".encode('utf-8')).digest()[:8], 'big')
+
+    def _bucket(self, key:str):
+        return hashlib.sha256(key.encode('utf-8')).digest()[0] % self.NUM_BUCKETS
+
+    def _set_version(self, key:str, version:list):
+        bucket = self._bucket(key)
+        if key in self.versions:
+            self.buckets[bucket] ^= self._entry_hash(key, self.versions[key])
+        self.versions[key] = list(version)
+        self.buckets[bucket] ^= self._entry_hash(key, version)
+        self.clock = max(self.clock, version[0])
+
+    def _save(self):
+        temp_file = self.versions_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.versions, f)
+        os.replace(temp_file, self.versions_file)
+
+    def _read_communities(self):
+        if not os.path.exists(self.community_file):
+            return pd.DataFrame(columns=['name', 'description', 'groups', 'members'])
+        return pd.read_csv(self.community_file, dtype=str, keep_default_na=False)
+
+    def snapshot(self):
+        """
+        Reads the current local value of every entry.
+
+        Returns:
+            dict: Maps each entry key to its JSON-serialisable value.
+        """
+        entries = {}
+        for name in list(self.group_store.groups):
+            group = self.group_store.export_group(name)
+            if group is not None:
+                entries[f"group:{name}"] = group
+        for _, row in self._read_communities().iterrows():
+            entries[f"community:{row['name']}"] = {
+                'description': row['description'],
+                'groups': [group for group in row['groups'].split(';') if group],
+                'members': [member for member in row['members'].split(';') if member]
+            }
+        with self.curr_device.lock:
+            contacts = self.curr_device.contacts[['name', 'ip_address', 'port']].copy()
+        for _, row in contacts.iterrows():
+            if pd.isna(row['port']) or pd.isna(row['ip_address']) or str(row['name']).startswith('Unknown'):
+                continue
+            entries[f"contact:{row['name']}"] = {'ip_address': str(row['ip_address']), 'port': int(row['port'])}
+        return entries
+
+    def refresh(self):
+        """
+        Gives a new version to every entry that changed locally since it was last versioned, and a tombstone to
+        every group or community that disappeared.
+
+        Returns:
+            dict: The snapshot of the local entries (see `snapshot`).
+        """
+        entries = self.snapshot()
+        with self.lock:
+            changed = False
+            for key, value in entries.items():
+                value_hash = self._value_hash(value)
+                if key not in self.versions or self.versions[key][2] != value_hash:
+                    self._set_version(key, [self.clock + 1, self.curr_device.name, value_hash])
+                    changed = True
+            for key, version in list(self.versions.items()):
+                if key not in entries and version[2] is not None and not key.startswith('contact:'):
+                    self._set_version(key, [self.clock + 1, self.curr_device.name, None])
+                    changed = True
+            if changed:
+                self._save()
+        return entries
+
+    def digest(self):
+        """
+        Get the digest of the state.
+
+        Returns:
+            tuple: The root hash (hex) and the list of bucket hashes.
+        """
+        with self.lock:
+            buckets = list(self.buckets)
+        root = hashlib.sha256(b''.join(bucket.to_bytes(8, 'big') for bucket in buckets)).hexdigest()
+        return root, buckets
+
+    def versions_in(self, buckets:list):
+        """
+        Get the versions of the entries in the given buckets.
+
+        Returns:
+            dict: Maps entry keys to `[counter, origin]`.
+        """
+        buckets = set(buckets)
+        with self.lock:
+            return {key: version[:2] for key, version in self.versions.items() if self._bucket(key) in buckets}
+
+    def compare(self, remote_versions:dict, buckets:list):
+        """
+        Compares the versions of another device with the local ones over the given buckets.
+
+        Args:
+            remote_versions (dict): The versions of the other device (see `versions_in`).
+            buckets (list): The buckets the versions cover.
+
+        Returns:
+            tuple: The keys that are newer locally (to send) and the keys that are newer remotely (to request).
+        """
+        local_versions = self.versions_in(buckets)
+        newer_local = [key for key, version in local_versions.items()
+                       if key not in remote_versions or tuple(version) > tuple(remote_versions[key])]
+        newer_remote = [key for key, version in remote_versions.items()
+                        if key not in local_versions or tuple(version) > tuple(local_versions[key])]
+        return newer_local, newer_remote
+
+    def entries(self, keys:list, snapshot:dict):
+        """
+        Get the versions and values of the given entries, to be sent to another device.
+
+        Returns:
+            dict: Maps entry keys to `[version, value]` (value is None for tombstones).
+        """
+        with self.lock:
+            return {key: [self.versions[key][:2], snapshot.get(key)] for key in keys if key in self.versions}
+
+    def trusts(self, name:str):
+        """
+        Checks whether a device may change the replicated state: it must be a contact whose identity is pinned, or
+        a member of one of the groups. The name must be the authenticated name of the device. \\
+        Changes to groups are further authorized one by one (see `may_change_group`).
+        """
+        with self.curr_device.lock:
+            is_contact = not self.curr_device.get_contacts_by_name(name).empty
+        return (is_contact and self.curr_device.get_public_key(name) is not None) or bool(self.group_store.get_groups_of(name))
+
+    def may_change_group(self, sender:str, name:str, value):
+        """
+        Checks whether a device may make a change to a group. An existing group may only be changed or deleted by
+        one of its admins (as the group stands locally), and an admin may not change their own role. A group that
+        does not exist locally is an invitation: it is only taken from a contact whose identity is pinned and who is
+        its admin, and only if the current device is one of its members.
+
+        Args:
+            sender (str): The authenticated name of the device the change comes from.
+            name (str): The name of the group.
+            value (dict): The new state of the group (see `GroupStore.export_group`), or None to delete it.
+
+        Returns:
+            bool: True if the change may be applied, False otherwise.
+        """
+        local = self.group_store.export_group(name)
+        if local is None:
+            if value is None or value['members'].get(sender) != 'admin' or self.curr_device.name not in value['members']:
+                return False
+            with self.curr_device.lock:
+                is_contact = not self.curr_device.get_contacts_by_name(sender).empty
+            return is_contact and self.curr_device.get_public_key(sender) is not None
+        if local['members'].get(sender) != 'admin':
+            return False
+        return value is None or value['members'].get(sender) == 'admin'
+
+    def apply(self, entries:dict, sender:str):
+        """
+        Applies entries received from another device. Entries that are not newer than the local ones are ignored,
+        and so is everything from a device that is not trusted (see `trusts`), changes to groups the device may not
+        make (see `may_change_group`) and versions more than `MAX_CLOCK_STEP` ahead of the local clock - otherwise
+        one device could give its changes a counter no other change would ever beat. A device that is far behind
+        catches up by `MAX_CLOCK_STEP` per round. \\
+        The endpoint of a contact whose identity is pinned is never taken from gossip - it is only learned from the
+        contact itself - so the entry is acknowledged (its version recorded) without changing the contact. \\
+        Groups go through the group store journal, communities and contacts are written once for the whole batch.
+
+        Args:
+            entries (dict): Maps entry keys to `[version, value]` (see `entries`).
+            sender (str): The authenticated name of the device the entries come from.
+
+        Returns:
+            int: The number of entries applied.
+        """
+        if not self.trusts(sender):
+            print(f"Ignored {len(entries)} change(s) from {colored(sender, 'blue')}: only pinned contacts and group members may change groups, communities and contacts.")
+            return 0
+        applied, communities, contacts, kept, rejected = [], {}, [], [], []
+        with self.lock:
+            max_counter = self.clock + self.MAX_CLOCK_STEP
+            for key, (version, value) in entries.items():
+                if not isinstance(version[0], int) or version[0] > max_counter:
+                    rejected.append(key)
+                    continue
+                local = self.versions.get(key)
+                if local is not None and tuple(local[:2]) >= tuple(version):
+                    continue
+                kind, _, name = key.partition(':')
+                if kind == 'group':
+                    if not self.may_change_group(sender, name, value):
+                        rejected.append(key)
+                        continue
+                    if value is None:
+                        self.group_store.delete_group(name)
+                    else:
+                        self.group_store.replace_group(name, value)
+                elif kind == 'community':
+                    communities[name] = value
+                elif kind == 'contact':
+                    with self.curr_device.lock:
+                        is_contact = not self.curr_device.get_contacts_by_name(name).empty
+                    if is_contact and self.curr_device.get_public_key(name) is not None:
+                        kept.append((key, version))
+                        continue
+                    if value is not None:
+                        contacts.append(dict(value, name=name))
+                else:
+                    continue
+                applied.append((key, version, value))
+
+            if communities:
+                community = self._read_communities()
+                community = community[~community['name'].isin(communities)]
+                community = pd.concat([community, pd.DataFrame([
+                    {'name': name, 'description': value['description'], 'groups': ';'.join(value['groups']), 'members': ';'.join(value['members'])}
+                    for name, value in communities.items() if value is not None
+                ], columns=['name', 'description', 'groups', 'members'])], ignore_index=True)
+                community.to_csv(self.community_file, index=False)
+                self.curr_device.csv_writes.inc(file='communities.csv')
+            if contacts:
+                self.curr_device.merge_contacts(contacts)
+
+            for key, version, value in applied:
+                self._set_version(key, [version[0], version[1], self._value_hash(value) if value is not None else None])
+            if kept:
+                local = self.snapshot()
+                for key, version in kept:
+                    self._set_version(key, [version[0], version[1], self._value_hash(local[key]) if key in local else None])
+            if applied or kept:
+                self._save()
+        if rejected:
+            print(f"Ignored {len(rejected)} change(s) from {colored(sender, 'blue')}: {', '.join(rejected)} (only admins may change a group, and not their own role, and versions may not run more than {self.MAX_CLOCK_STEP} ahead of the local clock).")
+        return len(applied)
+
+class GossipSync(object):
+    """
+    Class to keep groups, communities and contacts in sync between devices through gossip (anti-entropy).
+    """
+    HEADER = struct.Struct('!I')
+    MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, root_dir:str, curr_device:User, radar, group_store:GroupStore, transport:SecureTransport, sync_port:int=12347, interval:float=30.0):
+        """
+        Initialises the gossip. \\
+        Every `interval` seconds the device picks a random online peer and reconciles with it:
+        1. The initiator sends the root hash of its state; if the peer's matches, they are in sync.
+        2. Otherwise the peer replies with its bucket hashes and the initiator sends its versions for the
+           buckets that differ.
+        3. The peer replies with the entries it has newer and asks for the ones the initiator has newer,
+           which the initiator sends back and the peer acknowledges once applied.
+        Apart from the fixed-size bucket hashes, only the entries of buckets that differ cross the network,
+        so the cost of converging grows with the size of the change rather than with the size of the state. \\
+        Messages are length-prefixed JSON over an encrypted channel (see `SecureTransport`) on the sync port
+        (`12347` by default, the same on every device). Devices only sync with devices they trust - pinned contacts
+        and group members (see `ReplicaState.trusts`) - so no other device can read or change the state.
+
+        Args:
+            root_dir (str): The root directory where the data is stored.
+            curr_device (User): The current device.
+            radar (Radar): The radar whose discovered devices are the gossip peers.
+            group_store (GroupStore): The groups of the current device.
+            transport (SecureTransport): The transport used to authenticate peers and encrypt the sync.
+            sync_port (int): The port on which the sync server listens. Defaults to 12347.
+            interval (float): Seconds between gossip rounds. Defaults to 30.
+        """
+        assert isinstance(curr_device, User), "curr_device must be an instance of User"
+        assert isinstance(group_store, GroupStore), "group_store must be an instance of GroupStore"
+        self.curr_device = curr_device
+        self.radar = radar
+        self.transport = transport
+        self.state = ReplicaState(root_dir, curr_device, group_store)
+        self.sync_port = sync_port
+        self.interval = interval
+        self.is_gossiping = threading.Event()
+
+    def _send(self, sock, message:dict):
+        data = json.dumps(message).encode('utf-8')
+        sock.sendall(self.HEADER.pack(len(data)) + data)
+
+    def _recv_exactly(self, sock, size:int):
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(min(size - len(data), 1024 * 1024))
+            if not chunk:
+                raise ConnectionResetError("Peer closed the connection during sync.")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _recv(self, sock):
+        size, = self.HEADER.unpack(self._recv_exactly(sock, self.HEADER.size))
+        assert size <= self.MAX_MESSAGE_SIZE, f"Sync message of {size} bytes is too large."
+        return json.loads(self._recv_exactly(sock, size).decode('utf-8'))
+
+    def sync_with(self, name:str, ip_address:str, timeout:float=10.0):
+        """
+        Reconciles the state with one device.
+
+        Args:
+            name (str): The name of the device.
+            ip_address (str): The IP address of the device.
+            timeout (float): Timeout of the connection in seconds. Defaults to 10.
+
+        Returns:
+            dict: `received` and `sent` entry counts, and `in_sync` if nothing had to be exchanged.
+
+        Raises:
+            AssertionError: If the device is not trusted (see `ReplicaState.trusts`).
+        """
+        assert self.state.trusts(name), f"{name} is not a pinned contact or a group member."
+        snapshot = self.state.refresh()
+        root, buckets = self.state.digest()
+        sock = socket.create_connection((ip_address, self.sync_port), timeout=timeout)
+        try:
+            sock = self.transport.connect(sock, name)
+        except Exception:
+            sock.close()
+            raise
+        with sock:
+            self._send(sock, {'type': 'digest', 'root': root, 'name': self.curr_device.name})
+            reply = self._recv(sock)
+            if reply['type'] == 'in_sync':
+                return {'in_sync': True, 'received': 0, 'sent': 0}
+            differing = [bucket for bucket, (local, remote) in enumerate(zip(buckets, reply['buckets'])) if local != remote]
+            self._send(sock, {'type': 'versions', 'buckets': differing, 'versions': self.state.versions_in(differing)})
+            reply = self._recv(sock)
+            received = self.state.apply(reply['entries'], sock.peer_name)
+            outgoing = self.state.entries(reply['want'], snapshot)
+            self._send(sock, {'type': 'entries', 'entries': outgoing})
+            self._recv(sock) # the peer acknowledges once it has applied them
+        return {'in_sync': False, 'received': received, 'sent': len(outgoing)}
+
+    def _serve(self, sock, address):
+        """
+        Answers one reconciliation started by another device (see `sync_with`).
+        """
+        try:
+            with sock:
+                sock.settimeout(10)
+                sock = self.transport.accept(sock)
+                if not self.state.trusts(sock.peer_name):
+                    print(f"Refused to sync with {colored(sock.peer_name, 'blue')}: not a pinned contact or a group member.")
+                    return
+                message = self._recv(sock)
+                snapshot = self.state.refresh()
+                root, buckets = self.state.digest()
+                if message['root'] == root:
+                    self._send(sock, {'type': 'in_sync'})
+                    return
+                self._send(sock, {'type': 'buckets', 'buckets': buckets})
+                message = self._recv(sock)
+                newer_local, newer_remote = self.state.compare(message['versions'], message['buckets'])
+                self._send(sock, {'type': 'entries', 'entries': self.state.entries(newer_local, snapshot), 'want': newer_remote})
+                message = self._recv(sock)
+                self._send(sock, {'type': 'done', 'applied': self.state.apply(message['entries'], sock.peer_name)})
+        except (socket.error, ConnectionResetError, ValueError, KeyError, AssertionError) as e:
+            print(f"Sync with {colored(address[0], 'cyan')} failed: {e}")
+
+    def server(self):
+        """
+        Serves sync requests from other devices. This method is intended to be run in a separate thread.
+        """
+        sync_socket = None
+        try:
+            if socket.has_dualstack_ipv6():
+                sync_socket = socket.create_server(('', self.sync_port), family=socket.AF_INET6, backlog=16, dualstack_ipv6=True)
+            else:
+                sync_socket = socket.create_server(('', self.sync_port), backlog=16)
+            while True:
+                sock, address = sync_socket.accept()
+                threading.Thread(target=self._serve, args=(sock, address),
+                                 name=f"Sync_Thread-{address[0]}:{address[1]}",
+                                 daemon=True).start()
+        except OSError as e:
+            print(f"Socket error: {e}. Sync port might be already in use. Please try a different port.")
+        finally:
+            if sync_socket:
+                sync_socket.close()
+
+    def _peers(self):
+        return [(device['name'], self.radar.paths(device['name'])[0]) for device in list(self.radar.devices)
+                if device['status'] == 'online' and device['name'] != self.curr_device.name and self.state.trusts(device['name'])]
+
+    def gossip_loop(self):
+        """
+        Reconciles with a random online peer every `interval` seconds (with jitter, so devices do not sync in lockstep).
+        """
+        while self.is_gossiping.is_set():
+            peers = self._peers()
+            if peers:
+                name, ip_address = random.choice(peers)
+                try:
+                    self.sync_with(name, ip_address)
+                except (socket.error, ConnectionResetError, ValueError, KeyError, AssertionError):
+                    pass # the peer may be gone or not run the sync server; another one is picked next round
+            time.sleep(self.interval * random.uniform(0.5, 1.5))
+
+    def start(self):
+        """
+        Starts the sync server and the gossip rounds in background threads.
+        """
+        if self.is_gossiping.is_set():
+            return
+        self.is_gossiping.set()
+        threading.Thread(target=self.server, name='Sync_Server_Thread', daemon=True).start()
+        threading.Thread(target=self.gossip_loop, name='Gossip_Thread', daemon=True).start()
+
+    def stop(self):
+        """
+        Stops the gossip rounds. The sync server keeps answering other devices.
+        """
+        self.is_gossiping.clear()
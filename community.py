@@ -3,48 +3,235 @@ import sys
 import pandas as pd
 import json
 import argparse
+import ipaddress
+import threading
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
 
 from group import *
 
 class Community(object):
-    def __init__(self):
+    """
+    Class used for construction and management of communities - collections of groups.
+    """
+    def __init__(self, store:GroupStore, name:str=None):
         """
-        Initialise the class.
-        """
-    
-    def create_community(self):
+        Initialise the class. Communities are stored in `communities.csv` next to the groups of the `store`.
+
+        Args:
+            store (GroupStore): The group store holding the groups of the community.
+            name (str): The name of an existing community to load. Defaults to None (a new community).
+        """
+        self.store = store
+        self.community_file = os.path.join(self.store.root_grp_dir, "communities.csv")
+        if not os.path.exists(self.community_file):
+            pd.DataFrame(columns=['name', 'description', 'groups', 'members']).to_csv(self.community_file, index=False)
+
+        self.name = name
+        self.description = ""
+        self.groups = []
+        self.members = [] # members that joined the community directly, not through a group
+        if name is not None:
+            community = self._read()
+            row = community[community['name'] == name]
+            assert not row.empty, f"Community {name} does not exist."
+            self.description = row['description'].values[0]
+            self.groups = [group for group in row['groups'].values[0].split(';') if group]
+            self.members = [member for member in row['members'].values[0].split(';') if member]
+
+    def _read(self):
+        return pd.read_csv(self.community_file, dtype=str, keep_default_na=False)
+
+    def __str__(self):
+        return f"Community(name={self.name} \n description={self.description} \n groups={self.groups})"
+
+    def create_community(self, name:str, description:str=""):
         """
         Create a new community.
+
+        Args:
+            name (str): The name of the community.
+            description (str): The description of the community. Defaults to an empty string.
+
+        Raises:
+            AssertionError: If a community with the same name exists.
         """
+        assert name not in self._read()['name'].values, f"Community {name} already exists."
+        self.name = name
+        self.description = description
+        self.save_community()
 
     def update_community(self, **kwargs):
         """
         Update community details.
+
+        Args:
+            **kwargs: `description` of the community.
         """
-    
+        self.description = kwargs.get('description', self.description)
+        self.save_community()
+
     def save_community(self):
         """
         Save the community details to a file.
         """
-    
-    def add_groups(self):
+        assert self.name is not None, "Create the community before saving it."
+        community = self._read()
+        community = community[community['name'] != self.name]
+        community = pd.concat([community, pd.DataFrame({
+            'name': [self.name],
+            'description': [self.description],
+            'groups': [';'.join(self.groups)],
+            'members': [';'.join(self.members)]
+        })], ignore_index=True)
+        community.to_csv(self.community_file, index=False)
+
+    def add_groups(self, *args):
         """
         Add groups to the community.
+
+        Args:
+            *args: Names of the groups to be added.
+
+        Raises:
+            AssertionError: If a group does not exist.
         """
-    
-    def add_members(self):
+        for group in args:
+            assert self.store.get_group(group) is not None, f"Group {group} does not exist."
+        self.groups.extend(group for group in dict.fromkeys(args) if group not in self.groups)
+        self.save_community()
+
+    def add_members(self, *args):
         """
-        Add members to the community.
+        Add members to the community directly, without a group.
+
+        Args:
+            *args: Names of the members to be added.
+        """
+        self.members.extend(member for member in dict.fromkeys(args) if member not in self.members)
+        self.save_community()
+
+    def get_members(self):
+        """
+        Get every member of the community across its groups - each member appears once, however many groups they share.
+
+        Returns:
+            list: The member names.
         """
-    
+        members = dict.fromkeys(self.members)
+        for group in self.groups:
+            members.update(dict.fromkeys(self.store.get_members(group)))
+        return list(members)
+
     def set_community_roles(self, **kwargs):
         """
         Set roles for members in the community.
         """
-    
+
     def set_community_permissions(self, **kwargs):
         """
         Set permissions for members in the community.
         """
 
-    
\ No newline at end of file
+class BroadcastPlanner(object):
+    """
+    Class to plan and run the delivery of data to every device of a community.
+    """
+    def __init__(self, data_transferer, max_workers:int=8, per_network_limit:int=2):
+        """
+        Initialises the planner.
+
+        Args:
+            data_transferer (DataSharing): The data sharing instance used for the deliveries (its radar resolves the devices).
+            max_workers (int): Maximum number of deliveries in flight. Defaults to 8.
+            per_network_limit (int): Maximum number of deliveries in flight to the same network, since they share a link. Defaults to 2.
+        """
+        assert isinstance(max_workers, int) and max_workers > 0, "max_workers must be a positive integer"
+        assert isinstance(per_network_limit, int) and per_network_limit > 0, "per_network_limit must be a positive integer"
+        self.data_transferer = data_transferer
+        self.radar = data_transferer.radar
+        self.curr_device = data_transferer.curr_device
+        self.max_workers = max_workers
+        self.per_network_limit = per_network_limit
+
+    def _endpoint(self, member:str):
+        """
+        Get the best known endpoint of a member from the discovered devices, falling back to the contacts.
+
+        Returns:
+            tuple: `(ip_address, port, status)`, or None if the member is unknown.
+        """
+        device = next((d for d in self.radar.devices if d['name'] == member), None)
+        if device is not None:
+            return self.radar.paths(member)[0], int(device['port']), device['status']
+        contact = self.curr_device.get_contacts_by_name(member)
+        if not contact.empty:
+            return contact['ip_address'].values[0], int(contact['port'].values[0]), contact['status'].values[0]
+        return None
+
+    def plan(self, community:Community):
+        """
+        Resolves the devices of a community, removes duplicates (devices in several groups) and the current
+        device, and groups the reachable ones by network (/24 for IPv4, /64 for IPv6).
+
+        Args:
+            community (Community): The community to deliver to.
+
+        Returns:
+            dict: `networks` mapping each network to a list of `(name, ip_address, port)` targets, and
+            `unreachable` listing members that are offline or unknown.
+        """
+        networks, unreachable = {}, []
+        for member in community.get_members():
+            if member == self.curr_device.name:
+                continue
+            endpoint = self._endpoint(member)
+            if endpoint is None or endpoint[2] != 'online':
+                unreachable.append(member)
+                continue
+            ip_address, port, status = endpoint
+            try:
+                address = ipaddress.ip_address(ip_address.split('%')[0])
+                network = str(ipaddress.ip_network(f"{address}/{24 if address.version == 4 else 64}", strict=False))
+            except ValueError:
+                network = ip_address
+            networks.setdefault(network, []).append((member, ip_address, port))
+        return {'networks': networks, 'unreachable': unreachable}
+
+    def broadcast(self, filepath:str, community:Community):
+        """
+        Shares a file with every reachable device of a community exactly once, as one batched job. \\
+        Targets of different networks are interleaved and the number of deliveries in flight is bounded both
+        overall and per network.
+
+        Args:
+            filepath (str): The path to the file to be shared.
+            community (Community): The community to share the file with.
+
+        Returns:
+            dict: Maps each member to True if it received the file, False otherwise (including unreachable members).
+        """
+        assert os.path.exists(filepath), f"File {filepath} does not exist."
+        plan = self.plan(community)
+        results = {member: False for member in plan['unreachable']}
+        if plan['unreachable']:
+            print(f"Skipping {colored(len(plan['unreachable']), 'red')} unreachable member(s): {', '.join(plan['unreachable'])}")
+
+        network_limits = {network: threading.Semaphore(self.per_network_limit) for network in plan['networks']}
+        queues = [[(network, target) for target in targets] for network, targets in plan['networks'].items()]
+        ordered = [entry for round_ in zip_longest(*queues) for entry in round_ if entry is not None]
+
+        def deliver(network, target):
+            with network_limits[network]:
+                member, ip_address, port = target
+                return member, self.data_transferer.file_sharing(filepath, member, ip_address, port)
+
+        total = sum(len(targets) for targets in plan['networks'].values())
+        print(f"Delivering to {colored(total, 'light_cyan')} device(s) across {colored(len(plan['networks']), 'light_cyan')} network(s)...")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='Broadcast_Thread') as executor:
+            for member, success in executor.map(lambda entry: deliver(*entry), ordered):
+                results[member] = success
+        delivered = sum(results.values())
+        print(f"Delivered to {colored(delivered, 'green')} of {colored(len(results), 'light_cyan')} member(s).")
+        return results
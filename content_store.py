@@ -0,0 +1,179 @@
+# Use this to create functions and classes to store received files by their content in the Social Interact setup.
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+
+class ContentStore(object):
+    """
+    Class to keep one copy of every received file, addressed by its SHA-256 hash. The per-sender paths under
+    `received_files/` are hard links into the store, so the same content sent by several devices (or sent twice) takes
+    the disk space of one file, and a sender offering content the store already has does not need to send it at all. \\
+    Answering an offer tells the sender whether this device holds that content, without the sender proving that it
+    has the content itself - offers are therefore only answered to authenticated devices (see `DataSharing.file_receiving`).
+    """
+    DIRNAME = ".store"
+    DIGEST = re.compile(r'[0-9a-f]{64}')
+    CHUNK_SIZE = 1024 * 1024
+    MAX_CACHED_HASHES = 10000
+
+    def __init__(self, received_files_dir:str, root_usr_dir:str):
+        """
+        Initialises the store in `<received_files_dir>/.store/`, where the file of hash `h` is kept at `<h[:2]>/<h>`. \\
+        Hashes of files are cached in `<root_usr_dir>/hashes.json` by path, modification time and size, so a file is
+        only hashed again once it changes - sending a file to several devices hashes it once.
+
+        Args:
+            received_files_dir (str): The directory of the received files.
+            root_usr_dir (str): The root directory where user data is stored.
+        """
+        assert os.path.exists(received_files_dir), "Received files directory does not exist"
+        self.store_dir = os.path.join(received_files_dir, self.DIRNAME)
+        if not os.path.exists(self.store_dir):
+            os.makedirs(self.store_dir)
+        self.lock = threading.Lock()
+        self.hashes_file = os.path.join(root_usr_dir, "hashes.json")
+        self.hashes = {} # absolute path -> [mtime_ns, size, sha256]
+        if os.path.exists(self.hashes_file):
+            try:
+                with open(self.hashes_file, 'r', encoding='utf-8') as f:
+                    self.hashes = json.load(f)
+            except ValueError:
+                self.hashes = {}
+
+    @classmethod
+    def is_digest(cls, value):
+        """
+        Checks whether a value is a SHA-256 hex digest (lowercase), as used to address the store.
+        """
+        return isinstance(value, str) and cls.DIGEST.fullmatch(value) is not None
+
+    def path_of(self, digest:str):
+        """
+        Returns:
+            str: The path in the store of the content with the given hash.
+
+        Raises:
+            ValueError: If `digest` is not a SHA-256 hex digest - it may come from another device.
+        """
+        if not self.is_digest(digest):
+            raise ValueError(f"'{digest}' is not a SHA-256 hex digest.")
+        return os.path.join(self.store_dir, digest[:2], digest)
+
+    def _remember(self, digest:str, *paths):
+        with self.lock:
+            for path in paths:
+                stat = os.stat(path)
+                self.hashes[os.path.abspath(path)] = [stat.st_mtime_ns, stat.st_size, digest]
+            if len(self.hashes) > self.MAX_CACHED_HASHES:
+                self.hashes = {cached: entry for cached, entry in self.hashes.items() if os.path.exists(cached)}
+                while len(self.hashes) > self.MAX_CACHED_HASHES:
+                    del self.hashes[next(iter(self.hashes))] # oldest first
+            with open(self.hashes_file + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self.hashes, f)
+            os.replace(self.hashes_file + ".tmp", self.hashes_file)
+
+    def hash_file(self, path:str):
+        """
+        Gets the SHA-256 hash of a file, from the cache if the file has not changed since it was last hashed.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            str: The hex digest.
+        """
+        stat = os.stat(path)
+        cached = self.hashes.get(os.path.abspath(path))
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while data := f.read(self.CHUNK_SIZE):
+                digest.update(data)
+        digest = digest.hexdigest()
+        self._remember(digest, path)
+        return digest
+
+    def hash_prefix(self, path:str, size:int):
+        """
+        Hashes the first `size` bytes of a file (the part of an interrupted transfer already received).
+
+        Returns:
+            hashlib._Hash: The running hash, to be updated with the rest of the file.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while size > 0 and (data := f.read(min(self.CHUNK_SIZE, size))):
+                digest.update(data)
+                size -= len(data)
+        return digest
+
+    def lookup(self, digest:str, size:int):
+        """
+        Looks up content in the store. An entry that was modified since it was stored (e.g. by editing one of its
+        links) no longer has its hash and is not returned; `add` replaces it the next time the content arrives.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the content. Anything else is never found.
+            size (int): The size of the content in bytes.
+
+        Returns:
+            str: The path of the content in the store, or None if the store does not have it.
+        """
+        if not self.is_digest(digest):
+            return None
+        path = self.path_of(digest)
+        if not os.path.isfile(path) or os.path.islink(path):
+            return None
+        if os.path.getsize(path) != size or self.hash_file(path) != digest:
+            return None
+        return path
+
+    def link(self, source:str, target:str):
+        """
+        Makes `target` a hard link to `source`, replacing whatever is at `target`. Where hard links are not
+        supported (e.g. across file systems or on FAT), the file is copied instead.
+
+        Returns:
+            bool: True if a hard link was made, False if the file was copied.
+        """
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return True
+        temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(source, temporary)
+            linked = True
+        except OSError:
+            shutil.copyfile(source, temporary)
+            linked = False
+        os.replace(temporary, target)
+        return linked
+
+    def add(self, path:str, digest:str):
+        """
+        Adds a received file to the store (as a hard link to it) unless the store already has its content, in which
+        case the file is replaced by a link to the stored copy.
+
+        Args:
+            path (str): The path of the received file.
+            digest (str): Its SHA-256 hex digest.
+        """
+        stored = self.lookup(digest, os.path.getsize(path))
+        if stored is not None:
+            self.link(stored, path)
+        else:
+            stored = self.path_of(digest)
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            self.link(path, stored)
+        self._remember(digest, stored, path)
+
+    def release(self, path:str):
+        """
+        Removes a file that may be a link into the store, so that writing a new file at its path never modifies
+        the stored content (opening a hard link for writing would truncate every link to it).
+        """
+        if os.path.lexists(path):
+            os.remove(path)
@@ -0,0 +1,618 @@
+# Use this to run InterAct headless and to control it from other processes through a local JSON-RPC API.
+import os
+import sys
+import json
+import time
+import socket
+import inspect
+import argparse
+import itertools
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+
+curr_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(curr_dir))
+
+from user import User
+from devices import Radar
+from data_sharing import DataSharing
+from group import GroupStore
+from community import Community, BroadcastPlanner
+from communication import GossipSync
+from metrics import MetricsServer
+from profiling import Profiler
+
+class DaemonError(Exception):
+    """
+    Raised by `DaemonClient` when the daemon cannot be reached or a call fails.
+    """
+
+class InterActDaemon(object):
+    """
+    Class running the InterAct services (discovery, pinger, file transfer server, heartbeats, gossip) without
+    an interactive session, controlled through a local JSON-RPC API.
+    """
+    def __init__(self, root_dir:str="./Data", curr_device:User=None, name:str=None, rpc_port:int=12348, max_transfers:int=4, metrics_port:int=9464, default_datatypes:list=None):
+        """
+        Initialises the daemon and the services it runs. Nothing is started until `start` is called.
+
+        Args:
+            root_dir (str): The root directory where data is stored. Defaults to `./Data`.
+            curr_device (User): The current device, if already loaded. Defaults to None (loaded from `root_dir`).
+            name (str): The name of the device if no account exists yet. Defaults to `Device_<ip_address>`.
+            rpc_port (int): The localhost port of the API where Unix sockets are not available. Defaults to 12348.
+            max_transfers (int): Maximum number of transfers run at the same time. Defaults to 4.
+            metrics_port (int): The localhost port the Prometheus metrics are served on. Defaults to 9464 (None to not serve them).
+            default_datatypes (list): Datatypes that devices in no group may send once groups exist (see `GroupStore`). Defaults to None (everything).
+        """
+        assert isinstance(max_transfers, int) and max_transfers > 0, "max_transfers must be a positive integer"
+        self.root_dir = root_dir
+        self.curr_device = curr_device if curr_device is not None else User(root_usr_dir=root_dir)
+        if not self.curr_device.account_exists:
+            self.curr_device.update_user(name=name or f'Device_{self.curr_device.ip_address}')
+        self.curr_device.update_user()
+
+        self.radar = Radar(root_usr_dir=root_dir, curr_device=self.curr_device)
+        self.radar.warm_start()
+        self.group_store = GroupStore(root_grp_dir=root_dir, user_class=self.curr_device, default_datatypes=default_datatypes)
+        self.data_transferer = DataSharing(root_usr_dir=root_dir, curr_device=self.curr_device, radar=self.radar, group_store=self.group_store)
+        self.gossip = GossipSync(root_dir=root_dir, curr_device=self.curr_device, radar=self.radar, group_store=self.group_store, transport=self.data_transferer.transport)
+
+        self.rpc_port = rpc_port
+        self.socket_path = os.path.join(root_dir, "interact.sock")
+        self.info_file = os.path.join(root_dir, "daemon.json")
+        self.token = os.urandom(16).hex()
+        self.rpc_socket = None
+        self.is_running = threading.Event()
+        self.stopper = None
+        self.started_at = None
+
+        self.jobs = {} # job id -> job details, see `_submit`
+        self.job_ids = itertools.count(1)
+        self.jobs_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_transfers, thread_name_prefix='Transfer_Thread')
+        self.curr_device.metrics.gauge('jobs', "Transfer jobs of the daemon, by status.", ('status',), function=self._job_counts)
+        self.metrics_server = MetricsServer(self.curr_device.metrics, port=metrics_port) if metrics_port is not None else None
+        self.profiler = Profiler(root_usr_dir=root_dir)
+        for obj, method in ((self.data_transferer, 'file_sharing'), (self.data_transferer, 'file_receiving'),
+                            (self.radar, 'add_service'), (self.radar, 'handle_service_info'), (self.radar, 'remove_service'),
+                            (self.curr_device, 'update_contacts_status'), (self.curr_device, 'update_contacts_status_many')):
+            self.profiler.register(obj, method)
+
+        self.methods = {
+            'send': self.send, 'broadcast': self.broadcast, 'jobs': self.list_jobs, 'job': self.get_job,
+            'status': self.status, 'contacts': self.contacts, 'devices': self.devices,
+            'browse': self.browse, 'stop_browsing': self.stop_browsing, 'announce': self.announce, 'stop_announce': self.stop_announce,
+            'ping': self.ping, 'add_contact': self.add_contact, 'save_devices': self.save_devices,
+            'heartbeat': self.heartbeat, 'sync': self.sync, 'stats': self.stats, 'profile': self.profile, 'shutdown': self.shutdown
+        }
+
+    def start(self):
+        """
+        Starts the pinger, the file transfer server, heartbeats, gossip and browsing, and serves the API.
+
+        Raises:
+            AssertionError: If another daemon is already running on the same root directory.
+        """
+        assert not DaemonClient(self.root_dir).is_running(), f"An InterAct daemon is already running on {self.root_dir}."
+        self.started_at = time.time()
+        self.is_running.set()
+        if Profiler.requested():
+            self.profiler.start()
+        threading.Thread(target=self.radar.pinger, name='Ping_Thread', daemon=True).start()
+        threading.Thread(target=self.data_transferer.background_process, name='Background_Thread', daemon=True).start()
+        self.radar.start_heartbeats()
+        self.gossip.start()
+        self.radar.browse()
+        if self.metrics_server is not None:
+            try:
+                self.metrics_server.start()
+            except OSError as e:
+                print(f"{colored('WARNING:', 'red')} Could not serve metrics on port {self.metrics_server.port}: {e}")
+        self._bind()
+        threading.Thread(target=self.serve, name='RPC_Server_Thread', daemon=True).start()
+
+    def run(self):
+        """
+        Starts the daemon and blocks until it is shut down (through the API or with Ctrl+C).
+        """
+        self.start()
+        print(f"InterAct daemon running as {colored(self.curr_device.name, 'blue')}. API at {colored(self._endpoint(), 'cyan')}.")
+        try:
+            while self.is_running.is_set(): # cleared by `stop` when shut down through the API
+                time.sleep(0.5)
+            if self.stopper is not None: # the timer is a daemon thread; let `stop` finish before the process exits
+                self.stopper.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        """
+        Stops announcing, gossiping and serving the API, and closes the radar.
+        """
+        self.is_running.clear()
+        if self.rpc_socket is not None:
+            try:
+                self.rpc_socket.shutdown(socket.SHUT_RDWR) # wakes up the accepting thread
+            except OSError:
+                pass
+            self.rpc_socket.close()
+            self.rpc_socket = None
+        for path in (self.info_file, self.socket_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.profiler.stop()
+        self.radar.stop_announcing()
+        self.gossip.stop()
+        self.radar.close()
+        self.executor.shutdown(wait=False)
+
+    def _endpoint(self):
+        return self.socket_path if self.rpc_socket.family == getattr(socket, 'AF_UNIX', None) else f"127.0.0.1:{self.rpc_port}"
+
+    def _bind(self):
+        """
+        Binds the API to a Unix socket only the current user can access, or to a localhost port where Unix
+        sockets are not available. The endpoint and the token clients must present are written to `daemon.json`.
+        """
+        endpoint = None
+        if hasattr(socket, 'AF_UNIX'):
+            try:
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path) # left over by a daemon that did not shut down cleanly
+                self.rpc_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.rpc_socket.bind(os.path.abspath(self.socket_path))
+                os.chmod(self.socket_path, 0o600)
+                endpoint = {'unix': os.path.abspath(self.socket_path)}
+            except OSError: # e.g. the path is too long for a Unix socket
+                self.rpc_socket.close()
+        if endpoint is None:
+            self.rpc_socket = socket.create_server(('127.0.0.1', self.rpc_port))
+            endpoint = {'tcp': ['127.0.0.1', self.rpc_port]}
+        self.rpc_socket.listen(16)
+
+        temp_file = self.info_file + ".tmp"
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump(dict(endpoint, token=self.token, pid=os.getpid()), f)
+        os.replace(temp_file, self.info_file)
+
+    def serve(self):
+        """
+        Accepts API clients, each served in its own thread. This method is intended to be run in a separate thread.
+        """
+        while self.is_running.is_set():
+            try:
+                client_socket, _ = self.rpc_socket.accept()
+            except (OSError, AttributeError): # the socket was closed by `stop`
+                break
+            threading.Thread(target=self._serve_client, args=(client_socket,), name='RPC_Client_Thread', daemon=True).start()
+
+    def _serve_client(self, client_socket):
+        """
+        Answers the requests of one client. Requests and responses are JSON-RPC 2.0 objects, one per line.
+        """
+        with client_socket, client_socket.makefile('rb') as reader:
+            for line in reader:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': 'Parse error'}}
+                else:
+                    response = self.handle(request)
+                try:
+                    client_socket.sendall((json.dumps(response, default=str) + '\n').encode('utf-8'))
+                except OSError:
+                    return
+
+    def handle(self, request:dict):
+        """
+        Dispatches a JSON-RPC request to the API method it names.
+
+        Args:
+            request (dict): The request, with `method`, `params` (including the `token` from `daemon.json`) and `id`.
+
+        Returns:
+            dict: The JSON-RPC response.
+        """
+        request_id = request.get('id') if isinstance(request, dict) else None
+        def error(code, message):
+            return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+        if not isinstance(request, dict) or not isinstance(request.get('params', {}), dict):
+            return error(-32600, 'Invalid request')
+        params = dict(request.get('params', {}))
+        if params.pop('token', None) != self.token:
+            return error(-32001, 'Invalid token')
+        method = self.methods.get(request.get('method'))
+        if method is None:
+            return error(-32601, f"Method not found: {request.get('method')}")
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return error(-32602, f"Invalid params: {e}")
+        try:
+            return {'jsonrpc': '2.0', 'id': request_id, 'result': method(**params)}
+        except (AssertionError, ValueError, OSError) as e:
+            return error(-32000, str(e))
+        except Exception as e: # a bug in the method must not take the client's connection down with it
+            print(f"{colored('ERROR:', 'red')} API method {request.get('method')} failed: {type(e).__name__}: {e}")
+            return error(-32603, f"Internal error: {type(e).__name__}: {e}")
+
+    def _submit(self, kind:str, description:dict, function):
+        """
+        Queues a job on the transfer pool.
+
+        Returns:
+            dict: The job - `id`, `type`, `status` (`queued`, `running`, `done`, `partial` or `failed`), timestamps and `result` or `error`.
+        """
+        with self.jobs_lock:
+            job = dict(description, id=next(self.job_ids), type=kind, status='queued',
+                       submitted=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), started=None, finished=None, result=None, error=None)
+            self.jobs[job['id']] = job
+
+        def run():
+            job.update(status='running', started=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            try:
+                job['result'] = function()
+                job['status'] = self._job_status(job['result'])
+            except Exception as e:
+                job.update(status='failed', error=str(e))
+            job['finished'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        self.executor.submit(run)
+        return dict(job)
+
+    @staticmethod
+    def _job_status(result):
+        """
+        Get the status of a finished job from its result: a transfer succeeded or not, while a broadcast (which
+        maps each member to whether it received the file) is `partial` if only some members received it.
+        """
+        if isinstance(result, dict):
+            delivered = sum(bool(received) for received in result.values())
+            return 'done' if result and delivered == len(result) else 'partial' if delivered else 'failed'
+        return 'done' if result else 'failed'
+
+    def _resolve(self, receiver_name:str):
+        """
+        Finds where to send to a device, from the contacts or else the discovered devices.
+
+        Returns:
+            tuple: `(ip_address, port)` of the device.
+
+        Raises:
+            AssertionError: If the device is unknown or offline.
+        """
+        contact = self.curr_device.get_contacts_by_name(receiver_name)
+        device = next((d for d in self.radar.devices if d['name'] == receiver_name), None)
+        if not contact.empty:
+            # the heartbeat subsystem keeps the status current, so no synchronous probe is needed here
+            online = (contact['status'] == 'online').values[0] or self.radar.is_alive(receiver_name)
+            ip_address, port = contact['ip_address'].values[0], int(contact['port'].values[0])
+        else:
+            assert device is not None, f"Receiver {receiver_name} is neither a contact nor a discovered device."
+            online = device['status'] == 'online'
+            ip_address, port = device['ip_address'], int(device['port'])
+        assert online, f"Receiver {receiver_name} is offline."
+        return ip_address, port
+
+    def send(self, receiver:str, file_path:str):
+        """
+        Queues a file to be sent to a device. Returns immediately; poll the job with `job`.
+
+        Args:
+            receiver (str): The name of the receiver device.
+            file_path (str): The absolute path of the file.
+
+        Returns:
+            dict: The queued job.
+        """
+        assert os.path.isfile(file_path), f"File '{file_path}' does not exist."
+        ip_address, port = self._resolve(receiver)
+        return self._submit('send', {'receiver': receiver, 'file': file_path},
+                            lambda: self.data_transferer.file_sharing(file_path, receiver, ip_address, port))
+
+    def broadcast(self, community:str, file_path:str):
+        """
+        Queues a file to be sent to every device of a community.
+
+        Returns:
+            dict: The queued job. Its result maps each member to whether it received the file.
+        """
+        assert os.path.isfile(file_path), f"File '{file_path}' does not exist."
+        community = Community(self.group_store, name=community)
+        return self._submit('broadcast', {'community': community.name, 'file': file_path},
+                            lambda: BroadcastPlanner(self.data_transferer).broadcast(file_path, community))
+
+    def list_jobs(self):
+        """
+        Get every job submitted since the daemon started, most recent first.
+        """
+        with self.jobs_lock:
+            return [dict(job) for job in reversed(self.jobs.values())]
+
+    def get_job(self, job_id:int):
+        """
+        Get a job by its id.
+        """
+        job = self.jobs.get(int(job_id))
+        assert job is not None, f"Job {job_id} does not exist."
+        return dict(job)
+
+    def status(self):
+        """
+        Get the status of the current device and of the daemon's services.
+        """
+        job_counts = {status: count for (status,), count in self._job_counts().items()}
+        return {
+            'name': self.curr_device.name,
+            'ip_address': self.curr_device.ip_address,
+            'addresses': self.curr_device.get_ips(),
+            'port': int(self.curr_device.file_transfer_port),
+            'identity': self.data_transferer.transport.public_key,
+            'uptime_seconds': time.time() - self.started_at if self.started_at else 0.0,
+            'browsing': self.radar.is_browsing.is_set(),
+            'announcing': self.radar.is_discoverable.is_set(),
+            'heartbeating': self.radar.is_heartbeating.is_set(),
+            'gossiping': self.gossip.is_gossiping.is_set(),
+            'devices': len(self.radar.devices),
+            'contacts': len(self.curr_device.contacts),
+            'jobs': job_counts
+        }
+
+    def _job_counts(self):
+        with self.jobs_lock:
+            job_counts = {}
+            for job in self.jobs.values():
+                job_counts[(job['status'],)] = job_counts.get((job['status'],), 0) + 1
+        return job_counts
+
+    def stats(self):
+        """
+        Get the metrics of the device (transfers, connections, discovery, verification latency, CSV writes).
+        """
+        return self.curr_device.metrics.snapshot()
+
+    def profile(self, enabled:bool=None):
+        """
+        Switch profiling of the transfer and discovery paths on or off (writing the profile to `profiles/`), or get its
+        status if `enabled` is not given.
+        """
+        report = None
+        if enabled and not self.profiler.is_profiling.is_set():
+            self.profiler.start()
+        elif enabled is False:
+            report = self.profiler.stop()
+        return dict(self.profiler.status(), report=report)
+
+    def contacts(self, verify:bool=False):
+        """
+        Get the contacts with their link estimates. Contacts are verified first if asked to, or if neither browsing
+        nor heartbeats keep their status current.
+
+        Returns:
+            list: One dict per contact (`name`, `ip_address`, `port`, `status`, `last_active`, `mode`, `rtt`, `link`).
+        """
+        if verify or not (self.radar.is_browsing.is_set() or self.radar.is_heartbeating.is_set()):
+            self.radar.verify_many([(row['name'], row['ip_address'], int(row['port'])) for _, row in self.curr_device.contacts.iterrows()], verbose=False)
+        contacts = json.loads(self.curr_device.contacts.drop(columns=['self', 'public_key'], errors='ignore').to_json(orient='records'))
+        for contact in contacts:
+            contact['rtt'], contact['link'] = self.radar.format_link(contact['name'], contact['ip_address'])
+        return contacts
+
+    def devices(self):
+        """
+        Get the devices discovered on the network with their link estimates.
+
+        Returns:
+            list: One dict per device, in discovery order (the indices `save_devices` expects).
+        """
+        devices = []
+        for device in list(self.radar.devices):
+            device = {key: device.get(key) for key in ('name', 'ip_address', 'addresses', 'port', 'status', 'last_active')}
+            device['rtt'], device['link'] = self.radar.format_link(device['name'])
+            devices.append(device)
+        return devices
+
+    def browse(self):
+        """
+        Start discovering nearby devices.
+        """
+        self.radar.browse()
+        return True
+
+    def stop_browsing(self):
+        """
+        Stop discovering nearby devices.
+        """
+        self.radar.stop_browsing()
+        return True
+
+    def announce(self):
+        """
+        Announce the current device to nearby devices.
+        """
+        self.radar.announce()
+        return True
+
+    def stop_announce(self):
+        """
+        Stop announcing the current device.
+        """
+        self.radar.stop_announcing()
+        return True
+
+    def ping(self, name:str, ip_address:str, port:int):
+        """
+        Check whether a device is online.
+        """
+        return {'online': bool(self.radar.verify(name, ip_address, int(port)))}
+
+    def add_contact(self, name:str, ip_address:str, port:int):
+        """
+        Add a device to the contacts if it is reachable. A device that is already a contact is marked online.
+
+        Returns:
+            dict: `added` and `existed` flags.
+        """
+        if not self.curr_device.get_contacts_by_name(name).empty:
+            self.curr_device.update_contacts_status(ip_address, status='online', port=int(port), name=name)
+            return {'added': False, 'existed': True}
+        added = bool(self.radar.verify(name, ip_address, int(port)))
+        if added:
+            self.curr_device.add_manually(name, ip_address, int(port), status='online')
+        return {'added': added, 'existed': False}
+
+    def save_devices(self, indices:list):
+        """
+        Add discovered devices (by their index in `devices`) to the contacts.
+        """
+        self.radar.save_devices_as_contacts([int(index) for index in indices])
+        return True
+
+    def heartbeat(self, enabled:bool=True, interval:float=None, phi_threshold:float=None):
+        """
+        Toggle or tune the heartbeat failure detector.
+
+        Returns:
+            dict: `heartbeating`, `interval` and `phi_threshold`.
+        """
+        if not enabled:
+            self.radar.stop_heartbeats()
+        else:
+            interval = float(interval) if interval is not None else self.radar.heartbeat_interval
+            phi_threshold = float(phi_threshold) if phi_threshold is not None else self.radar.phi_threshold
+            if self.radar.is_heartbeating.is_set():
+                self.radar.heartbeat_interval = interval
+                self.radar.phi_threshold = phi_threshold
+            else:
+                self.radar.start_heartbeats(interval=interval, phi_threshold=phi_threshold)
+        return {'heartbeating': self.radar.is_heartbeating.is_set(), 'interval': self.radar.heartbeat_interval, 'phi_threshold': self.radar.phi_threshold}
+
+    def sync(self, name:str, ip_address:str=None):
+        """
+        Sync groups, communities and contacts with a device right away.
+
+        Returns:
+            dict: `in_sync`, `received` and `sent` (see `GossipSync.sync_with`).
+        """
+        if ip_address is None:
+            addresses = self.radar.paths(name) or list(self.curr_device.get_contacts_by_name(name)['ip_address'].values[:1])
+            assert addresses, f"Device '{name}' not found. Browse for it or give its IP address."
+            ip_address = addresses[0]
+        return self.gossip.sync_with(name, ip_address)
+
+    def shutdown(self):
+        """
+        Shut the daemon down.
+        """
+        self.stopper = threading.Timer(0.1, self.stop) # after the response has been sent
+        self.stopper.start()
+        return True
+
+class DaemonClient(object):
+    """
+    Class to call the API of a running `InterActDaemon`.
+    """
+    def __init__(self, root_dir:str="./Data", timeout:float=None):
+        """
+        Initialises the client. The daemon is found through the `daemon.json` it writes to `root_dir`.
+
+        Args:
+            root_dir (str): The root directory of the daemon. Defaults to `./Data`.
+            timeout (float): Timeout of each call in seconds. Defaults to None (wait for the result).
+        """
+        self.info_file = os.path.join(root_dir, "daemon.json")
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.token = None
+        self.request_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        try:
+            with open(self.info_file, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            raise DaemonError("The InterAct daemon is not running.")
+        try:
+            if 'unix' in info:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(info['unix'])
+            else:
+                self.sock = socket.create_connection(tuple(info['tcp']), timeout=self.timeout)
+        except OSError:
+            self.close()
+            raise DaemonError("The InterAct daemon is not running.")
+        self.reader = self.sock.makefile('rb')
+        self.token = info['token']
+
+    def call(self, method:str, **params):
+        """
+        Calls an API method of the daemon.
+
+        Args:
+            method (str): The name of the method.
+            **params: The parameters of the method.
+
+        Returns:
+            The result of the method.
+
+        Raises:
+            DaemonError: If the daemon is not running or the call failed.
+        """
+        with self.lock:
+            if self.sock is None:
+                self._connect()
+            request = {'jsonrpc': '2.0', 'id': next(self.request_ids), 'method': method, 'params': dict(params, token=self.token)}
+            try:
+                self.sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+                line = self.reader.readline()
+            except OSError as e:
+                self.close()
+                raise DaemonError(f"Lost the connection to the daemon: {e}")
+            if not line:
+                self.close()
+                raise DaemonError("The daemon closed the connection.")
+        response = json.loads(line)
+        if 'error' in response:
+            raise DaemonError(response['error']['message'])
+        return response['result']
+
+    def is_running(self):
+        """
+        Checks whether a daemon is running and answering.
+        """
+        try:
+            self.call('status')
+            return True
+        except DaemonError:
+            return False
+
+    def close(self):
+        """
+        Closes the connection to the daemon.
+        """
+        if self.reader is not None:
+            self.reader.close()
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = self.reader = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run InterAct headless, controlled through a local JSON-RPC API.")
+    parser.add_argument('--root', default="./Data", help="The root directory where data is stored.")
+    parser.add_argument('--name', default=None, help="The name of the device, if no account exists yet.")
+    parser.add_argument('--rpc-port', type=int, default=12348, help="The localhost port of the API where Unix sockets are not available.")
+    parser.add_argument('--max-transfers', type=int, default=4, help="Maximum number of transfers run at the same time.")
+    parser.add_argument('--metrics-port', type=int, default=9464, help="The localhost port of the Prometheus metrics (0 to not serve them).")
+    parser.add_argument('--default-datatypes', nargs='*', default=None, help="Datatypes that devices in no group may send once groups exist (all by default, none if the option is given alone).")
+    args = parser.parse_args()
+    InterActDaemon(root_dir=args.root, name=args.name, rpc_port=args.rpc_port, max_transfers=args.max_transfers,
+                   metrics_port=args.metrics_port or None, default_datatypes=args.default_datatypes).run()
@@ -8,18 +8,30 @@ from termcolor import colored
 from tqdm import tqdm
 from zeroconf import Zeroconf
 import time
+import hashlib
+from contextlib import contextmanager
 
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(curr_dir))
 
 from user import User
 from devices import Radar
+from security import SecureTransport, HandshakeError
+from metrics import TransferMeter
+from content_store import ContentStore
+
+class TransferRejected(Exception):
+    """
+    Raised when the receiver refuses a file (e.g. its group policies do not allow it).
+    """
 
 class DataSharing(object):
     """
     Class to manage data sharing between devices.
     """
-    def __init__(self, root_usr_dir:str, curr_device:User, radar:Radar, file_packet_size:int=1024*4):
+    RECEIVE_TIMEOUT = 30 # seconds a sender may stay silent before the connection is dropped
+
+    def __init__(self, root_usr_dir:str, curr_device:User, radar:Radar, file_packet_size:int=1024*4, group_store=None):
         """
         Initializes the DataSharing class.
 
@@ -28,10 +40,14 @@ class DataSharing(object):
             curr_device (User): The current device user. Defaults to None.
             radar (Radar): The radar instance for discovering other devices.
             file_packet_size (int): The size of each packet for file transfer. Defaults to 64KB.
+            group_store (GroupStore): The groups whose data sharing policies incoming files are checked against.
+            Defaults to None (every file is accepted).
         """
         self.root_usr_dir = root_usr_dir
         self.curr_device = curr_device
         self.radar = radar
+        self.group_store = group_store
+        self.transport = SecureTransport(root_usr_dir, curr_device)
 
         assert isinstance(self.curr_device, User), "curr_device must be an instance of User"
         assert isinstance(self.radar, Radar), "radar must be an instance of Radar"
@@ -39,33 +55,78 @@ class DataSharing(object):
         assert isinstance(file_packet_size, int) and file_packet_size > 0, "file_packet_size must be a positive integer"
 
         self.file_packet_size = file_packet_size
+        self.transfers = set() # TransferMeter of every transfer in progress
+        self.receiving = {} # received file path -> [lock held while the file is written, socket of the latest receive, receives waiting or running]
+        self.receiving_lock = threading.Lock()
+        metrics = self.curr_device.metrics
+        self.bytes_transferred = metrics.counter('transfer_bytes_total', "Bytes of files sent and received.", ('direction',))
+        self.transfers_finished = metrics.counter('transfers_total', "Finished file transfers, by outcome.", ('direction', 'result'))
+        self.bytes_deduplicated = metrics.counter('transfer_bytes_deduplicated_total', "Bytes not transferred because the receiver already had the content.", ('direction',))
+        self.active_connections = metrics.gauge('active_connections', "Open file transfer connections.", ('direction',))
+        metrics.gauge('transfer_rate_bytes_per_second', "Average throughput of each transfer in progress.", ('direction', 'peer', 'file'), function=self._transfer_rates)
+        metrics.gauge('receive_threads', "Threads receiving files.", function=lambda: sum(thread.name.startswith("Receiving_Thread") for thread in threading.enumerate()))
         self.service_type = "_interact._tcp.local."
         self.received_files_dir = os.path.join(self.root_usr_dir, "received_files")
         if not os.path.exists(self.received_files_dir):
             os.makedirs(self.received_files_dir)
             print(f"Created directory for received files: {colored(self.received_files_dir, 'green')}")
+        self.content_store = ContentStore(self.received_files_dir, self.root_usr_dir)
+        self.transport.features.update(('content_store', 'verdict'))
     
     def file_receiving(self, sender_socket, sender_address):
         """
-        Handles the incoming data from the sender device.
+        Handles the incoming data from the sender device. \
+        Senders that open an encrypted session are authenticated first and their authenticated name is used;
+        devices from before encryption are still served in plaintext, but the name they claim is never trusted:
+        plaintext claiming the name of a device whose identity is pinned is refused, and every other plaintext
+        file is filed and checked against the group policies as `Unknown_(<ip>)`. \
+        Every received file is hashed as it arrives and added to the content store. Senders may offer the hash of
+        the file first; if the store already has that content, the file is linked from the store and nothing is sent.
+        Whether the store has the content is only revealed to authenticated senders - offers made in plaintext are
+        ignored and the file is always sent. \
+        Senders that ask for a `verdict` get exactly one reply line before any data: `REJECT` if the file is refused,
+        otherwise the resume offset, `HAVE` or `SEND`. \
+        The file and sender names come from the sender, so both are reduced to a single path component, and files
+        are only ever written inside the sender's directory under `received_files/`. \
+        Only one receive writes a file at a time (see `_claim`): a resume first cuts off the connection it resumes,
+        which may still be waiting on a path that died, and waits for it to finish.
 
         Args:
             sender_socket (socket.socket): The socket object for the sender.
             sender_address (tuple): The address of the sender device.
         """
-        sender_ip, sender_port = sender_address
+        sender_ip, sender_port = sender_address[:2]
+        sender_ip = Radar.normalize_address(sender_ip)
         threading.current_thread().name = f"Receiving_Thread-{sender_ip}:{sender_port}"
         print(f"Sender identified at {colored(sender_ip, 'cyan')}:{colored(sender_port, 'light_cyan')}")
+        sender_name = f"Unknown_({sender_ip})"
+        received_size, resumed_from, filesize = 0, 0, None
+        start_time = time.perf_counter()
+        meter, claimed_path = None, None
+        connection = sender_socket
+        self.active_connections.inc(direction='received')
         
         try:
+            sender_socket.settimeout(self.RECEIVE_TIMEOUT)
+            secure = self.transport.is_secure(sender_socket)
+            if secure:
+                sender_socket = self.transport.accept(sender_socket)
             meta_data = sender_socket.recv(self.file_packet_size)
             if not meta_data:
                 print(f"Sender {colored('disconnected', 'red')}. No metadata received.")
                 sender_socket.close()
                 return
-            meta_data = meta_data.decode('utf-8').split('|', 2) # metadata format: "filename|filesize|sender_name"
-            if len(meta_data) == 3:
-                filename, filesize, sender_name = meta_data
+            # the metadata ends with a newline; anything after it is already file data (older senders send no newline)
+            meta_data, _, leftover = meta_data.partition(b'\n')
+            meta_data = meta_data.decode('utf-8').split('|', 3) # metadata format: "filename|filesize|sender_name[|options]"
+            options = meta_data[3].split(',') if len(meta_data) == 4 else [] # `resume`, `offer=<sha256>` and/or `verdict`
+            resume = 'resume' in options
+            verdict = 'verdict' in options
+            offer = next((option[len('offer='):] for option in options if option.startswith('offer=')), None)
+            if offer is not None and (not secure or not ContentStore.is_digest(offer)):
+                offer = None # never say whether the store holds content to a sender that could be anyone
+            if len(meta_data) >= 3:
+                filename, filesize, sender_name = meta_data[:3]
                 filesize = int(filesize)
 
                 print(f"Receiving file '{colored(filename, 'yellow')}' ({colored(str(filesize), 'light_yellow')} bytes) from {colored(sender_name, 'blue')}.")
@@ -73,27 +134,90 @@ class DataSharing(object):
                 print("Sender name not provided in metadata. Naming sender using IP Adress.")
                 filename, filesize = meta_data[0], int(meta_data[1])
                 sender_name = f"Unknown_({sender_ip})"
+            if secure:
+                sender_name = sender_socket.peer_name
+            else:
+                if self.curr_device.get_public_key(sender_name) is not None:
+                    self._reject(sender_socket, verdict, f"'{colored(filename, 'yellow')}': sent in plaintext under the name of {colored(sender_name, 'blue')}, whose identity is pinned.")
+                    sender_name, filesize = f"Unknown_({sender_ip})", None
+                    return
+                sender_name = f"Unknown_({sender_ip})"
+            filename = self._safe_name(filename)
+            if filename is None:
+                self._reject(sender_socket, verdict, f"a file with an invalid name from {colored(sender_name, 'blue')}.")
+                filesize = None
+                return
+            if self._safe_name(sender_name) != sender_name or sender_name == ContentStore.DIRNAME:
+                sender_name = f"Unknown_({sender_ip})"
+            if self.group_store is not None and not self.group_store.allows(sender_name, filename):
+                self._reject(sender_socket, verdict, f"'{colored(filename, 'yellow')}' from {colored(sender_name, 'blue')}: not permitted by the data sharing policies of their groups.")
+                filesize = None
+                return
             received_file_dir_for_sender = os.path.join(self.received_files_dir, sender_name)
             if not os.path.exists(received_file_dir_for_sender):
                 os.makedirs(received_file_dir_for_sender)
-            filename = os.path.basename(filename)
             received_file_path = os.path.join(received_file_dir_for_sender, filename)
-            if os.path.exists(received_file_path):
-                print(f"{colored('WARNING:', 'red')} File '{colored(filename, 'yellow')}' already exists. Overwriting it.")
+            if os.path.dirname(os.path.dirname(os.path.realpath(received_file_path))) != os.path.realpath(self.received_files_dir):
+                self._reject(sender_socket, verdict, f"'{colored(filename, 'yellow')}' from {colored(sender_name, 'blue')}: it would be written outside {self.received_files_dir}.")
+                filesize = None
+                return
+            if not self._claim(received_file_path, connection, supersede=resume):
+                self._reject(sender_socket, verdict, f"'{colored(filename, 'yellow')}' from {colored(sender_name, 'blue')}: it is still being received over another connection.")
+                filesize = None
+                return
+            claimed_path = received_file_path
+            if resume:
+                if os.path.exists(received_file_path) and os.stat(received_file_path).st_nlink > 1:
+                    self.content_store.release(received_file_path) # a stored file rather than a partial one: start over
+                # the sender lost its previous path mid-transfer: tell it how much of the file already arrived
+                received_size = resumed_from = min(os.path.getsize(received_file_path), filesize) if os.path.exists(received_file_path) else 0
+                sender_socket.sendall(f"{received_size}\n".encode('utf-8'))
+                digest = self.content_store.hash_prefix(received_file_path, received_size) if received_size else hashlib.sha256()
+                print(f"Resuming '{colored(filename, 'yellow')}' from byte {colored(str(received_size), 'light_yellow')}.")
+            else:
+                stored = self.content_store.lookup(offer, filesize) if offer else None
+                if stored is not None:
+                    self.content_store.link(stored, received_file_path)
+                    sender_socket.sendall(b"HAVE\n")
+                    received_size = resumed_from = filesize
+                    self.bytes_deduplicated.inc(filesize, direction='received')
+                    print(f"Already have the content of '{colored(filename, 'yellow')}' from an earlier transfer. Nothing to receive from {colored(sender_name, 'blue')}.")
+                    return
+                if offer or verdict:
+                    sender_socket.sendall(b"SEND\n")
+                if os.path.exists(received_file_path):
+                    print(f"{colored('WARNING:', 'red')} File '{colored(filename, 'yellow')}' already exists. Overwriting it.")
+                    self.content_store.release(received_file_path)
+                digest = hashlib.sha256()
 
-            received_size = 0
-            with open(received_file_path, 'wb') as f:
-                with tqdm(total=filesize, desc=f"Receiving {filename} from {sender_name}", unit='B', 
+            meter = TransferMeter(self.bytes_transferred, sender_name, filename, direction='received')
+            self.transfers.add(meter)
+            with open(received_file_path, 'r+b' if resume and os.path.exists(received_file_path) else 'wb') as f:
+                f.seek(received_size)
+                f.truncate()
+                with tqdm(total=filesize, initial=received_size, desc=f"Receiving {filename} from {sender_name}", unit='B', 
                           unit_scale=True, unit_divisor=1024) as filesize_loop:
+                    if leftover:
+                        f.write(leftover)
+                        digest.update(leftover)
+                        meter.add(len(leftover))
+                        filesize_loop.update(len(leftover))
+                        received_size += len(leftover)
                     while received_size < filesize:
                         data = sender_socket.recv(self.file_packet_size)
                         if not data:
                             print(f"Connection lost while receiving {filename}.")
                             break
                         f.write(data)
+                        digest.update(data)
+                        meter.add(len(data))
                         filesize_loop.update(len(data))
                         received_size += len(data)
             if received_size == filesize:
+                if offer is not None and digest.hexdigest() != offer:
+                    print(f"{colored('WARNING:', 'red')} '{colored(filename, 'yellow')}' does not match the hash {colored(sender_name, 'blue')} offered. It was kept but not added to the store.")
+                else:
+                    self.content_store.add(received_file_path, digest.hexdigest())
                 print(f"File '{colored(filename, 'yellow')}' received successfully from {colored(sender_name, 'blue')}.")
             else:
                 print(f"File '{colored(filename, 'yellow')}' received with {colored('incomplete data', 'red')}. Expected {colored(str(filesize), 'light_yellow')} bytes but received {colored(str(received_size), 'light_yellow')} bytes.")
@@ -106,8 +230,80 @@ class DataSharing(object):
             print("File transfer interrupted by user.")
         finally:
             sender_socket.close()
+            self._unclaim(claimed_path, connection)
+            self.active_connections.dec(direction='received')
+            if meter is not None:
+                meter.flush()
+                self.transfers.discard(meter)
+            if filesize is not None:
+                self.transfers_finished.inc(direction='received', result='complete' if received_size == filesize else 'incomplete')
+                self.curr_device.stats.record_transfer(sender_name, 'received', received_size - resumed_from, time.perf_counter() - start_time, success=received_size == filesize)
+                self.radar.record_throughput(sender_ip, received_size - resumed_from, time.perf_counter() - start_time)
             print(f"Connection with {colored(sender_name, 'blue')} closed.")
 
+    def _claim(self, path:str, connection, supersede:bool=False):
+        """
+        Waits until no other receive is writing a file, for at most `RECEIVE_TIMEOUT` seconds. Must be paired with
+        `_unclaim` once the file is written.
+
+        Args:
+            path (str): The path of the received file.
+            connection (socket.socket): The connection the file is received over.
+            supersede (bool): Whether to cut off the latest other connection receiving the file first - a resume
+            replaces a connection whose path died, which would otherwise hold the file until it times out. Defaults to False.
+
+        Returns:
+            bool: True if the file may be written, False if another receive still holds it.
+        """
+        with self.receiving_lock:
+            entry = self.receiving.setdefault(path, [threading.Lock(), None, 0])
+            previous, entry[1] = entry[1], connection
+            entry[2] += 1
+        if supersede and previous is not None:
+            try:
+                previous.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if entry[0].acquire(timeout=self.RECEIVE_TIMEOUT):
+            return True
+        self._unclaim(path, connection, locked=False)
+        return False
+
+    def _unclaim(self, path:str, connection, locked:bool=True):
+        """
+        Lets the next receive of a file write it (see `_claim`).
+        """
+        if path is None:
+            return
+        with self.receiving_lock:
+            entry = self.receiving[path]
+            if entry[1] is connection:
+                entry[1] = None
+            entry[2] -= 1
+            if entry[2] == 0:
+                del self.receiving[path]
+        if locked:
+            entry[0].release()
+
+    def _reject(self, sender_socket, verdict:bool, reason:str):
+        """
+        Refuses an incoming file, telling the sender if it asked for a verdict (see `file_receiving`).
+        """
+        print(f"{colored('Rejected', 'red')} {reason}")
+        if verdict:
+            sender_socket.sendall(b"REJECT\n")
+
+    @staticmethod
+    def _safe_name(name:str):
+        """
+        Reduces a file or device name received from another device to one path component.
+
+        Returns:
+            str: The last component of the name, or None if nothing usable is left (empty, `.` or `..`).
+        """
+        name = os.path.basename(name.replace('\\', '/')).strip().replace('\0', '')
+        return name if name not in ('', '.', '..') else None
+
     def background_process(self):
         """
         Initialises the background process by making the device ready to accept files. 
@@ -119,12 +315,14 @@ class DataSharing(object):
         assert isinstance(self.curr_device, User), "curr_device must be an instance of User"
         print(f"Background processes initiated.\n")
         print(f"Your device {colored(self.curr_device.name, 'blue')} is online, discoverable and browsing on the {colored('InterAct Platform', 'magenta', attrs=['bold'])}.")
-        usr_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        usr_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        usr_socket = None
 
         try:
-            usr_socket.bind(('', self.curr_device.file_transfer_port)) # Bind to all network interfaces on the specified port
-            usr_socket.listen(5)
+            # Bind to all network interfaces (IPv4 and, where supported, IPv6) on the specified port
+            if socket.has_dualstack_ipv6():
+                usr_socket = socket.create_server(('', int(self.curr_device.file_transfer_port)), family=socket.AF_INET6, backlog=5, dualstack_ipv6=True)
+            else:
+                usr_socket = socket.create_server(('', int(self.curr_device.file_transfer_port)), backlog=5)
             # print(f"Listening for incoming file transfers on {colored(self.curr_device.file_transfer_port, 'light_cyan')}...")
 
             while True:
@@ -139,18 +337,24 @@ class DataSharing(object):
         except Exception as e:
             print(f"An error occurred while starting the file transfer server: {e}")
         finally:
-            usr_socket.close()
+            if usr_socket:
+                usr_socket.close()
             print("File transfer server closed.")
     
     def file_sharing(self, filepath:str, receiver_name:str, receiver_ip:str, receiver_port:int):
         """
-        Handles the file sharing process between two devices.
+        Handles the file sharing process between two devices. \\
+        The transfer uses the best path to the receiver (see `Radar.paths`). If that path dies mid-transfer,
+        it fails over to the receiver's next address and resumes from where the receiver left off.
 
         Args:
             filepath (str): The path to the file to be shared.
             receiver_name (str): The name of the receiver device.
             receiver_ip (str): The IP address of the receiver device.
             receiver_port (int): The port number of the receiver device.
+
+        Returns:
+            bool: True if the file was sent completely, False otherwise.
         
         Raises:
             FileNotFoundError: If the specified file does not exist.
@@ -158,39 +362,163 @@ class DataSharing(object):
         assert os.path.exists(filepath), f"File {filepath} does not exist."
         assert isinstance(receiver_name, str) and receiver_name, "receiver_name must be a non-empty string"
 
-        receiver_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filename = os.path.basename(filepath)
+        filesize = os.path.getsize(filepath)
+        addresses = self.radar.paths(receiver_name, preferred=receiver_ip)
+        chunk_size = max(self.file_packet_size, self.radar.transfer_plan(receiver_name, receiver_ip)['chunk_size'])
+        progress = {'sent': 0, 'transferred': 0}
+        success = False
+        start_time = time.perf_counter()
+        meter = TransferMeter(self.bytes_transferred, receiver_name, filename, direction='sent')
+        self.transfers.add(meter)
+        with tqdm(total=filesize, desc=f"Sending {filename} to {receiver_name}", unit='B', 
+                  unit_scale=True, unit_divisor=1024) as filesize_loop:
+            for attempt, address in enumerate(addresses):
+                if attempt:
+                    print(f"Failing over to {colored(address, 'cyan')}...")
+                try:
+                    self._send_file(filepath, filename, filesize, receiver_name, address, receiver_port, progress, filesize_loop, chunk_size, meter)
+                    success = True
+                    break
+                except HandshakeError as e:
+                    print(f"{colored('Could not authenticate', 'red')} {colored(receiver_name, 'blue')}: {e}")
+                    break
+                except TransferRejected as e:
+                    print(f"{colored('Rejected', 'red')} by {colored(receiver_name, 'blue')}: {e}")
+                    break
+                except (socket.error, ConnectionResetError) as e:
+                    print(f"Connection error on {colored(address, 'cyan')}: {e}")
+                except Exception as e:
+                    print(f"Unexpected error while sending file: {e}")
+                    break
+        meter.flush()
+        self.transfers.discard(meter)
+        self.transfers_finished.inc(direction='sent', result='complete' if success else 'incomplete')
+        if success:
+            print(colored(f"File '{colored(filename, 'yellow')}' sent successfully to {colored(receiver_name, 'blue')}.", 'green'))
+        self.curr_device.stats.record_transfer(receiver_name, 'sent', progress['transferred'], time.perf_counter() - start_time, success=success)
+        print(f"Connection with {colored(receiver_name, 'blue')} closed.")
+        return success
+
+    def _connect(self, receiver_name:str, receiver_ip:str, receiver_port:int):
+        """
+        Opens an encrypted channel to the receiver. Receivers from before encryption close the connection on the
+        handshake; they are sent to in plaintext, unless their identity has been pinned already (a pinned device
+        that refuses encryption is never downgraded).
+
+        Returns:
+            SecureChannel or socket.socket: The connection to send over.
+
+        Raises:
+            socket.error: If the path fails or the receiver cannot be authenticated.
+        """
+        # the timeout also detects a path dying mid-transfer
+        receiver_socket = socket.create_connection((receiver_ip, receiver_port), timeout=10)
         try:
-            receiver_socket.connect((receiver_ip, receiver_port))
+            return self.transport.connect(receiver_socket, receiver_name)
+        except HandshakeError:
+            receiver_socket.close()
+            raise
+        except ConnectionResetError:
+            receiver_socket.close()
+            if self.curr_device.get_public_key(receiver_name) is not None:
+                raise HandshakeError(f"{receiver_name} refused an encrypted session although its identity is pinned.")
+        print(f"{colored('WARNING:', 'red')} {colored(receiver_name, 'blue')} does not support encryption. Sending in plaintext.")
+        return socket.create_connection((receiver_ip, receiver_port), timeout=10)
+
+    def _send_file(self, filepath:str, filename:str, filesize:int, receiver_name:str, receiver_ip:str, receiver_port:int, progress:dict, filesize_loop:tqdm, chunk_size:int=None, meter:TransferMeter=None):
+        """
+        Sends a file over one path to the receiver. Resumes the transfer if earlier attempts already sent data.
+
+        Args:
+            filepath (str): The path to the file to be shared.
+            filename (str): The name under which the file is shared.
+            filesize (int): The size of the file in bytes.
+            receiver_name (str): The name of the receiver device.
+            receiver_ip (str): The address of the path to use.
+            receiver_port (int): The port number of the receiver device.
+            progress (dict): The file offset reached (`sent`) and the bytes put on the wire over all attempts (`transferred`); updated in place.
+            filesize_loop (tqdm): The progress bar of the transfer.
+            chunk_size (int): Bytes read and sent per call - sized to the link by `Radar.transfer_plan`. Defaults to `file_packet_size`.
+            meter (TransferMeter): Counts the bytes sent for the metrics. Defaults to None.
+
+        Raises:
+            socket.error: If the path fails.
+            TransferRejected: If the receiver refuses the file.
+        """
+        resume = progress['sent'] > 0
+        with self._connect(receiver_name, receiver_ip, receiver_port) as receiver_socket, self._connection('sent'):
             print(f"Connected to {colored(receiver_name, 'blue')} at {colored(receiver_ip, 'cyan')}:{colored(receiver_port, 'light_cyan')}.")
-            filename = os.path.basename(filepath)
-            filesize = os.path.getsize(filepath)
-            metadata = f"{filename}|{filesize}|{self.curr_device.name}"
+            # receivers with a content store are offered the hash first, and skip the transfer if they have the content
+            features = getattr(receiver_socket, 'peer_features', ())
+            offer = self.content_store.hash_file(filepath) if 'content_store' in features else None
+            verdict = 'verdict' in features # the receiver says whether it accepts the file before any data is sent
+            options = (['resume'] if resume else []) + ([f"offer={offer}"] if offer else []) + (['verdict'] if verdict else [])
+            metadata = f"{filename}|{filesize}|{self.curr_device.name}" + (f"|{','.join(options)}" if options else "") + "\n"
             receiver_socket.sendall(metadata.encode('utf-8'))
             # time.sleep(0.1)
             print(colored("Metadata sent.", 'green'))
 
-            sent_size = 0
+            reply = self._recv_line(receiver_socket) if resume or offer or verdict else None
+            if reply == b'REJECT':
+                raise TransferRejected(f"'{filename}' is not accepted by {receiver_name}.")
+            offset = 0
+            if resume:
+                offset = progress['sent'] = int(reply)
+                filesize_loop.n = offset
+                filesize_loop.refresh()
+            elif reply == b'HAVE':
+                print(f"{colored(receiver_name, 'blue')} already has the content of '{colored(filename, 'yellow')}'. Nothing to send.")
+                progress['sent'] = filesize
+                filesize_loop.n = filesize
+                filesize_loop.refresh()
+                self.bytes_deduplicated.inc(filesize, direction='sent')
+                return
+
+            chunk_size = chunk_size or self.file_packet_size
+            start_time = time.perf_counter()
             with open(filepath, 'rb') as f:
-                with tqdm(total=filesize, desc=f"Sending {filename} to {receiver_name}", unit='B', 
-                                     unit_scale=True, unit_divisor=1024) as filesize_loop:
-                    while True:
-                        data = f.read(self.file_packet_size)
-                        if not data:
-                            break
-                        receiver_socket.sendall(data)
-                        filesize_loop.update(len(data))
-                        sent_size += len(data)
-            print(colored(f"File '{colored(filename, 'yellow')}' sent successfully to {colored(receiver_name, 'blue')}.", 'green'))
-        except (socket.error, ConnectionResetError) as e:
-            print(f"Connection error: {e}")
-        except Exception as e:
-            print(f"Unexpected error while sending file: {e}")
-        finally:
-            receiver_socket.close()
-            print(f"Connection with {colored(receiver_name, 'blue')} closed.")
+                f.seek(offset)
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    receiver_socket.sendall(data)
+                    if meter is not None:
+                        meter.add(len(data))
+                    filesize_loop.update(len(data))
+                    progress['sent'] += len(data)
+                    progress['transferred'] += len(data)
+            self.radar.record_throughput(receiver_ip, progress['sent'] - offset, time.perf_counter() - start_time)
 
-        
+    def _recv_line(self, sock):
+        """
+        Reads a reply line of the receiver (`REJECT`, the resume offset, or `HAVE`/`SEND`).
 
+        Returns:
+            bytes: The line without the newline.
 
+        Raises:
+            ConnectionResetError: If the receiver closes the connection first.
+        """
+        reply = b''
+        while not reply.endswith(b'\n'):
+            data = sock.recv(1)
+            if not data:
+                raise ConnectionResetError("Receiver closed the connection before replying.")
+            reply += data
+        return reply[:-1]
 
-    
+    @contextmanager
+    def _connection(self, direction:str):
+        """
+        Counts a connection in the `active_connections` gauge while the block runs.
+        """
+        self.active_connections.inc(direction=direction)
+        try:
+            yield
+        finally:
+            self.active_connections.dec(direction=direction)
+
+    def _transfer_rates(self):
+        return {(meter.labels['direction'], meter.peer, meter.filename): meter.rate() for meter in list(self.transfers)}
@@ -3,25 +3,131 @@ import os
 import sys
 import threading
 import socket
-from zeroconf import Zeroconf, ServiceBrowser, ServiceInfo
+import selectors
+import struct
+import random
+import json
+import math
+import ipaddress
+from collections import deque
+import asyncio
+from zeroconf import ServiceInfo, ServiceStateChange, IPVersion, current_time_millis
+from zeroconf.asyncio import AsyncZeroconf, AsyncServiceBrowser, AsyncServiceInfo
 import datetime
 from termcolor import colored
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 parent_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(parent_dir)
 
 from user import User
 
+class PhiAccrualDetector(object):
+    """
+    Accrual failure detector for one peer. Instead of a fixed timeout it outputs a suspicion level `phi` that
+    grows with the time since the last heartbeat, relative to the heartbeat intervals observed so far.
+    """
+    def __init__(self, first_interval: float = 1.0, window_size: int = 100, min_std: float = 0.25, acceptable_pause: float = 0.0):
+        """
+        Initialises the detector. Creating it counts as the first heartbeat.
+
+        Args:
+            first_interval (float): Expected heartbeat interval in seconds, used until real intervals are observed. Defaults to 1.
+            window_size (int): Number of recent intervals to keep. Defaults to 100.
+            min_std (float): Lower bound of the interval standard deviation in seconds, to tolerate jitter. Defaults to 0.25.
+            acceptable_pause (float): Extra seconds of silence tolerated before suspicion starts to grow. Defaults to 0.
+        """
+        self.intervals = deque([first_interval, first_interval + first_interval / 4], maxlen=window_size)
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.last_heartbeat = time.monotonic()
+
+    def heartbeat(self, now: float = None):
+        """
+        Records the arrival of a heartbeat.
+
+        Args:
+            now (float): Arrival time from `time.monotonic()`. Defaults to now.
+        """
+        now = time.monotonic() if now is None else now
+        self.intervals.append(now - self.last_heartbeat)
+        self.last_heartbeat = now
+
+    def phi(self, now: float = None):
+        """
+        Get the current suspicion level - e.g. a `phi` of 8 means a ~1e-8 chance that the peer is still alive
+        given the observed intervals.
+
+        Args:
+            now (float): Current time from `time.monotonic()`. Defaults to now.
+
+        Returns:
+            float: The suspicion level.
+        """
+        now = time.monotonic() if now is None else now
+        mean = sum(self.intervals) / len(self.intervals) + self.acceptable_pause
+        std = max(math.sqrt(sum((interval - mean) ** 2 for interval in self.intervals) / len(self.intervals)), self.min_std)
+        y = (now - self.last_heartbeat - mean) / std
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y)) # logistic approximation of the normal CDF
+        p = e / (1.0 + e) if now - self.last_heartbeat > mean else 1.0 - 1.0 / (1.0 + e)
+        return -math.log10(max(p, 1e-300))
+
+class LinkEstimate(object):
+    """
+    Rolling estimate of the round-trip time and bandwidth of one path (address) to a peer.
+    """
+    SMOOTHING = 0.25
+
+    def __init__(self):
+        """
+        Initialises an empty estimate. Values are exponentially weighted moving averages of the samples.
+        """
+        self.rtt_ms = None
+        self.bandwidth_bps = None
+        self.samples = 0
+        self.updated_at = None
+
+    def add_rtt(self, rtt_ms: float):
+        """
+        Folds a round-trip time sample (ms) into the estimate.
+        """
+        self.rtt_ms = rtt_ms if self.rtt_ms is None else self.rtt_ms + self.SMOOTHING * (rtt_ms - self.rtt_ms)
+        self.samples += 1
+        self.updated_at = time.monotonic()
+
+    def add_bandwidth(self, bandwidth_bps: float):
+        """
+        Folds a bandwidth sample (bits/s) into the estimate.
+        """
+        self.bandwidth_bps = bandwidth_bps if self.bandwidth_bps is None else self.bandwidth_bps + self.SMOOTHING * (bandwidth_bps - self.bandwidth_bps)
+        self.samples += 1
+        self.updated_at = time.monotonic()
+
+    def transfer_time(self, num_bytes: int = 1024*1024):
+        """
+        Estimates the seconds needed to move `num_bytes` over the path - used to rank paths and peers.
+        Unknown values count as a slow link rather than as unreachable.
+        """
+        rtt = (self.rtt_ms if self.rtt_ms is not None else 1000.0) / 1000
+        bandwidth = self.bandwidth_bps if self.bandwidth_bps else 1e6
+        return rtt + num_bytes * 8 / bandwidth
+
 class Radar(object):
     """
     Class to discover online devices. 
     """
+    PING_PACKET = struct.Struct('!4sQ') # magic, nonce
+    PING_REQUEST = b'IAP1'
+    PING_REPLY = b'IAR1'
+    RTT_SMOOTHING = 0.25
+
     def __init__(self, root_usr_dir: str, curr_device: User):
         """
         Initialises the Radar class for discovering devices. \\
         Note that the service type is set to `_interact._tcp.local.` by default, which is used for service discovery in the InterAct platform.
-        Also, the ping port has been set to `12346` by default, which is used for pinging devices to ensure their availability.
+        Also, the ping port has been set to `12346` by default, which is used for pinging devices to ensure their availability. \\
+        Pings are UDP echoes on that port (the round-trip time is kept per device in `rtts`), with a TCP connect as fallback.
 
         Args:
             root_usr_dir (str): The root directory where user data is stored.
@@ -44,11 +150,34 @@ class Radar(object):
         self.service_type = "_interact._tcp.local."
         self.is_discoverable = threading.Event()
         self.is_browsing = threading.Event()
+        self.loop = None
+        self.aiozc = None
+        self.info_ann = None
+        self.announced = None
+        self.service_browser = None
+        self.service_cache = {} # service name -> (ServiceInfo, expiry from time.monotonic())
+        self.resolving = set()
+        self.tasks = set()
+        self.peers_file = os.path.join(self.root_usr_dir, "peers.json")
+        self.peer_ttl = 3 * 24 * 3600
+        self.peers = {} # device name -> last known endpoint, see `remember_peer`
+        self.peers_lock = threading.Lock() # `peers` is updated by the browser, the pinger, heartbeats and transfers
+        self.peers_saved_at = 0.0
         self.ping_port = 12346
+        self.rtts = {}
+        self.links = {} # address -> LinkEstimate
+        self.detectors = {}
+        self.is_heartbeating = threading.Event()
+        self.heartbeat_interval = 1.0
+        self.phi_threshold = 8.0
+        self.discovery_events = self.curr_device.metrics.counter('discovery_events_total', "Devices resolved or removed by the service browser.", ('event',))
+        self.verify_latency = self.curr_device.metrics.histogram('verify_latency_seconds', "Time taken to probe a device, by outcome.", ('result',),
+                                                                buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0))
     
     def add_service(self, zeroconf_instance, type, name):
         """
-        Adds device to the list of discovered devices. This method is called when a new service is found by the Zeroconf service browser.
+        Adds device to the list of discovered devices. This is the blocking `ServiceListener` entry point; the
+        asynchronous browser started by `browse` resolves services without blocking and calls `handle_service_info`.
 
         Args:
             zeroconf_instance (Zeroconf): The Zeroconf instance that discovered the service.
@@ -57,34 +186,53 @@ class Radar(object):
         """
         info = zeroconf_instance.get_service_info(type, name)
         if info:
-            device = {
-                'name': info.name.split('.')[0],
-                'ip_address': socket.inet_ntoa(info.addresses[0]),
-                'port': info.port,
-                'status': 'online',
-                'last_active': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-
-            if device['name'] == self.curr_device.name:
-                return
-            
-            contact_exists = self.curr_device.get_contacts_by_name(device['name'])
-            if not contact_exists.empty:
-                self.curr_device.update_contacts_status(device['ip_address'], 'online', port=device['port'], last_active=device['last_active'], name=device['name'], mode=contact_exists['mode'].values[0])
-            
-            existing_device = next((d for d in self.devices if d['ip_address'] == device['ip_address']), None)
-            if existing_device:
-                for key in device:
-                    existing_device[key] = device[key]
-            else:
-                self.devices.append(device)
-            
-            # self.curr_device.update_contacts_status(device['ip_address'], 'online', port=device['port'], last_active=device['last_active'], name=device['name'], mode=device['mode'])
-            #
+            self.handle_service_info(info)
 
-            # print(f"\nDevice {colored(device['name'], 'blue')} at {colored(device['ip_address'], 'cyan')}:{colored(device['port'], 'light_cyan')} found {colored('online', 'green')}.")
-        else:
+    def handle_service_info(self, info: ServiceInfo):
+        """
+        Adds (or refreshes) a device in the list of discovered devices from its resolved service information.
+
+        Args:
+            info (ServiceInfo): The resolved service information of the device.
+        """
+        addresses = info.parsed_scoped_addresses()
+        if not addresses:
             return
+        addresses.sort(key=lambda address: ':' in address) # IPv4 first until the paths have been measured
+        device = {
+            'name': info.name.split('.')[0],
+            'ip_address': addresses[0],
+            'addresses': addresses,
+            'port': info.port,
+            'status': 'online',
+            'last_active': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+        if device['name'] == self.curr_device.name:
+            return
+        self.discovery_events.inc(event='added')
+        if len(addresses) > 1 or addresses[0] not in self.links:
+            reachable = [address for address, rtt in self.probe_paths(addresses).items() if rtt is not None]
+            for address in reachable:
+                self.probe_bandwidth(address)
+            device['ip_address'] = self._rank_paths(addresses)[0]
+        self.curr_device.stats.record_discovery(device['name'])
+        
+        contact_exists = self.curr_device.get_contacts_by_name(device['name'])
+        if not contact_exists.empty:
+            self.curr_device.update_contacts_status(device['ip_address'], 'online', port=device['port'], last_active=device['last_active'], name=device['name'], mode=contact_exists['mode'].values[0])
+        else:
+            self.curr_device.record_presence(device['name'], 'online')
+        
+        existing_device = next((d for d in self.devices if d['name'] == device['name'] or d['ip_address'] == device['ip_address']), None)
+        if existing_device:
+            for key in device:
+                existing_device[key] = device[key]
+        else:
+            self.devices.append(device)
+        self.remember_peer(device['name'], device['ip_address'], device['port'])
+        
+        # print(f"\nDevice {colored(device['name'], 'blue')} at {colored(device['ip_address'], 'cyan')}:{colored(device['port'], 'light_cyan')} found {colored('online', 'green')}.")
     
     def remove_service(self, zeroconf_instance, type, name):
         """
@@ -96,12 +244,15 @@ class Radar(object):
             name (str): The name of the service.
         """
         device_name = name.split('.')[0]
+        self.discovery_events.inc(event='removed')
         # info = zeroconf_instance.get_service_info(type, name)
         # ip_address = socket.inet_ntoa(info.address[0])
         device_info = self.curr_device.get_contacts_by_name(device_name)
         if not device_info.empty:
-            self.curr_device.update_contacts_status(device_info['ip_address'], 'offline')
+            self.curr_device.update_contacts_status(device_info['ip_address'].values[0], 'offline', name=device_name)
             print(f"Device {colored(device_name, 'blue')} at {colored(device_info['ip_address'].values[0], 'cyan')} went {colored('offline', 'red')}.")
+        else:
+            self.curr_device.record_presence(device_name, 'offline')
         self.devices = [device for device in self.devices if device['name'] != device_name]
 
     def update_service(self, zeroconf_instance, type, name): 
@@ -110,48 +261,530 @@ class Radar(object):
         """
         self.add_service(zeroconf_instance, type, name)
     
-    def verify(self, device_name: str, ip_address: str, port: int):
+    def probe(self, ip_address: str, timeout: float = 2.0):
         """
-        Verifies if the device with the given name, IP address, and port is online.
+        Pings a device and measures the round-trip time. A UDP echo is tried first; if no reply arrives within
+        half of the timeout, a TCP connect to the ping port is timed instead (older ping servers only accept TCP).
+        The timeout only applies to this probe's sockets.
 
         Args:
-            device_name (str): The name of the device.
-            ip_address (str): The IP address of the device.
-            port (int): The port of the device.
+            ip_address (str): The IP address (IPv4 or IPv6) of the device.
+            timeout (float): Total seconds to wait for the device. Defaults to 2.
 
         Returns:
-            bool: True if the device is truly online, False otherwise.
+            float: The round-trip time in milliseconds, or None if the device is unreachable.
+        """
+        start = time.perf_counter()
+        rtt = self._probe(ip_address, timeout)
+        self.verify_latency.observe(time.perf_counter() - start, result='online' if rtt is not None else 'offline')
+        return rtt
+
+    def _probe(self, ip_address: str, timeout: float):
+        nonce = random.getrandbits(64)
+        try:
+            family, _, _, _, address = socket.getaddrinfo(ip_address, self.ping_port, type=socket.SOCK_DGRAM)[0]
+        except socket.gaierror:
+            return None
+        udp_socket = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            start = time.perf_counter()
+            udp_socket.sendto(self.PING_PACKET.pack(self.PING_REQUEST, nonce), address)
+            deadline = start + timeout / 2
+            while (remaining := deadline - time.perf_counter()) > 0:
+                udp_socket.settimeout(remaining)
+                data = udp_socket.recv(65535)
+                if len(data) >= self.PING_PACKET.size and self.PING_PACKET.unpack_from(data) == (self.PING_REPLY, nonce):
+                    return (time.perf_counter() - start) * 1000
+        except OSError:
+            pass
+        finally:
+            udp_socket.close()
+
+        try:
+            start = time.perf_counter()
+            with socket.create_connection((ip_address, self.ping_port), timeout=timeout / 2):
+                return (time.perf_counter() - start) * 1000
+        except OSError:
+            return None
+
+    def probe_paths(self, addresses: list, timeout: float = 2.0):
+        """
+        Probes every address of a device in parallel and records the RTT of each path.
+
+        Args:
+            addresses (list): The IP addresses (IPv4 and/or IPv6) advertised by the device.
+            timeout (float): Seconds to wait for each probe. Defaults to 2.
+
+        Returns:
+            dict: Maps each address to its round-trip time in milliseconds, or None if it is unreachable.
+        """
+        with ThreadPoolExecutor(max_workers=len(addresses), thread_name_prefix='Path_Probe_Thread') as executor:
+            path_rtts = dict(zip(addresses, executor.map(lambda address: self.probe(address, timeout), addresses)))
+        for address, rtt in path_rtts.items():
+            if rtt is not None:
+                self.links.setdefault(address, LinkEstimate()).add_rtt(rtt)
+        return path_rtts
+
+    def probe_bandwidth(self, ip_address: str, packets: int = 16, packet_size: int = 1200, timeout: float = 1.0):
+        """
+        Estimates the bandwidth of a path with a short train of padded UDP pings: the ping server echoes them
+        back-to-back, and the spacing of the echoes reveals the bottleneck capacity. Costs ~`packets * packet_size`
+        bytes each way.
+
+        Args:
+            ip_address (str): The address of the path.
+            packets (int): Number of packets in the train. Defaults to 16.
+            packet_size (int): Size of each packet in bytes. Defaults to 1200 (fits common MTUs).
+            timeout (float): Seconds to wait for the echoes. Defaults to 1.
+
+        Returns:
+            float: The estimated bandwidth in bits/s, or None if too few echoes arrived.
+        """
+        try:
+            family, _, _, _, address = socket.getaddrinfo(ip_address, self.ping_port, type=socket.SOCK_DGRAM)[0]
+        except socket.gaierror:
+            return None
+        nonce = random.getrandbits(64)
+        packet = self.PING_PACKET.pack(self.PING_REQUEST, nonce) + bytes(max(packet_size - self.PING_PACKET.size, 0))
+        arrivals = []
+        probe_socket = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            for _ in range(packets):
+                probe_socket.sendto(packet, address)
+            deadline = time.perf_counter() + timeout
+            while len(arrivals) < packets and (remaining := deadline - time.perf_counter()) > 0:
+                probe_socket.settimeout(remaining)
+                data = probe_socket.recv(65535)
+                if len(data) >= self.PING_PACKET.size and self.PING_PACKET.unpack_from(data) == (self.PING_REPLY, nonce):
+                    arrivals.append((time.perf_counter(), len(data)))
+        except OSError:
+            pass
+        finally:
+            probe_socket.close()
+
+        if len(arrivals) < 4 or arrivals[-1][0] <= arrivals[0][0]:
+            return None
+        bandwidth = sum(size for _, size in arrivals[1:]) * 8 / (arrivals[-1][0] - arrivals[0][0])
+        self.links.setdefault(ip_address, LinkEstimate()).add_bandwidth(bandwidth)
+        return bandwidth
+
+    @staticmethod
+    def normalize_address(ip_address: str):
+        """
+        Get the address under which a path is known. Dual-stack servers see IPv4 peers as IPv4-mapped IPv6
+        addresses (`::ffff:a.b.c.d`), which are turned back into the IPv4 address the device advertises.
         """
         try:
-            socket.setdefaulttimeout(2)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((ip_address, self.ping_port))
-            sock.close()
-            print(f"Device {colored(device_name, 'blue')} at {colored(ip_address, 'cyan')}:{colored(port, 'light_cyan')} is online.")
+            mapped = ipaddress.IPv6Address(ip_address).ipv4_mapped
+        except ValueError:
+            return ip_address
+        return str(mapped) if mapped is not None else ip_address
+
+    def record_throughput(self, ip_address: str, num_bytes: int, seconds: float):
+        """
+        Feeds the throughput of a real transfer over a path into its bandwidth estimate (passive measurement).
+        Transfers too small to fill the link are ignored.
+
+        Args:
+            ip_address (str): The address of the path used (as seen by the socket; IPv4-mapped addresses are normalized).
+            num_bytes (int): Number of bytes transferred.
+            seconds (float): Duration of the transfer in seconds.
+        """
+        if num_bytes >= 256*1024 and seconds > 0:
+            self.links.setdefault(self.normalize_address(ip_address), LinkEstimate()).add_bandwidth(num_bytes * 8 / seconds)
+
+    def _rank_paths(self, addresses: list):
+        """
+        Orders addresses from the best path to the worst - shortest estimated transfer time first, paths never measured last.
+        """
+        return sorted(addresses, key=lambda address: (address not in self.links, self.links[address].transfer_time() if address in self.links else 0.0))
+
+    def paths(self, device_name: str, preferred: str = None):
+        """
+        Get the addresses through which a device can be reached, best path first. Used by the transfer layer
+        to pick a path and to fail over to the next one.
+
+        Args:
+            device_name (str): The name of the device.
+            preferred (str): An address to include even if the device was not discovered (e.g. from the contacts). Defaults to None.
+
+        Returns:
+            list: The addresses of the device ordered by preference.
+        """
+        device = next((d for d in self.devices if d['name'] == device_name), None)
+        addresses = list(device.get('addresses', [device['ip_address']])) if device else []
+        if preferred and preferred not in addresses:
+            addresses.append(preferred)
+        return self._rank_paths(addresses)
+
+    def link_stats(self, device_name: str, ip_address: str = None):
+        """
+        Get the link estimate of a device over its best path.
+
+        Args:
+            device_name (str): The name of the device.
+            ip_address (str): An address to consider if the device was not discovered (e.g. from the contacts). Defaults to None.
+
+        Returns:
+            dict: `address`, `rtt_ms`, `bandwidth_bps` and `samples` of the best path (values are None if never measured).
+        """
+        addresses = self.paths(device_name, preferred=ip_address)
+        link = self.links.get(addresses[0]) if addresses else None
+        return {
+            'address': addresses[0] if addresses else None,
+            'rtt_ms': link.rtt_ms if link and link.rtt_ms is not None else self.rtts.get(device_name),
+            'bandwidth_bps': link.bandwidth_bps if link else None,
+            'samples': link.samples if link else 0
+        }
+
+    def rank_peers(self, device_names: list, num_bytes: int = 1024*1024):
+        """
+        Orders devices by how fast `num_bytes` could be moved to or from them - e.g. to pick a source for a file several peers have.
+
+        Args:
+            device_names (list): The names of the candidate devices.
+            num_bytes (int): Size of the transfer to rank for. Defaults to 1MB.
+
+        Returns:
+            list: The device names, fastest first.
+        """
+        def estimated_time(device_name):
+            addresses = self.paths(device_name)
+            return self.links[addresses[0]].transfer_time(num_bytes) if addresses and addresses[0] in self.links else float('inf')
+        return sorted(device_names, key=estimated_time)
+
+    def transfer_plan(self, device_name: str, ip_address: str = None):
+        """
+        Suggests transfer parameters for a device from its bandwidth-delay product (BDP): the chunk size handed
+        to each send call.
+
+        Args:
+            device_name (str): The name of the device.
+            ip_address (str): An address to consider if the device was not discovered. Defaults to None.
+
+        Returns:
+            dict: `chunk_size` in bytes (4KB to 1MB).
+        """
+        stats = self.link_stats(device_name, ip_address)
+        if stats['rtt_ms'] is None or not stats['bandwidth_bps']:
+            return {'chunk_size': 64*1024}
+        bdp = stats['bandwidth_bps'] / 8 * stats['rtt_ms'] / 1000
+        chunk_size = 4*1024
+        while chunk_size < bdp / 4 and chunk_size < 1024*1024:
+            chunk_size *= 2
+        return {'chunk_size': chunk_size}
+
+    def _update_rtt(self, device_name: str, rtt: float, ip_address: str = None):
+        """
+        Folds a new round-trip time measurement (ms) into the smoothed RTT of the device (and of the path, if given).
+        """
+        previous = self.rtts.get(device_name)
+        self.rtts[device_name] = rtt if previous is None else previous + self.RTT_SMOOTHING * (rtt - previous)
+        if ip_address is not None:
+            self.links.setdefault(ip_address, LinkEstimate()).add_rtt(rtt)
+
+    def _apply_verification(self, results: dict):
+        """
+        Applies the outcome of one or more verifications to the contacts (in a single write) and to the discovered devices.
+
+        Args:
+            results (dict): Maps `(device_name, ip_address, port)` to the measured round-trip time in milliseconds (None if unreachable).
+        """
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        updates = []
+        for (device_name, ip_address, port), rtt in results.items():
+            status = 'online' if rtt is not None else 'offline'
+            if rtt is not None:
+                self._update_rtt(device_name, rtt, ip_address)
+                self.remember_peer(device_name, ip_address, port, save=False)
             contact_exists = self.curr_device.get_contacts_by_name(device_name)
             if not contact_exists.empty:
-                self.curr_device.update_contacts_status(ip_address, 'online', port=port, last_active=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), name=device_name, mode=contact_exists['mode'].values[0])
-            
+                updates.append({'ip_address': ip_address, 'status': status, 'port': port, 'last_active': now, 'name': device_name, 'mode': contact_exists['mode'].values[0]})
+            else:
+                self.curr_device.record_presence(device_name, status)
+
             for device in self.devices:
                 if device['ip_address'] == ip_address and device['port'] == port:
-                    device['status'] = 'online'
-                    device['last_active'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    device['status'] = status
+                    device['last_active'] = now
+                    device['rtt_ms'] = self.rtts.get(device_name)
                     break
-            return True
-    
-        except (socket.timeout, ConnectionRefusedError):
+        if updates:
+            self.curr_device.update_contacts_status_many(updates)
+        self.save_peers()
+
+    def verify(self, device_name: str, ip_address: str, port: int):
+        """
+        Verifies if the device with the given name, IP address, and port is online.
+
+        Args:
+            device_name (str): The name of the device.
+            ip_address (str): The IP address of the device.
+            port (int): The port of the device.
+
+        Returns:
+            bool: True if the device is truly online, False otherwise.
+        """
+        rtt = self.probe(ip_address)
+        if rtt is not None:
+            print(f"Device {colored(device_name, 'blue')} at {colored(ip_address, 'cyan')}:{colored(port, 'light_cyan')} is online (RTT: {rtt:.1f} ms).")
+        else:
             print(f"Device {colored(device_name, 'blue')} at {colored(ip_address, 'cyan')}:{colored(port, 'light_cyan')} is offline or unreachable.")
-            contact_exists = self.curr_device.get_contacts_by_name(device_name)
-            if not contact_exists.empty:
-                self.curr_device.update_contacts_status(ip_address, 'offline', port=port, last_active=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), name=device_name, mode=contact_exists['mode'].values[0])
+        self._apply_verification({(device_name, ip_address, port): rtt})
+        return rtt is not None
 
-            for device in self.devices:
-                if device['ip_address'] == ip_address and device['port'] == port:
-                    device['status'] = 'offline'
-                    device['last_active'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    break
-            return False
+    def verify_many(self, devices: list, max_workers: int = 32, timeout: float = 2.0, verbose: bool = True):
+        """
+        Verifies several devices concurrently. Results are printed as they arrive and the status updates
+        are applied in one batch once all probes have finished, so the whole sweep takes about one timeout
+        instead of one timeout per offline device.
+
+        Args:
+            devices (list): A list of `(device_name, ip_address, port)` tuples.
+            max_workers (int): Maximum number of probes in flight. Defaults to 32.
+            timeout (float): Seconds to wait for each probe. Defaults to 2.
+            verbose (bool): Whether to print each result. Defaults to True.
+
+        Returns:
+            dict: Maps `(device_name, ip_address, port)` to the round-trip time in milliseconds, or None if the device is offline.
+        """
+        results = {}
+        if not devices:
+            return results
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(devices)), thread_name_prefix='Verify_Thread') as executor:
+            futures = {executor.submit(self.probe, ip_address, timeout): (device_name, ip_address, port) for device_name, ip_address, port in devices}
+            for future in as_completed(futures):
+                device_name, ip_address, port = futures[future]
+                results[futures[future]] = rtt = future.result()
+                if not verbose:
+                    continue
+                if rtt is not None:
+                    print(f"Device {colored(device_name, 'blue')} at {colored(ip_address, 'cyan')}:{colored(port, 'light_cyan')} is online (RTT: {rtt:.1f} ms).")
+                else:
+                    print(f"Device {colored(device_name, 'blue')} at {colored(ip_address, 'cyan')}:{colored(port, 'light_cyan')} is offline or unreachable.")
+        self._apply_verification(results)
+        return results
     
+    def _heartbeat_targets(self):
+        """
+        Get every peer worth sending heartbeats to - the contacts and the discovered devices.
+
+        Returns:
+            dict: Maps device name to `(ip_address, port)`.
+        """
+        targets = {device['name']: (device['ip_address'], device['port']) for device in self.devices}
+        for index, row in self.curr_device.get_contacts().iterrows():
+            targets[row['name']] = (row['ip_address'], int(row['port']))
+        return targets
+
+    def start_heartbeats(self, interval: float = 1.0, phi_threshold: float = 8.0):
+        """
+        Starts the heartbeat subsystem in a background thread. Every `interval` seconds one UDP ping is sent to
+        each peer from a single socket; the echoes feed a `PhiAccrualDetector` per peer. Peers whose suspicion
+        exceeds `phi_threshold` are confirmed with one ordinary probe before being marked offline, and peers that
+        answer again are marked online - all status changes of a round are applied in one batch.
+
+        Args:
+            interval (float): Seconds between heartbeat rounds. Defaults to 1.
+            phi_threshold (float): Suspicion level above which a peer is considered failed - lower detects
+            failures faster, higher gives fewer false alarms on jittery networks. Defaults to 8.
+        """
+        if self.is_heartbeating.is_set():
+            print("Heartbeats are already running.")
+            return
+        self.heartbeat_interval = interval
+        self.phi_threshold = phi_threshold
+        self.is_heartbeating.set()
+        threading.Thread(target=self.heartbeat_loop, name='Heartbeat_Thread', daemon=True).start()
+
+    def stop_heartbeats(self):
+        """
+        Stops the heartbeat subsystem.
+        """
+        self.is_heartbeating.clear()
+
+    def is_alive(self, device_name: str):
+        """
+        Checks the failure detector of a device without any network round trip.
+
+        Args:
+            device_name (str): The name of the device.
+
+        Returns:
+            bool: True if heartbeats are running and the device is not suspected, False otherwise.
+        """
+        detector = self.detectors.get(device_name)
+        return self.is_heartbeating.is_set() and detector is not None and detector.phi() < self.phi_threshold
+
+    def heartbeat_loop(self):
+        """
+        Runs heartbeat rounds until `stop_heartbeats` is called. Intended to be run in a separate thread.
+        """
+        heartbeat_sockets = {} # address family -> socket, created on first use
+        selector = selectors.DefaultSelector()
+        pending = {} # nonce -> (device name, send time)
+        try:
+            while self.is_heartbeating.is_set():
+                round_start = time.monotonic()
+                targets = self._heartbeat_targets()
+                for device_name, (ip_address, port) in targets.items():
+                    nonce = random.getrandbits(64)
+                    pending[nonce] = (device_name, time.perf_counter())
+                    if device_name not in self.detectors:
+                        self.detectors[device_name] = PhiAccrualDetector(first_interval=self.heartbeat_interval)
+                    try:
+                        family, _, _, _, address = socket.getaddrinfo(ip_address, self.ping_port, type=socket.SOCK_DGRAM)[0]
+                        if family not in heartbeat_sockets:
+                            heartbeat_sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+                            heartbeat_sockets[family].setblocking(False)
+                            selector.register(heartbeat_sockets[family], selectors.EVENT_READ)
+                        heartbeat_sockets[family].sendto(self.PING_PACKET.pack(self.PING_REQUEST, nonce), address)
+                    except OSError:
+                        pass
+
+                answered = {}
+                while (remaining := round_start + self.heartbeat_interval - time.monotonic()) > 0:
+                    ready = selector.select(remaining) if heartbeat_sockets else time.sleep(remaining)
+                    for key, _ in ready or []:
+                        try:
+                            data = key.fileobj.recv(65535)
+                        except OSError:
+                            continue
+                        if len(data) < self.PING_PACKET.size:
+                            continue
+                        magic, nonce = self.PING_PACKET.unpack_from(data)
+                        if magic == self.PING_REPLY and nonce in pending:
+                            device_name, sent_at = pending.pop(nonce)
+                            answered[device_name] = (time.perf_counter() - sent_at) * 1000
+                            self.detectors[device_name].heartbeat()
+                pending = {nonce: entry for nonce, entry in pending.items() if time.perf_counter() - entry[1] < 10 * self.heartbeat_interval}
+
+                self._heartbeat_transitions(targets, answered)
+        except Exception as e:
+            print(f"An error occurred in the heartbeat subsystem: {e}")
+        finally:
+            selector.close()
+            for heartbeat_socket in heartbeat_sockets.values():
+                heartbeat_socket.close()
+            self.is_heartbeating.clear()
+
+    def _heartbeat_transitions(self, targets: dict, answered: dict):
+        """
+        Works out which peers changed liveness in the last heartbeat round and applies the changes in one batch.
+
+        Args:
+            targets (dict): Maps device name to `(ip_address, port)` for the peers of this round.
+            answered (dict): Maps device name to the RTT (ms) of its heartbeat echo in this round.
+        """
+        statuses = {device['name']: device['status'] for device in self.devices}
+        for index, row in self.curr_device.get_contacts().iterrows():
+            statuses[row['name']] = row['status']
+
+        results, suspects = {}, []
+        for device_name, (ip_address, port) in targets.items():
+            key = (device_name, ip_address, port)
+            if device_name in answered:
+                if statuses.get(device_name) != 'online':
+                    results[key] = answered[device_name]
+                else:
+                    self._update_rtt(device_name, answered[device_name], ip_address)
+            elif statuses.get(device_name) == 'online' and self.detectors[device_name].phi() >= self.phi_threshold:
+                suspects.append(key)
+
+        if suspects:
+            # Older peers only answer TCP pings, so confirm before declaring them offline.
+            with ThreadPoolExecutor(max_workers=min(32, len(suspects)), thread_name_prefix='Verify_Thread') as executor:
+                for key, rtt in zip(suspects, executor.map(lambda key: self.probe(key[1], timeout=self.heartbeat_interval), suspects)):
+                    if rtt is not None:
+                        self.detectors[key[0]].heartbeat()
+                        self._update_rtt(key[0], rtt, key[1])
+                    else:
+                        print(f"Device {colored(key[0], 'blue')} at {colored(key[1], 'cyan')} went {colored('offline', 'red')}.")
+                        results[key] = None
+        if results:
+            self._apply_verification(results)
+
+    def remember_peer(self, device_name: str, ip_address: str, port: int, save: bool = True):
+        """
+        Records the last known endpoint of a peer in the warm-start cache (`peers.json`). The entry expires
+        `peer_ttl` seconds after the peer was last seen.
+
+        Args:
+            device_name (str): The name of the device.
+            ip_address (str): The IP address the device was last reachable at.
+            port (int): The file transfer port of the device.
+            save (bool): Whether to write the cache to disk (writes are throttled). Defaults to True.
+        """
+        now = time.time()
+        with self.peers_lock:
+            self.peers[device_name] = {'ip_address': ip_address, 'port': int(port), 'last_seen': now, 'expires': now + self.peer_ttl}
+        if save:
+            self.save_peers()
+
+    def save_peers(self, force: bool = False):
+        """
+        Writes the warm-start cache to disk, dropping expired entries. Unless forced, writes are limited to one every 5 seconds.
+
+        Args:
+            force (bool): Write even if the cache was saved recently. Defaults to False.
+        """
+        now = time.time()
+        with self.peers_lock: # also keeps two writers off the same temporary file
+            if not force and now - self.peers_saved_at < 5:
+                return
+            self.peers_saved_at = now
+            self.peers = {name: peer for name, peer in self.peers.items() if peer['expires'] > now}
+            temp_file = self.peers_file + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(self.peers, f, indent=4)
+            os.replace(temp_file, self.peers_file)
+
+    def load_peers(self):
+        """
+        Loads the unexpired entries of the warm-start cache from disk.
+
+        Returns:
+            dict: Maps device name to its last known endpoint.
+        """
+        if not os.path.exists(self.peers_file):
+            return {}
+        try:
+            with open(self.peers_file, 'r') as f:
+                peers = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the peer cache: {e}. Starting with an empty cache.")
+            return {}
+        now = time.time()
+        return {name: peer for name, peer in peers.items() if peer.get('expires', 0) > now and name != self.curr_device.name}
+
+    def warm_start(self):
+        """
+        Restores the peers seen in previous sessions so they are usable right away. \\
+        Cached peers are optimistically marked online (in a single contacts write) and then revalidated
+        in parallel in a background thread; those that do not answer are marked offline again.
+        """
+        peers = self.load_peers()
+        with self.peers_lock:
+            self.peers = dict(peers)
+        if not peers:
+            return
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        updates, targets = [], []
+        for device_name, peer in peers.items():
+            ip_address, port = peer['ip_address'], peer['port']
+            contact_exists = self.curr_device.get_contacts_by_name(device_name)
+            if not contact_exists.empty: # the contact list stays authoritative for the endpoint of contacts
+                ip_address, port = contact_exists['ip_address'].values[0], int(contact_exists['port'].values[0])
+                updates.append({'ip_address': ip_address, 'status': 'online', 'port': port, 'name': device_name, 'mode': contact_exists['mode'].values[0]})
+            if not any(device['name'] == device_name for device in self.devices):
+                self.devices.append({'name': device_name, 'ip_address': ip_address, 'port': port, 'status': 'online', 'last_active': now})
+            targets.append((device_name, ip_address, port))
+        if updates:
+            self.curr_device.update_contacts_status_many(updates)
+
+        threading.Thread(target=self.verify_many, args=(targets,), kwargs={'verbose': False},
+                         name='Warm_Start_Thread', daemon=True).start()
+
     def show_devices(self):
         """
         Displays the list of discovered devices in a formatted manner. This function is called only when the user wants to see the discovered devices.
@@ -163,7 +796,20 @@ class Radar(object):
         print("Discovered devices:")
         for device in self.devices:
             status_color = 'green' if device['status'] == 'online' else 'red'
-            print(f" - {colored(device['name'], 'blue')} (IP: {colored(device['ip_address'], 'cyan')}, Port: {colored(device['port'], 'light_cyan')}, Status: {colored(device['status'], status_color)})")
+            rtt, bandwidth = self.format_link(device['name'])
+            print(f" - {colored(device['name'], 'blue')} (IP: {colored(device['ip_address'], 'cyan')}, Port: {colored(device['port'], 'light_cyan')}, Status: {colored(device['status'], status_color)}, RTT: {colored(rtt, 'light_yellow')}, Link: {colored(bandwidth, 'light_yellow')})")
+
+    def format_link(self, device_name: str, ip_address: str = None):
+        """
+        Formats the RTT and bandwidth estimates of a device for display.
+
+        Returns:
+            tuple: `(rtt, bandwidth)` strings, `n/a` where nothing has been measured yet.
+        """
+        stats = self.link_stats(device_name, ip_address)
+        rtt = f"{stats['rtt_ms']:.1f} ms" if stats['rtt_ms'] is not None else 'n/a'
+        bandwidth = f"{stats['bandwidth_bps'] / 1e6:.1f} Mbit/s" if stats['bandwidth_bps'] else 'n/a'
+        return rtt, bandwidth
         
     def save_devices_as_contacts(self, indices:list):
         """
@@ -188,44 +834,142 @@ class Radar(object):
             # print(f"Device {colored(device['name'], 'blue')} at {colored(device['ip_address'], 'cyan')}:{colored(device['port'], 'light_cyan')} saved as contact.")
         print(f"Selected devices have been saved as contacts in your contact list. You can check the contacts using the {colored('show_contacts', 'yellow', attrs=['underline'])} command.")
     
+    def _start_engine(self):
+        """
+        Starts the event loop thread and the single `AsyncZeroconf` instance shared by announcing and browsing.
+        Does nothing if they are already running.
+        """
+        if self.aiozc is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='Zeroconf_Thread', daemon=True).start()
+
+        async def create_zeroconf():
+            return AsyncZeroconf()
+        self.aiozc = self._run(create_zeroconf())
+
+    def _run(self, coroutine, timeout: float = 10):
+        """
+        Runs a coroutine on the zeroconf event loop and waits for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
     def announce(self):
         """
         Announces the current device on the network using Zeroconf. This ensures that the device is online and 
-        discoverable by other devices on the InterAct platform.
+        discoverable by other devices on the InterAct platform. \\
+        Announcing again with unchanged details sends nothing; changed details update the existing registration.
         """
         curr_device_info = self.curr_device.identify.iloc[0]
         if curr_device_info.empty:
             print("Current device information is not available. Please register your device first.")
             return
-        self.info_ann = ServiceInfo(
+        properties = {
+            'name': curr_device_info['name'],
+            'status': curr_device_info['status'],
+            'last_active': curr_device_info['last_active'],
+            'mode': curr_device_info['mode']
+        }
+        announcement = (curr_device_info['name'], curr_device_info['ip_address'], int(curr_device_info['port']), tuple(properties.items()))
+        if self.is_discoverable.is_set() and announcement == self.announced:
+            return
+
+        info = ServiceInfo(
             self.service_type,
             f"{curr_device_info['name']}.{self.service_type}",
-            addresses=[socket.inet_aton(curr_device_info['ip_address'])],
+            parsed_addresses=list(dict.fromkeys([curr_device_info['ip_address']] + self.curr_device.get_ips())),
             port=int(curr_device_info['port']),
-            properties={
-                'name': curr_device_info['name'],
-                'status': curr_device_info['status'],
-                'last_active': curr_device_info['last_active'],
-                'mode': curr_device_info['mode']
-            },
+            properties=properties,
             server=f"{socket.gethostname()}.local."
         )
-        self.zeroconf_ann = Zeroconf()
-        self.zeroconf_ann.register_service(self.info_ann)
+        self._start_engine()
+        if self.is_discoverable.is_set() and self.info_ann is not None and self.info_ann.name == info.name:
+            self._run(self._async_broadcast(self.aiozc.async_update_service(info)))
+        else:
+            if self.info_ann is not None:
+                self._run(self._async_broadcast(self.aiozc.async_unregister_service(self.info_ann)))
+            self._run(self._async_broadcast(self.aiozc.async_register_service(info)))
+        self.info_ann = info
+        self.announced = announcement
         # print(f"Your device {colored(curr_device_info['name'], 'blue')} is now online and discoverable.")
         self.is_discoverable.set()
+
+    async def _async_broadcast(self, registration):
+        """
+        Waits for a (un)registration and the broadcast it schedules to finish.
+        """
+        await (await registration)
     
     def browse(self):
         """
-        Starts the service browser to discover other devices on the InterAct platform - only those that are online will be discovered.
+        Starts the service browser to discover other devices on the InterAct platform - only those that are online will be discovered. \\
+        The browser runs on the shared zeroconf instance and resolves services asynchronously, so a slow device
+        does not stall the discovery of others.
         """
-        # self.announce() if not self.is_discoverable.is_set() else None
-        self.announce()
-        self.zeroconf_browse = Zeroconf()
-        self.service_browser = ServiceBrowser(self.zeroconf_browse, self.service_type, self)
+        if not self.is_discoverable.is_set():
+            self.announce()
+        if self.is_browsing.is_set():
+            return
+        self._start_engine()
+
+        async def start_browser():
+            return AsyncServiceBrowser(self.aiozc.zeroconf, self.service_type, handlers=[self._on_service_state_change])
+        self.service_browser = self._run(start_browser())
         # print("Starting to browse for devices on the InterAct platform...")
         self.is_browsing.set()
+
+    def _on_service_state_change(self, zeroconf, service_type, name, state_change):
+        """
+        Handler of the service browser. Runs on the event loop, so it only schedules the resolution.
+        """
+        task = asyncio.ensure_future(self._resolve_service(service_type, name, state_change))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _resolve_service(self, service_type, name, state_change):
+        """
+        Resolves a discovered service (using the service-info cache while its TTL lasts) and hands the result
+        to the blocking handlers on a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        if state_change is ServiceStateChange.Removed:
+            self.service_cache.pop(name, None)
+            await loop.run_in_executor(None, self.remove_service, None, service_type, name)
+            return
+
+        cached = self.service_cache.get(name)
+        if state_change is ServiceStateChange.Added and cached and cached[1] > time.monotonic():
+            info = cached[0]
+        else:
+            if name in self.resolving:
+                return
+            self.resolving.add(name)
+            try:
+                info = AsyncServiceInfo(service_type, name)
+                if not await info.async_request(self.aiozc.zeroconf, 3000):
+                    return
+            finally:
+                self.resolving.discard(name)
+            self.service_cache[name] = (info, self._cache_expiry(info))
+        if info.addresses_by_version(IPVersion.All):
+            await loop.run_in_executor(None, self.handle_service_info, info)
     
+    def _cache_expiry(self, info: ServiceInfo):
+        """
+        When a resolved service must be resolved again: when the first of its records (SRV and TXT records of the
+        service, address records of its host) expires from the zeroconf cache, i.e. after the TTLs the device announced.
+
+        Returns:
+            float: The expiry, on the `time.monotonic` clock. Now if none of the records is cached.
+        """
+        now = current_time_millis()
+        cache = self.aiozc.zeroconf.cache
+        records = list(cache.async_entries_with_name(info.name))
+        if info.server:
+            records += cache.async_entries_with_name(info.server)
+        remaining = [record.get_remaining_ttl(now) for record in records if not record.is_expired(now)]
+        return time.monotonic() + (min(remaining) if remaining else 0)
+
     def stop_browsing(self):
         """
         Stops the service browser. The current device will still remain discoverable on other devices.
@@ -234,10 +978,9 @@ class Radar(object):
             print("No active service browser to stop.")
             return
         self.is_browsing.clear()
-        if self.zeroconf_browse:
-            self.zeroconf_browse.close()
-            self.service_browser.cancel()
-            self.zerconf_browse = None
+        if self.service_browser:
+            self._run(self.service_browser.async_cancel())
+            self.service_browser = None
             print("Stopped discovering devices on the InterAct platform.")
         
     def stop_announcing(self):
@@ -248,28 +991,58 @@ class Radar(object):
             print("Your device is already undiscoverable.")
             return
         self.is_discoverable.clear()
-        if self.zeroconf_browse:
+        if self.is_browsing.is_set():
             print("Stopping the service browser before unregistering the service.")
-        self.stop_browsing()
-        if self.zeroconf_ann:
-            self.zeroconf_ann.unregister_service(self.info_ann)
-            self.zeroconf_ann.close()
-            self.zeroconf_ann = None
+            self.stop_browsing()
+        if self.info_ann:
+            self._run(self._async_broadcast(self.aiozc.async_unregister_service(self.info_ann)))
+            self.info_ann = None
+            self.announced = None
             print("Your device is now off-the-grid.")
+
+    def close(self):
+        """
+        Stops browsing and announcing, and shuts down the shared zeroconf instance and its event loop.
+        """
+        if self.is_discoverable.is_set():
+            self.stop_announcing()
+        elif self.is_browsing.is_set():
+            self.stop_browsing()
+        self.save_peers(force=True)
+        if self.aiozc is not None:
+            self._run(self.aiozc.async_close())
+            self.aiozc = None
+            self.loop.call_soon_threadsafe(self.loop.stop)
     
     def pinger(self):
         """
-        Pings the other device to ensure its availability.        
+        Serves pings from other devices so they can check this device's availability. \\
+        A single event loop answers UDP echo requests (which carry the nonce the sender uses to measure RTT) and
+        accepts-and-closes TCP connections from older clients, so bursts of concurrent probes are not queued.
         """
-        ping_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        ping_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        selector = selectors.DefaultSelector()
+        family = socket.AF_INET6 if socket.has_dualstack_ipv6() else socket.AF_INET
+        udp_socket = socket.socket(family, socket.SOCK_DGRAM)
+        tcp_socket = socket.socket(family, socket.SOCK_STREAM)
+        tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if family == socket.AF_INET6: # serve IPv4 and IPv6 peers from the same sockets
+            udp_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+            tcp_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
 
         try:
-            ping_socket.bind(('', self.ping_port))
-            ping_socket.listen(1)
+            udp_socket.bind(('', self.ping_port))
+            udp_socket.setblocking(False)
+            tcp_socket.bind(('', self.ping_port))
+            tcp_socket.listen(128)
+            tcp_socket.setblocking(False)
+            selector.register(udp_socket, selectors.EVENT_READ)
+            selector.register(tcp_socket, selectors.EVENT_READ)
             while True:
-                connection, address = ping_socket.accept()
-                connection.close()
+                for key, _ in selector.select():
+                    if key.fileobj is udp_socket:
+                        self._answer_pings(udp_socket)
+                    else:
+                        self._accept_pings(tcp_socket)
         except OSError as e:
             print(f"Socket error: {e}. Ping port might be already in use. Please try a different port.")
         except KeyboardInterrupt:
@@ -277,7 +1050,37 @@ class Radar(object):
         except Exception as e:
             print(f"An error occurred while starting the ping server: {e}")
         finally:
-            ping_socket.close()
+            selector.close()
+            udp_socket.close()
+            tcp_socket.close()
+
+    def _answer_pings(self, udp_socket):
+        """
+        Echoes every pending UDP ping request back to its sender.
+        """
+        while True:
+            try:
+                data, address = udp_socket.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError: # Windows reports ICMP errors from earlier replies here
+                continue
+            if len(data) >= self.PING_PACKET.size and data[:4] == self.PING_REQUEST:
+                try:
+                    udp_socket.sendto(self.PING_REPLY + data[4:], address)
+                except OSError:
+                    pass
+
+    def _accept_pings(self, tcp_socket):
+        """
+        Accepts and immediately closes every pending TCP ping connection.
+        """
+        while True:
+            try:
+                connection, address = tcp_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            connection.close()
         
 # c = Radar(root_usr_dir="./Data", curr_device=User(root_usr_dir="./Data"))
 
@@ -2,45 +2,545 @@ import os
 import sys
 import pandas as pd
 import json
+import re
 import argparse
+import threading
 
 from user import *
 
-class Group(object):
+# Datatypes that group policies can allow or deny, one bit each
+DATATYPES = {'image': 1 << 0, 'video': 1 << 1, 'audio': 1 << 2, 'document': 1 << 3, 'archive': 1 << 4, 'other': 1 << 5}
+ALL_DATATYPES = sum(DATATYPES.values())
+EXTENSION_DATATYPES = {extension: DATATYPES[datatype] for datatype, extensions in {
+    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg', '.heic', '.tiff'],
+    'video': ['.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.wmv'],
+    'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'],
+    'document': ['.pdf', '.doc', '.docx', '.txt', '.md', '.csv', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.json'],
+    'archive': ['.zip', '.tar', '.gz', '.bz2', '.xz', '.7z', '.rar']
+}.items() for extension in extensions}
+# Datatypes each role may share by default
+ROLES = {'admin': ALL_DATATYPES, 'member': ALL_DATATYPES, 'viewer': 0}
+
+def datatype_mask(datatypes:list):
     """
-    Class used for construction, management, and interaction of groups.
+    Converts a list of datatype names into a bitmask.
+
+    Raises:
+        AssertionError: If a datatype is unknown.
+    """
+    mask = 0
+    for datatype in datatypes:
+        assert datatype in DATATYPES, f"Unknown datatype '{datatype}'. Choose from {list(DATATYPES)}."
+        mask |= DATATYPES[datatype]
+    return mask
+
+class GroupStore(object):
+    """
+    Class to store all the groups of the device, with indexed membership lookups in both directions.
     """
-    def __init__(self, root_grp_dir:str, root_usr_dir:str):
+    def __init__(self, root_grp_dir:str, user_class:User=None, root_usr_dir:str=None, compact_after:int=1000, default_datatypes:list=None):
         """
-        Initialises the Group class for a new group. This class is used to manage everything about the group 
-        such as creating the group, updating the group, registering it, getting group stats, etc. 
+        Initialises the group store. \\
+        Roles and permissions are compiled into one datatype bitmask per member whenever they change, so checking
+        an incoming transfer (`allows`) is a dictionary lookup and never reads from disk. Devices that are in no group
+        may share anything unless `default_datatypes` is given: then, once any group exists, they may only share
+        those datatypes (an empty list denies them everything), so a member cannot get around their own
+        permissions by sending under another name. \\
+        Groups are loaded from the `groups.csv` snapshot, then the changes appended to the `groups.log` journal since
+        the last snapshot are replayed. Every change is persisted by appending one line to the journal instead of
+        rewriting the CSV; the snapshot is rewritten (and the journal emptied) once the journal holds `compact_after` changes. \\
+        Default group names (`Group_<id>`) take their ids from a counter kept in `group_ids.json`, so ids are never
+        reused after a group is deleted.
 
         Args:
             root_grp_dir (str): The root directory where group data is stored.
-            root_usr_dir (str): The root directory where user data is stored.
+            user_class (User): The user instance shared by all groups. Defaults to a new `User` of `root_usr_dir`.
+            root_usr_dir (str): The root directory where user data is stored. Only used if `user_class` is not given.
+            compact_after (int): Number of journal entries after which the snapshot is rewritten. Defaults to 1000.
+            default_datatypes (list): Datatype names (see `DATATYPES`) that devices in no group may share once groups exist. Defaults to None (everything).
+
+        Raises:
+            AssertionError: If neither `user_class` nor `root_usr_dir` is given.
         """
+        assert user_class is not None or root_usr_dir is not None, "Either user_class or root_usr_dir must be given."
         self.root_grp_dir = root_grp_dir
         if not(os.path.exists(self.root_grp_dir)):
             os.makedirs(self.root_grp_dir)
-        if not(os.path.exists(self.root_grp_dir + "/groups.csv")):
-            self.grp_file = pd.DataFrame(columns=['name', 'description', 'members']).to_csv(os.path.join(self.root_grp_dir, "groups.csv"), index=False)
-        else:
-            self.grp_file = pd.read_csv(os.path.join(self.root_grp_dir, "groups.csv"))
+        self.user_class = user_class if user_class is not None else User(root_usr_dir)
+        self.compact_after = compact_after
+        self.lock = threading.RLock()
 
-        self.usr_dir = root_usr_dir
-        self.user_class = User(self.usr_dir)
+        self.groups = {} # group name -> {'description', 'max_num_members', 'members' (member -> role), 'permissions' (member -> mask), 'datatypes' (mask)}
+        self.member_groups = {} # member name -> set of group names
+        self.permission_masks = {} # member name -> datatypes the member may share, compiled over all their groups
+        self.default_mask = ALL_DATATYPES if default_datatypes is None else datatype_mask(default_datatypes) # senders that are in no group, once groups exist
+        self.journal_entries = 0
+        self.snapshot_file = os.path.join(self.root_grp_dir, "groups.csv")
+        self.journal_file = os.path.join(self.root_grp_dir, "groups.log")
+        self.ids_file = os.path.join(self.root_grp_dir, "group_ids.json")
+        self.next_id = 0
+        if os.path.exists(self.ids_file):
+            with open(self.ids_file, 'r', encoding='utf-8') as f:
+                self.next_id = json.load(f)['next']
+        self.load()
 
-        last_grp = self.grp_file.tail(1)
-        if not last_grp.empty:
-            self.grp_id = int(last_grp.index[-1]) + 1
+    def load(self):
+        """
+        Loads the snapshot and replays the journal.
+        """
+        if os.path.exists(self.snapshot_file):
+            grp_file = pd.read_csv(self.snapshot_file, dtype=str, keep_default_na=False)
+            for index, row in grp_file.iterrows():
+                self._apply({
+                    'op': 'create',
+                    'name': row['name'],
+                    'description': row.get('description', ''),
+                    'max_num_members': int(row['max_num_members']) if row.get('max_num_members') else 10
+                })
+                self._apply({'op': 'add_members', 'group': row['name'], 'members': [m for m in row.get('members', '').split(';') if m]})
+                if row.get('roles'):
+                    self._apply({'op': 'set_roles', 'group': row['name'], 'roles': json.loads(row['roles'])})
+                if row.get('permissions'):
+                    self._apply({'op': 'set_permissions', 'group': row['name'], 'permissions': json.loads(row['permissions'])})
+                if row.get('datatypes'):
+                    self._apply({'op': 'set_datatypes', 'group': row['name'], 'datatypes': int(row['datatypes'])})
         else:
-            self.grp_id = 0
+            pd.DataFrame(columns=['name', 'description', 'members', 'max_num_members', 'roles', 'permissions', 'datatypes']).to_csv(self.snapshot_file, index=False)
+
+        if os.path.exists(self.journal_file):
+            skipped = 0
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except ValueError: # a torn last line from a crash
+                        continue
+                    try:
+                        self._apply(change)
+                    except KeyError: # a change to a group the snapshot no longer has (a crash between compacting and emptying the journal)
+                        skipped += 1
+                    self.journal_entries += 1
+            if skipped:
+                print(f"Skipped {skipped} journaled change(s) to groups that no longer exist.")
+
+    def _apply(self, change:dict):
+        """
+        Applies one change to the in-memory groups and indexes.
+
+        Returns:
+            list: The members whose group memberships changed, with +1/-1 - used to update the statistics.
+        """
+        op = change['op']
+        if op == 'create':
+            default_id = re.fullmatch(r'Group_(\d+)', change['name'])
+            if default_id is not None:
+                self.next_id = max(self.next_id, int(default_id.group(1)) + 1)
+            self.groups.setdefault(change['name'], {'description': '', 'max_num_members': 10, 'members': {}, 'permissions': {}, 'datatypes': ALL_DATATYPES})
+            self.groups[change['name']].update({key: change[key] for key in ('description', 'max_num_members') if key in change})
+            return []
+        if op == 'update':
+            self.groups[change['name']].update({key: value for key, value in change.items() if key in ('description', 'max_num_members')})
+            return []
+        if op == 'delete':
+            group = self.groups.pop(change['name'], None)
+            members = list(group['members']) if group else []
+            for member in members:
+                self.member_groups.get(member, set()).discard(change['name'])
+            self._compile(members)
+            return [(member, -1) for member in members]
+        if op == 'add_members':
+            group = self.groups[change['group']]
+            added = [member for member in change['members'] if member not in group['members']]
+            for member in added:
+                group['members'][member] = 'member'
+                self.member_groups.setdefault(member, set()).add(change['group'])
+            self._compile(added)
+            return [(member, 1) for member in added]
+        if op == 'remove_members':
+            group = self.groups[change['group']]
+            removed = [member for member in change['members'] if member in group['members']]
+            for member in removed:
+                del group['members'][member]
+                group['permissions'].pop(member, None)
+                self.member_groups.get(member, set()).discard(change['group'])
+            self._compile(removed)
+            return [(member, -1) for member in removed]
+        if op == 'replace':
+            group = self.groups.get(change['name'])
+            old = set(group['members']) if group else set()
+            state = change['state']
+            self.groups[change['name']] = {
+                'description': state['description'],
+                'max_num_members': state['max_num_members'],
+                'members': dict(state['members']),
+                'permissions': dict(state['permissions']),
+                'datatypes': state['datatypes']
+            }
+            for member in old.difference(state['members']):
+                self.member_groups.get(member, set()).discard(change['name'])
+            for member in state['members']:
+                self.member_groups.setdefault(member, set()).add(change['name'])
+            self._compile(old.union(state['members']))
+            return [(member, -1) for member in old.difference(state['members'])] + [(member, 1) for member in state['members'] if member not in old]
+        if op == 'set_roles':
+            group = self.groups[change['group']]
+            group['members'].update({member: role for member, role in change['roles'].items() if member in group['members']})
+            self._compile(change['roles'])
+            return []
+        if op == 'set_permissions':
+            group = self.groups[change['group']]
+            for member, mask in change['permissions'].items():
+                if mask is None:
+                    group['permissions'].pop(member, None)
+                elif member in group['members']:
+                    group['permissions'][member] = mask
+            self._compile(change['permissions'])
+            return []
+        if op == 'set_datatypes':
+            self.groups[change['group']]['datatypes'] = change['datatypes']
+            self._compile(self.groups[change['group']]['members'])
+            return []
+        raise ValueError(f"Unknown group change '{op}'.")
+
+    def _compile(self, members):
+        """
+        Recomputes the compiled datatype mask of the given members: the union, over the groups of a member,
+        of its explicit permissions (or its role's datatypes) restricted to the datatypes the group allows.
+        """
+        for member in members:
+            groups = self.member_groups.get(member)
+            if not groups:
+                self.permission_masks.pop(member, None)
+                continue
+            mask = 0
+            for name in groups:
+                group = self.groups[name]
+                mask |= group['permissions'].get(member, ROLES.get(group['members'][member], 0)) & group['datatypes']
+            self.permission_masks[member] = mask
+
+    def _commit(self, change:dict):
+        """
+        Applies a change, appends it to the journal and updates the membership statistics.
+        """
+        with self.lock:
+            membership_changes = self._apply(change)
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(change) + '\n')
+            self.journal_entries += 1
+            if self.journal_entries >= self.compact_after:
+                self.compact()
+        for member, delta in membership_changes:
+            self.user_class.stats.record_group_membership(member, delta)
+
+    def compact(self):
+        """
+        Rewrites the `groups.csv` snapshot from memory and empties the journal.
+        """
+        with self.lock:
+            grp_file = pd.DataFrame({
+                'name': list(self.groups),
+                'description': [group['description'] for group in self.groups.values()],
+                'members': [';'.join(group['members']) for group in self.groups.values()],
+                'max_num_members': [group['max_num_members'] for group in self.groups.values()],
+                'roles': [json.dumps({member: role for member, role in group['members'].items() if role != 'member'}) for group in self.groups.values()],
+                'permissions': [json.dumps(group['permissions']) for group in self.groups.values()],
+                'datatypes': [group['datatypes'] for group in self.groups.values()]
+            }, columns=['name', 'description', 'members', 'max_num_members', 'roles', 'permissions', 'datatypes'])
+            grp_file.to_csv(self.snapshot_file + ".tmp", index=False)
+            self._save_next_id()
+            os.replace(self.snapshot_file + ".tmp", self.snapshot_file)
+            open(self.journal_file, 'w').close()
+            self.journal_entries = 0
+
+    def _save_next_id(self):
+        with open(self.ids_file + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'next': self.next_id}, f)
+        os.replace(self.ids_file + ".tmp", self.ids_file)
+
+    def allocate_id(self):
+        """
+        Takes the next group id. Ids only ever grow, so a deleted group's id is never given to another group.
+
+        Returns:
+            int: The id.
+        """
+        with self.lock:
+            allocated = self.next_id
+            self.next_id += 1
+            self._save_next_id()
+            return allocated
+
+    def create_group(self, name:str, description:str='', max_num_members:int=10):
+        """
+        Creates a new group.
+
+        Args:
+            name (str): The name of the group.
+            description (str): The tagline of the group. Defaults to an empty string.
+            max_num_members (int): Maximum number of members. Defaults to 10.
+
+        Raises:
+            AssertionError: If a group with the same name exists or `max_num_members` is not a positive integer.
+        """
+        assert name not in self.groups, f"Group {name} already exists."
+        assert isinstance(max_num_members, int) and max_num_members > 0, "max_num_members must be a positive integer"
+        self._commit({'op': 'create', 'name': name, 'description': description, 'max_num_members': max_num_members})
+
+    def update_group(self, name:str, **kwargs):
+        """
+        Updates the description and/or maximum number of members of a group.
+
+        Args:
+            name (str): The name of the group.
+            **kwargs: `description` and/or `max_num_members`.
 
+        Raises:
+            AssertionError: If the group does not exist or the new limit is below the current number of members.
+        """
+        assert name in self.groups, f"Group {name} does not exist."
+        if 'max_num_members' in kwargs:
+            assert kwargs['max_num_members'] >= len(self.groups[name]['members']), f"Group {name} already has more than {kwargs['max_num_members']} members."
+        self._commit(dict({key: value for key, value in kwargs.items() if key in ('description', 'max_num_members')}, op='update', name=name))
+
+    def delete_group(self, name:str):
+        """
+        Deletes a group.
+
+        Args:
+            name (str): The name of the group.
+        """
+        if name in self.groups:
+            self._commit({'op': 'delete', 'name': name})
+
+    def add_members(self, name:str, members:list):
+        """
+        Adds members to a group in bulk - one journal entry for the whole batch.
+
+        Args:
+            name (str): The name of the group.
+            members (list): Names of the members to add. Existing members are skipped.
+
+        Returns:
+            list: The members that were actually added.
+
+        Raises:
+            AssertionError: If the group does not exist or the maximum number of members would be exceeded.
+        """
+        with self.lock:
+            assert name in self.groups, f"Group {name} does not exist."
+            group = self.groups[name]
+            new_members = [member for member in dict.fromkeys(members) if member not in group['members']]
+            assert len(group['members']) + len(new_members) <= group['max_num_members'], f"Group {name} cannot have more than {group['max_num_members']} members."
+            if new_members:
+                self._commit({'op': 'add_members', 'group': name, 'members': new_members})
+            return new_members
+
+    def remove_members(self, name:str, members:list):
+        """
+        Removes members from a group in bulk.
+
+        Args:
+            name (str): The name of the group.
+            members (list): Names of the members to remove.
+        """
+        with self.lock:
+            assert name in self.groups, f"Group {name} does not exist."
+            removed = [member for member in dict.fromkeys(members) if member in self.groups[name]['members']]
+            if removed:
+                self._commit({'op': 'remove_members', 'group': name, 'members': removed})
+
+    def set_roles(self, name:str, roles:dict):
+        """
+        Sets the roles of members of a group.
+
+        Args:
+            name (str): The name of the group.
+            roles (dict): Maps member names to one of the `ROLES`.
+
+        Raises:
+            AssertionError: If the group does not exist, a member is not in the group or a role is unknown.
+        """
+        assert name in self.groups, f"Group {name} does not exist."
+        for member, role in roles.items():
+            assert member in self.groups[name]['members'], f"{member} is not a member of group {name}."
+            assert role in ROLES, f"Unknown role '{role}'. Choose from {list(ROLES)}."
+        self._commit({'op': 'set_roles', 'group': name, 'roles': dict(roles)})
+
+    def set_member_permissions(self, name:str, permissions:dict):
+        """
+        Overrides the datatypes members of a group may share, regardless of their roles.
+
+        Args:
+            name (str): The name of the group.
+            permissions (dict): Maps member names to a list of datatype names, or to None to fall back to the role.
+
+        Raises:
+            AssertionError: If the group does not exist, a member is not in the group or a datatype is unknown.
+        """
+        assert name in self.groups, f"Group {name} does not exist."
+        masks = {}
+        for member, datatypes in permissions.items():
+            assert member in self.groups[name]['members'], f"{member} is not a member of group {name}."
+            masks[member] = datatype_mask(datatypes) if datatypes is not None else None
+        self._commit({'op': 'set_permissions', 'group': name, 'permissions': masks})
+
+    def set_datatypes(self, name:str, datatypes:list):
+        """
+        Sets the datatypes that may be shared within a group at all.
+
+        Args:
+            name (str): The name of the group.
+            datatypes (list): Datatype names from `DATATYPES`.
+        """
+        assert name in self.groups, f"Group {name} does not exist."
+        self._commit({'op': 'set_datatypes', 'group': name, 'datatypes': datatype_mask(datatypes)})
+
+    def allows(self, sender:str, filename:str):
+        """
+        Checks whether a sender may share a file, based on the datatype of its extension. This is on the hot path
+        of every incoming transfer, so it only does two dictionary lookups on the compiled masks. \\
+        Until the first group is created no policies apply and every file is allowed; afterwards devices in no group
+        are held to the default datatypes (everything, unless restricted when creating the store).
+
+        Args:
+            sender (str): The name of the sending device.
+            filename (str): The name of the file being shared.
+
+        Returns:
+            bool: True if the transfer is allowed, False otherwise.
+        """
+        bit = EXTENSION_DATATYPES.get(os.path.splitext(filename)[1].lower(), DATATYPES['other'])
+        mask = self.permission_masks.get(sender)
+        if mask is None:
+            mask = self.default_mask if self.groups else ALL_DATATYPES
+        return bool(mask & bit)
+
+    def export_group(self, name:str):
+        """
+        Get the complete state of a group in a JSON-serialisable form, as accepted by `replace_group`.
+
+        Returns:
+            dict: `description`, `max_num_members`, `members` (member -> role), `permissions` (member -> mask) and
+            `datatypes` (mask) of the group, or None if it does not exist.
+        """
+        with self.lock:
+            group = self.groups.get(name)
+            if group is None:
+                return None
+            return {
+                'description': str(group['description']),
+                'max_num_members': int(group['max_num_members']),
+                'members': dict(group['members']),
+                'permissions': {member: int(mask) for member, mask in group['permissions'].items()},
+                'datatypes': int(group['datatypes'])
+            }
+
+    def replace_group(self, name:str, state:dict):
+        """
+        Replaces (or creates) a group with the given state in one journal entry - used to apply group changes
+        received from other devices.
+
+        Args:
+            name (str): The name of the group.
+            state (dict): The group state, as returned by `export_group`.
+        """
+        self._commit({'op': 'replace', 'name': name, 'state': state})
+
+    def get_group(self, name:str):
+        """
+        Get the details of a group.
+
+        Returns:
+            dict: `description`, `max_num_members`, `members` (list), `roles`, `permissions` and allowed `datatypes`
+            of the group, or None if it does not exist.
+        """
+        group = self.groups.get(name)
+        if group is None:
+            return None
+        return {
+            'description': group['description'],
+            'max_num_members': group['max_num_members'],
+            'members': list(group['members']),
+            'roles': dict(group['members']),
+            'permissions': {member: [datatype for datatype, bit in DATATYPES.items() if mask & bit] for member, mask in group['permissions'].items()},
+            'datatypes': [datatype for datatype, bit in DATATYPES.items() if group['datatypes'] & bit]
+        }
+
+    def get_members(self, name:str):
+        """
+        Get the members of a group.
+
+        Returns:
+            list: The member names, in the order they joined.
+        """
+        group = self.groups.get(name)
+        return list(group['members']) if group else []
+
+    def get_groups_of(self, member:str):
+        """
+        Get the groups a member belongs to.
+
+        Returns:
+            set: The group names.
+        """
+        return set(self.member_groups.get(member, ()))
+
+    def is_member(self, name:str, member:str):
+        """
+        Checks whether a member belongs to a group.
+        """
+        group = self.groups.get(name)
+        return group is not None and member in group['members']
+
+class Group(object):
+    """
+    Class used for construction, management, and interaction of groups.
+    """
+    def __init__(self, root_grp_dir:str, root_usr_dir:str, store:GroupStore=None):
+        """
+        Initialises the Group class for a new group. This class is used to manage everything about the group 
+        such as creating the group, updating the group, registering it, getting group stats, etc. \\
+        Pass the same `store` to every group so that they share one `GroupStore` and one `User` instance.
+
+        Args:
+            root_grp_dir (str): The root directory where group data is stored.
+            root_usr_dir (str): The root directory where user data is stored.
+            store (GroupStore): The group store to use. Defaults to a new store of `root_grp_dir`.
+        """
+        self.root_grp_dir = root_grp_dir
+        self.usr_dir = root_usr_dir
+        self.store = store if store is not None else GroupStore(self.root_grp_dir, root_usr_dir=self.usr_dir)
+        self.user_class = self.store.user_class
+
+        self.grp_id = self.store.next_id # taken from the store once the group is created under its default name
         self.name = f"Group_{self.grp_id}"
         self.tagline = "A new group!"
-        self.members = []
         self.max_num_members = 10
 
+    @classmethod
+    def load(cls, store:GroupStore, name:str):
+        """
+        Get the `Group` object of an existing group.
+
+        Args:
+            store (GroupStore): The group store holding the group.
+            name (str): The name of the group.
+
+        Raises:
+            AssertionError: If the group does not exist.
+        """
+        details = store.get_group(name)
+        assert details is not None, f"Group {name} does not exist."
+        group = cls(store.root_grp_dir, store.user_class.root_usr_dir, store=store)
+        group.name = name
+        group.tagline = details['description']
+        group.max_num_members = details['max_num_members']
+        return group
+
+    @property
+    def members(self):
+        return self.store.get_members(self.name)
+
     def __str__(self):
         return f"Group(name={self.name} \n tagline={self.tagline} \n members={self.members})"
     
@@ -53,17 +553,20 @@ class Group(object):
         Raises:
             AssertionError: If any required field is missing.
         """
+        if 'name' not in kwargs:
+            self.grp_id = self.store.allocate_id()
+            self.name = f"Group_{self.grp_id}"
         self.name = kwargs.get('name', self.name)
         self.tagline = kwargs.get('tagline', self.tagline)
         self.max_num_members = kwargs.get('max_num_members', self.max_num_members)
 
-        for key, value in kwargs.items():
-            if key != 'max_num_members':
-                print(f"Since maximum number of members is not defined, the group will have a maximum of {self.max_num_members} members.")
-            if key != 'name':
-                print(f"Group name is required to create a group. Since name is not defined, the group will be named as {self.name}.") 
-            if key != 'tagline':
-                print(f"Group tagline is required to create a group. Since tagline is not defined, the group tagline is kept as '{self.tagline}'.")
+        if 'max_num_members' not in kwargs:
+            print(f"Since maximum number of members is not defined, the group will have a maximum of {self.max_num_members} members.")
+        if 'name' not in kwargs:
+            print(f"Group name is required to create a group. Since name is not defined, the group will be named as {self.name}.") 
+        if 'tagline' not in kwargs:
+            print(f"Group tagline is required to create a group. Since tagline is not defined, the group tagline is kept as '{self.tagline}'.")
+        self.store.create_group(self.name, description=self.tagline, max_num_members=self.max_num_members)
         print("Note: Any of the above fields can be changed later in the group settings.")
 
     def complete_group(self, **kwargs):
@@ -86,35 +589,37 @@ class Group(object):
         Raises:
             AssertionError: If the maximum number of members is exceeded.
         """
-        pass
+        self.store.add_members(self.name, args)
 
     def save_group(self):
         """
         Saves the group information to a CSV file.
         """
-        pass
+        self.store.update_group(self.name, description=self.tagline, max_num_members=self.max_num_members)
+        self.store.compact()
 
     def set_roles(self, **kwargs):
         """
         Set roles for members in the group.
 
         Args:
-            **kwargs: Member usernames and their corresponding roles.
+            **kwargs: Member usernames and their corresponding roles (`admin`, `member` or `viewer`).
         Raises:
             AssertionError: If any required field is missing.
         """
-        pass
+        self.store.set_roles(self.name, kwargs)
 
     def set_member_permissions(self, **kwargs):
         """
         Set permissions for members in the group.
 
         Args:
-            **kwargs: Member usernames and their corresponding permissions.
+            **kwargs: Member usernames and their corresponding permissions - lists of datatypes (see `DATATYPES`),
+            or None to fall back to the member's role.
         Raises:
             AssertionError: If any required field is missing.
         """
-        pass
+        self.store.set_member_permissions(self.name, kwargs)
 
     def change_settings(self):
         """
@@ -128,12 +633,21 @@ class Group(object):
         """
         pass
 
-    def data_sharing(self):
+    def data_sharing(self, *datatypes):
         """
         Call to manage data sharing settings for the group. \
         This includes datatypes to be shared, data sharing permissions, regulations, etc.
+
+        Args:
+            *datatypes: The datatypes (see `DATATYPES`) that may be shared within the group. If none are given,
+            the current settings are returned unchanged.
+
+        Returns:
+            list: The datatypes that may be shared within the group.
         """
-        pass
+        if datatypes:
+            self.store.set_datatypes(self.name, list(datatypes))
+        return self.store.get_group(self.name)['datatypes']
 
     def community_memberships(self):
         """
@@ -145,6 +659,24 @@ class Group(object):
     def get_group_stats(self):
         """
         Call to get the group statistics such as number of members, number of posts or activities in general, etc.
+
+        Returns:
+            dict: Member counts and the transfer counters of the members summed over the group.
         """
-        pass
+        stats = {
+            'name': self.name,
+            'num_members': len(self.members),
+            'max_num_members': self.max_num_members,
+            'bytes_sent': 0,
+            'bytes_received': 0,
+            'transfers': 0,
+            'failed_transfers': 0
+        }
+        for member in self.members:
+            member_stats = self.user_class.stats.get(member)
+            stats['bytes_sent'] += member_stats['bytes_sent']
+            stats['bytes_received'] += member_stats['bytes_received']
+            stats['transfers'] += member_stats['transfers_sent'] + member_stats['transfers_received']
+            stats['failed_transfers'] += member_stats['failed_sends'] + member_stats['failed_receives']
+        return stats
 
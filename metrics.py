@@ -0,0 +1,350 @@
+# Use this to create functions and classes to export operational metrics of the Social Interact setup.
+import threading
+import time
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from termcolor import colored
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames:tuple, key:tuple, extra:str=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra is not None:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter(object):
+    """
+    A value that only goes up, optionally split by labels.
+    """
+    type = 'counter'
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {} if self.labelnames else {(): 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increments the counter.
+
+        Args:
+            amount (int or float): How much to add. Defaults to 1.
+            **labels: A value for each of the counter's label names.
+
+        Raises:
+            AssertionError: If `amount` is negative.
+        """
+        assert amount >= 0, "Counters can only be incremented"
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        """
+        Returns:
+            list: `(labels key, value)` pairs.
+        """
+        with self.lock:
+            return list(self.values.items())
+
+class Gauge(Counter):
+    """
+    A value that goes up and down. A gauge given a `function` is read at collection time instead of being set; the
+    function returns a number, or for a labelled gauge a dict mapping labels keys to numbers.
+    """
+    type = 'gauge'
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(labels[name] for name in self.labelnames)] = value
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        value = self.function()
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+class Histogram(Counter):
+    """
+    Counts observations (e.g. latencies) into buckets of increasing upper bounds.
+    """
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple=(), buckets:tuple=DEFAULT_BUCKETS):
+        """
+        Raises:
+            AssertionError: If `buckets` is empty or not sorted.
+        """
+        assert buckets and list(buckets) == sorted(buckets), "buckets must be a non-empty sorted sequence"
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets) + (float('inf'),)
+        self.values = {} if self.labelnames else {(): self._empty()}
+
+    def _empty(self):
+        return [[0] * len(self.buckets), 0.0, 0] # per-bucket counts (not cumulative), sum, count
+
+    def observe(self, value:float, **labels):
+        """
+        Records one observation.
+
+        Args:
+            value (float): The observed value (seconds for latencies).
+            **labels: A value for each of the histogram's label names.
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = self._empty()
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def inc(self, amount=1, **labels):
+        raise TypeError("Histograms are updated with observe")
+
+    def value(self, **labels):
+        """
+        Returns:
+            dict: The `count` and `sum` of the observations and the cumulative count of each bucket (`buckets`).
+        """
+        with self.lock:
+            state = self.values.get(tuple(labels[name] for name in self.labelnames)) or self._empty()
+            counts, total, count = list(state[0]), state[1], state[2]
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            buckets[bound] = cumulative
+        return {'count': count, 'sum': total, 'buckets': buckets}
+
+    def quantile(self, q:float, **labels):
+        """
+        Estimates a quantile from the buckets, interpolating linearly inside the bucket it falls in.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+            **labels: A value for each of the histogram's label names.
+
+        Returns:
+            float: The estimate, or None if nothing was observed.
+        """
+        value = self.value(**labels)
+        if not value['count']:
+            return None
+        rank = q * value['count']
+        lower, below = 0.0, 0
+        for bound, cumulative in value['buckets'].items():
+            if cumulative >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - below) / max(cumulative - below, 1)
+            lower, below = bound, cumulative
+        return lower
+
+    def samples(self):
+        with self.lock:
+            keys = list(self.values)
+        return [(key, self.value(**dict(zip(self.labelnames, key)))) for key in keys]
+
+class TransferMeter(object):
+    """
+    Byte counter for one transfer. `add` is a couple of integer additions so it can be called for every chunk; the
+    bytes are folded into the shared counter (which takes a lock) only once per `flush_bytes`.
+    """
+    __slots__ = ('counter', 'labels', 'peer', 'filename', 'bytes', 'unflushed', 'flush_bytes', 'started')
+
+    def __init__(self, counter:Counter, peer:str, filename:str, flush_bytes:int=1024*1024, **labels):
+        self.counter = counter
+        self.labels = labels
+        self.peer = peer
+        self.filename = filename
+        self.bytes = 0
+        self.unflushed = 0
+        self.flush_bytes = flush_bytes
+        self.started = time.perf_counter()
+
+    def add(self, num_bytes:int):
+        self.bytes += num_bytes
+        self.unflushed += num_bytes
+        if self.unflushed >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.unflushed:
+            self.counter.inc(self.unflushed, **self.labels)
+            self.unflushed = 0
+
+    def rate(self):
+        """
+        Returns:
+            float: The average throughput of the transfer so far, in bytes per second.
+        """
+        elapsed = time.perf_counter() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+class MetricsRegistry(object):
+    """
+    Class to collect the metrics of one device and render them in the Prometheus text format.
+    """
+    def __init__(self, prefix:str="interact_"):
+        """
+        Initialises an empty registry. Metrics are created with `counter`, `gauge` and `histogram`, which return the
+        existing metric when called again with the same name, so every module can declare the metrics it updates.
+
+        Args:
+            prefix (str): Prepended to the name of every metric. Defaults to `interact_`.
+        """
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self, metric_class, name:str, documentation:str, labelnames:tuple=(), **kwargs):
+        name = self.prefix + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+        assert type(metric) is metric_class and metric.labelnames == tuple(labelnames), f"Metric {name} is already registered with another type or labels"
+        return metric
+
+    def counter(self, name:str, documentation:str, labelnames:tuple=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name:str, documentation:str, labelnames:tuple=(), function=None):
+        return self._register(Gauge, name, documentation, labelnames, function=function)
+
+    def histogram(self, name:str, documentation:str, labelnames:tuple=(), buckets:tuple=Histogram.DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name:str):
+        """
+        Returns:
+            Counter, Gauge or Histogram: The metric with the given name (with or without the prefix), or None.
+        """
+        return self.metrics.get(name) or self.metrics.get(self.prefix + name)
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The exposition.
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for key, value in metric.samples():
+                if metric.type != 'histogram':
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+                    continue
+                for bound, cumulative in value['buckets'].items():
+                    le = 'le="%s"' % _format_value(bound)
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, key, le)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, key)} {_format_value(value['sum'])}")
+                lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, key)} {value['count']}")
+        lines.append(f"{self.prefix}uptime_seconds {time.time() - self.started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Maps each metric name (without the prefix) to its `type`, `help` and `samples`; every sample is a dict
+            with the `labels` and the `value` (for histograms, the count, sum, mean, p50 and p95 of the observations).
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        snapshot = {'uptime_seconds': time.time() - self.started}
+        for metric in metrics:
+            samples = []
+            for key, value in metric.samples():
+                labels = dict(zip(metric.labelnames, key))
+                if metric.type == 'histogram':
+                    value = {'count': value['count'], 'sum': value['sum'],
+                             'mean': value['sum'] / value['count'] if value['count'] else None,
+                             'p50': metric.quantile(0.5, **labels), 'p95': metric.quantile(0.95, **labels)}
+                samples.append({'labels': labels, 'value': value})
+            snapshot[metric.name[len(self.prefix):]] = {'type': metric.type, 'help': metric.documentation, 'samples': samples}
+        return snapshot
+
+class MetricsServer(object):
+    """
+    Class to serve a registry at `/metrics` for Prometheus to scrape. It only listens on the loopback interface.
+    """
+    def __init__(self, registry:MetricsRegistry, port:int=9464, host:str="127.0.0.1"):
+        """
+        Args:
+            registry (MetricsRegistry): The metrics to serve.
+            port (int): The port to listen on. Defaults to 9464.
+            host (str): The address to listen on. Defaults to the loopback address.
+        """
+        assert isinstance(registry, MetricsRegistry), "registry must be an instance of MetricsRegistry"
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        Raises:
+            OSError: If the port is already in use.
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # scrapes would flood the terminal
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='Metrics_Thread', daemon=True).start()
+        print(f"Metrics available at {colored(f'http://{self.host}:{self.port}/metrics', 'cyan')}.")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
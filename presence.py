@@ -0,0 +1,256 @@
+# Use this to create functions and classes to handle the presence history of devices in the Social Interact setup.
+import os
+import struct
+import threading
+import time
+import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+
+class PresenceLog(object):
+    """
+    Append-only binary log of device presence changes (online/offline).
+    """
+    RECORD = struct.Struct('<dIB') # timestamp (epoch seconds), device id, status code
+    STATUS_CODES = {'offline': 0, 'online': 1}
+    STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+
+    def __init__(self, root_usr_dir:str, segment_size:int=1024*1024, retention_days:int=30):
+        """
+        Initialises the presence log. \\
+        Records are fixed-size (13 bytes) and written to numbered segment files under `<root_usr_dir>/presence/`.
+        A new segment is started once the active one reaches `segment_size` bytes, and segments older than
+        `retention_days` are deleted when the log is opened. Device names are mapped to integer ids in `devices.txt`.
+
+        An in-memory index of timestamps and statuses per device is rebuilt on start-up, so time-range queries
+        are a binary search rather than a scan of the log.
+
+        Args:
+            root_usr_dir (str): The root directory where user data is stored.
+            segment_size (int): The maximum size of a segment file in bytes. Defaults to 1MB.
+            retention_days (int): Number of days to keep presence history for. Defaults to 30.
+
+        Raises:
+            AssertionError: If `segment_size` or `retention_days` is not a positive integer.
+        """
+        assert isinstance(segment_size, int) and segment_size >= self.RECORD.size, "segment_size must be a positive integer"
+        assert isinstance(retention_days, int) and retention_days > 0, "retention_days must be a positive integer"
+
+        self.log_dir = os.path.join(root_usr_dir, "presence")
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
+        self.segment_size = segment_size
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+
+        self.device_ids = {}
+        self.device_names = []
+        self.index = {} # device id -> (array of timestamps, array of status codes)
+        self.segment_no = 0
+        self.segment = None
+
+        self.load()
+
+    def _segment_path(self, segment_no:int):
+        return os.path.join(self.log_dir, f"segment_{segment_no:06d}.bin")
+
+    def _segments(self):
+        segments = []
+        for filename in os.listdir(self.log_dir):
+            if filename.startswith("segment_") and filename.endswith(".bin"):
+                segments.append(int(filename[len("segment_"):-len(".bin")]))
+        return sorted(segments)
+
+    def load(self):
+        """
+        Loads the device table and rebuilds the per-device index from the segment files. \\
+        Expired segments are removed and a partially written trailing record (e.g. after a crash) is truncated.
+        """
+        devices_file = os.path.join(self.log_dir, "devices.txt")
+        if os.path.exists(devices_file):
+            with open(devices_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    name = line.rstrip('\n')
+                    self.device_ids[name] = len(self.device_names)
+                    self.device_names.append(name)
+
+        cutoff = time.time() - self.retention_days * 86400
+        segments = self._segments()
+        for position, segment_no in enumerate(segments):
+            path = self._segment_path(segment_no)
+            with open(path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % self.RECORD.size
+            if usable != len(data):
+                with open(path, 'r+b') as f:
+                    f.truncate(usable)
+                data = data[:usable]
+            is_last = position == len(segments) - 1
+            if not is_last and (not data or self.RECORD.unpack_from(data, usable - self.RECORD.size)[0] < cutoff):
+                os.remove(path)
+                continue
+            for timestamp, device_id, status in self.RECORD.iter_unpack(data):
+                times, statuses = self.index.setdefault(device_id, (array('d'), array('B')))
+                times.append(timestamp)
+                statuses.append(status)
+
+        self.segment_no = segments[-1] if segments else 0
+        self.segment = open(self._segment_path(self.segment_no), 'ab')
+
+    def _device_id(self, name:str):
+        device_id = self.device_ids.get(name)
+        if device_id is None:
+            device_id = len(self.device_names)
+            with open(os.path.join(self.log_dir, "devices.txt"), 'a', encoding='utf-8') as f:
+                f.write(name.replace('\n', ' ') + '\n')
+            self.device_ids[name] = device_id
+            self.device_names.append(name)
+        return device_id
+
+    def record(self, name:str, status:str, timestamp:float=None):
+        """
+        Appends a presence change for the device. Nothing is written if the status is unchanged from the last record.
+
+        Args:
+            name (str): The name of the device.
+            status (str): The new status of the device - `online` or `offline`.
+            timestamp (float): Epoch seconds of the change. Defaults to now.
+
+        Returns:
+            bool: True if a record was written, False otherwise.
+
+        Raises:
+            AssertionError: If `status` is not a known status.
+        """
+        assert status in self.STATUS_CODES, f"status must be one of {list(self.STATUS_CODES)}"
+        code = self.STATUS_CODES[status]
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self.lock:
+            device_id = self._device_id(str(name))
+            times, statuses = self.index.setdefault(device_id, (array('d'), array('B')))
+            if statuses and statuses[-1] == code:
+                return False
+            if times and timestamp < times[-1]:
+                timestamp = times[-1] # keep each device's history ordered even if the clock steps back
+
+            if self.segment.tell() >= self.segment_size:
+                self.segment.close()
+                self.segment_no += 1
+                self.segment = open(self._segment_path(self.segment_no), 'ab')
+            self.segment.write(self.RECORD.pack(timestamp, device_id, code))
+            self.segment.flush()
+
+            times.append(timestamp)
+            statuses.append(code)
+        return True
+
+    def _range(self, name:str, start:float, end:float):
+        device_id = self.device_ids.get(name)
+        if device_id is None or device_id not in self.index:
+            return array('d'), array('B'), 0, 0
+        times, statuses = self.index[device_id]
+        return times, statuses, bisect_left(times, start), bisect_right(times, end)
+
+    def events(self, name:str, start:datetime.datetime=None, end:datetime.datetime=None):
+        """
+        Get the presence changes of a device within a time range.
+
+        Args:
+            name (str): The name of the device.
+            start (datetime.datetime): Start of the range. Defaults to the beginning of the log.
+            end (datetime.datetime): End of the range. Defaults to now.
+
+        Returns:
+            list: A list of `(datetime, status)` tuples in chronological order.
+        """
+        start = start.timestamp() if start else 0.0
+        end = end.timestamp() if end else time.time()
+        with self.lock:
+            times, statuses, lo, hi = self._range(name, start, end)
+            return [(datetime.datetime.fromtimestamp(times[i]), self.STATUS_NAMES[statuses[i]]) for i in range(lo, hi)]
+
+    def online_windows(self, name:str, start:datetime.datetime, end:datetime.datetime=None):
+        """
+        Get the intervals during which a device was online, clipped to the given time range.
+
+        Args:
+            name (str): The name of the device.
+            start (datetime.datetime): Start of the range.
+            end (datetime.datetime): End of the range. Defaults to now.
+
+        Returns:
+            list: A list of `(from_ts, to_ts)` epoch-second tuples.
+        """
+        start = start.timestamp()
+        end = end.timestamp() if end else time.time()
+        windows = []
+        with self.lock:
+            times, statuses, lo, hi = self._range(name, start, end)
+            online_since = start if lo > 0 and statuses[lo-1] == self.STATUS_CODES['online'] else None
+            for i in range(lo, hi):
+                if statuses[i] == self.STATUS_CODES['online']:
+                    if online_since is None:
+                        online_since = times[i]
+                elif online_since is not None:
+                    windows.append((online_since, times[i]))
+                    online_since = None
+        if online_since is not None:
+            windows.append((online_since, end))
+        return windows
+
+    def uptime(self, name:str, start:datetime.datetime, end:datetime.datetime=None):
+        """
+        Get the total time a device was online within the given time range.
+
+        Args:
+            name (str): The name of the device.
+            start (datetime.datetime): Start of the range.
+            end (datetime.datetime): End of the range. Defaults to now.
+
+        Returns:
+            tuple: `(uptime_seconds, availability)` where availability is the online fraction of the range.
+        """
+        end = end or datetime.datetime.now()
+        span = max((end - start).total_seconds(), 1e-9)
+        uptime = sum(to_ts - from_ts for from_ts, to_ts in self.online_windows(name, start, end))
+        return uptime, uptime / span
+
+    def availability_by_hour(self, name:str, start:datetime.datetime, end:datetime.datetime=None):
+        """
+        Get how often a device was online for each hour of the day - useful to pick a time for bulk transfers.
+
+        Args:
+            name (str): The name of the device.
+            start (datetime.datetime): Start of the range.
+            end (datetime.datetime): End of the range. Defaults to now.
+
+        Returns:
+            list: 24 floats, the online fraction of each local hour of the day within the range.
+        """
+        end = end or datetime.datetime.now()
+        online = [0.0] * 24
+        for from_ts, to_ts in self.online_windows(name, start, end):
+            while from_ts < to_ts:
+                current = datetime.datetime.fromtimestamp(from_ts)
+                next_hour = (current.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)).timestamp()
+                online[current.hour] += min(to_ts, next_hour) - from_ts
+                from_ts = next_hour
+
+        observed = [0.0] * 24
+        cursor = start.timestamp()
+        while cursor < end.timestamp():
+            current = datetime.datetime.fromtimestamp(cursor)
+            next_hour = (current.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)).timestamp()
+            observed[current.hour] += min(end.timestamp(), next_hour) - cursor
+            cursor = next_hour
+        return [online[hour] / observed[hour] if observed[hour] else 0.0 for hour in range(24)]
+
+    def close(self):
+        """
+        Closes the active segment file.
+        """
+        with self.lock:
+            if self.segment:
+                self.segment.close()
+                self.segment = None
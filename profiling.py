@@ -0,0 +1,284 @@
+# Use this to create functions and classes to profile the transfer and discovery paths of the Social Interact setup.
+import os
+import sys
+import time
+import datetime
+import functools
+import linecache
+import threading
+import tracemalloc
+from collections import Counter
+from termcolor import colored
+
+class Profiler(object):
+    """
+    Opt-in profiler for the stages of the transfer and discovery paths (e.g. `DataSharing.file_sharing`). \\
+    While it runs, the registered methods are wrapped to time every call (wall and CPU time, peak traced memory) and a
+    sampling thread records the stack of every thread inside a stage, so each stage's time can be broken down into
+    network, disk, tqdm, pandas, zeroconf, cryptography and Python time. \\
+    tracemalloc only keeps one peak for the whole process, so the peak memory of a call is the highest the traced memory
+    of the process rose above its level at the start of the call: allocations of other threads running at the same time
+    are included. The peak is only reset while no stage runs, so it is never lower than the call's own allocations.
+    """
+    ENV_VAR = "INTERACT_PROFILE"
+    LIBRARIES = ('tqdm', 'pandas', 'zeroconf', 'cryptography')
+    NETWORK_CALLS = ('sendall(', 'send(', 'sendto(', 'recv(', 'recv_into(', 'accept(', 'connect(', 'create_connection(')
+    DISK_CALLS = ('.read(', '.write(', '.truncate(', '.seek(', 'open(', 'makedirs(', 'to_csv(', 'read_csv(')
+
+    def __init__(self, root_usr_dir:str, interval:float=0.005, max_depth:int=64):
+        """
+        Initialises the profiler. Nothing is wrapped or sampled until `start` is called.
+
+        Args:
+            root_usr_dir (str): The root directory where user data is stored. Profiles are written to `<root_usr_dir>/profiles/`.
+            interval (float): Seconds between two stack samples. Defaults to 5ms.
+            max_depth (int): Maximum number of frames kept per sampled stack. Defaults to 64.
+
+        Raises:
+            AssertionError: If `interval` or `max_depth` is not positive.
+        """
+        assert interval > 0, "interval must be positive"
+        assert isinstance(max_depth, int) and max_depth > 0, "max_depth must be a positive integer"
+        self.profiles_dir = os.path.join(root_usr_dir, "profiles")
+        self.interval = interval
+        self.max_depth = max_depth
+        self.targets = [] # (object, method name, stage name)
+        self.is_profiling = threading.Event()
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.started_tracemalloc = False
+        self.active = {} # thread id -> stages the thread is currently in
+        self._reset()
+
+    @classmethod
+    def requested(cls):
+        """
+        Returns:
+            bool: Whether profiling was switched on with the `INTERACT_PROFILE` environment variable.
+        """
+        return os.environ.get(cls.ENV_VAR, '').strip().lower() in ('1', 'true', 'on', 'yes')
+
+    def _reset(self):
+        self.timings = {} # stage -> [calls, wall seconds, cpu seconds, max wall seconds, max process-wide peak memory]
+        self.stacks = Counter() # (stage, folded stack) -> samples
+        self.categories = Counter() # (stage, category) -> samples
+        self.lines = Counter() # (stage, source line) -> samples
+        self.started_at = None
+
+    def register(self, obj, method:str, stage:str=None):
+        """
+        Registers a method to be profiled as a stage. If profiling is already on, it is wrapped right away.
+
+        Args:
+            obj (object): The instance whose method is profiled.
+            method (str): The name of the method.
+            stage (str): The name of the stage in the reports. Defaults to `<class name>.<method>`.
+        """
+        assert callable(getattr(obj, method, None)), f"{type(obj).__name__} has no method {method}"
+        target = (obj, method, stage or f"{type(obj).__name__}.{method}")
+        self.targets.append(target)
+        if self.is_profiling.is_set():
+            self._install(*target)
+
+    def _install(self, obj, method:str, stage:str):
+        # the wrapper shadows the class's method on this instance only, and is removed by deleting the attribute
+        setattr(obj, method, self._wrap(getattr(obj, method), stage))
+
+    def _uninstall(self, obj, method:str, stage:str):
+        if method in vars(obj):
+            delattr(obj, method)
+
+    def _wrap(self, function, stage:str):
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            thread_id = threading.get_ident()
+            with self.lock:
+                if not self.active and tracemalloc.is_tracing(): # resetting under a running call would hide its peak
+                    tracemalloc.reset_peak()
+                stages = self.active.setdefault(thread_id, [])
+                stages.append(stage)
+            memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+                peak = tracemalloc.get_traced_memory()[1] - memory if tracemalloc.is_tracing() else 0
+                with self.lock:
+                    stages.pop()
+                    if not stages:
+                        self.active.pop(thread_id, None)
+                    timing = self.timings.setdefault(stage, [0, 0.0, 0.0, 0.0, 0])
+                    timing[0] += 1
+                    timing[1] += wall
+                    timing[2] += cpu
+                    timing[3] = max(timing[3], wall)
+                    timing[4] = max(timing[4], peak)
+        return profiled
+
+    def start(self):
+        """
+        Wraps the registered stages and starts sampling and tracing allocations.
+
+        Raises:
+            AssertionError: If profiling is already on.
+        """
+        assert not self.is_profiling.is_set(), "Profiling is already on."
+        with self.lock:
+            self._reset()
+            self.started_at = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        for target in self.targets:
+            self._install(*target)
+        self.is_profiling.set()
+        self.sampler = threading.Thread(target=self.sample_loop, name='Profiler_Thread', daemon=True)
+        self.sampler.start()
+        print(f"Profiling {colored('on', 'green')}: {', '.join(stage for _, _, stage in self.targets)}.")
+
+    def stop(self):
+        """
+        Unwraps the stages, stops sampling and writes the profile (see `dump`).
+
+        Returns:
+            str: The path of the report, or None if profiling was not on.
+        """
+        if not self.is_profiling.is_set():
+            return None
+        self.is_profiling.clear()
+        for target in self.targets:
+            self._uninstall(*target)
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+        report = self.dump()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+        print(f"Profiling {colored('off', 'red')}. Profile written to {colored(report, 'cyan')}.")
+        return report
+
+    def sample_loop(self):
+        """
+        Records the stack of every thread inside a stage every `interval` seconds. Threads blocked in I/O are sampled
+        too, so the samples show where the wall-clock time of a stage goes.
+        """
+        while self.is_profiling.is_set():
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for thread_id, stages in list(self.active.items()):
+                frame = frames.get(thread_id)
+                stages = set(stages)
+                if frame is None or not stages:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    if frame.f_code.co_name != 'profiled' or frame.f_code.co_filename != __file__:
+                        stack.append(frame)
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                category, line = self._classify(stack)
+                folded = ';'.join(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})" for frame in reversed(stack))
+                with self.lock:
+                    for stage in stages:
+                        self.stacks[(stage, folded)] += 1
+                        self.categories[(stage, category)] += 1
+                        self.lines[(stage, line)] += 1
+            del frames
+
+    def _classify(self, stack:list):
+        """
+        Attributes a sampled stack (innermost frame first) to a category: the first of `LIBRARIES` on the stack, or else
+        network or disk if the innermost frame of our own code is on such a call, or else Python.
+
+        Returns:
+            tuple: The category and the innermost source line of our own code.
+        """
+        own_dir = os.path.dirname(os.path.abspath(__file__))
+        for frame in stack:
+            filename = frame.f_code.co_filename
+            for library in self.LIBRARIES:
+                if f"{os.sep}{library}{os.sep}" in filename:
+                    return library, self._line(frame)
+            if os.path.dirname(os.path.abspath(filename)) == own_dir:
+                source = linecache.getline(filename, frame.f_lineno).strip()
+                if any(call in source for call in self.NETWORK_CALLS):
+                    return 'network', self._line(frame)
+                if any(call in source for call in self.DISK_CALLS):
+                    return 'disk', self._line(frame)
+                return 'python', self._line(frame)
+        return 'python', self._line(stack[0])
+
+    def _line(self, frame):
+        filename = frame.f_code.co_filename
+        return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}: {linecache.getline(filename, frame.f_lineno).strip()}"
+
+    def status(self):
+        """
+        Returns:
+            dict: Whether profiling is on, the profiled stages and the number of calls and samples so far.
+        """
+        with self.lock:
+            return {
+                'profiling': self.is_profiling.is_set(),
+                'stages': [stage for _, _, stage in self.targets],
+                'calls': {stage: timing[0] for stage, timing in self.timings.items()},
+                'samples': sum(self.categories.values()),
+                'since': datetime.datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None
+            }
+
+    def dump(self, top:int=15):
+        """
+        Writes the profile so far to `profiles/profile_<timestamp>.txt` (per-stage timings and process-wide memory peaks, the breakdown of each stage
+        by category and its hottest lines, and the largest live allocations) and the sampled stacks to
+        `profile_<timestamp>.folded`, which flame graph tools (flamegraph.pl, speedscope) read directly.
+
+        Args:
+            top (int): Number of lines and allocations listed. Defaults to 15.
+
+        Returns:
+            str: The path of the report.
+        """
+        if not os.path.exists(self.profiles_dir):
+            os.makedirs(self.profiles_dir)
+        with self.lock:
+            timings = {stage: list(timing) for stage, timing in self.timings.items()}
+            stacks, categories, lines = Counter(self.stacks), Counter(self.categories), Counter(self.lines)
+            started_at = self.started_at or time.time()
+        allocations = []
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([ # leave out the profiler's own and import-time allocations
+                tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, linecache.__file__), tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>")
+            ])
+            allocations = snapshot.statistics('lineno')[:top]
+
+        name = f"profile_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        report_path = os.path.join(self.profiles_dir, name + ".txt")
+        report = [f"InterAct profile from {datetime.datetime.fromtimestamp(started_at).strftime('%Y-%m-%d %H:%M:%S')} "
+                  f"({time.time() - started_at:.1f}s, a sample every {self.interval * 1000:g} ms)", ""]
+        report.append(f"{'stage':<36}{'calls':>8}{'wall s':>11}{'cpu s':>10}{'max s':>10}{'proc peak KB':>14}")
+        for stage, (calls, wall, cpu, max_wall, peak) in sorted(timings.items(), key=lambda item: -item[1][1]):
+            report.append(f"{stage:<36}{calls:>8}{wall:>11.3f}{cpu:>10.3f}{max_wall:>10.3f}{peak / 1024:>14.1f}")
+
+        for stage in sorted({stage for stage, _ in categories}):
+            total = sum(count for (sampled_stage, _), count in categories.items() if sampled_stage == stage)
+            breakdown = sorted(((count, category) for (sampled_stage, category), count in categories.items() if sampled_stage == stage), reverse=True)
+            report += ["", f"{stage} ({total} samples): " + ', '.join(f"{category} {100 * count / total:.1f}%" for count, category in breakdown)]
+            for (_, line), count in sorted(((key, count) for key, count in lines.items() if key[0] == stage), key=lambda item: -item[1])[:top]:
+                report.append(f"  {100 * count / total:5.1f}%  {line}")
+
+        if allocations:
+            report += ["", "Largest live allocations:"]
+            for statistic in allocations:
+                frame = statistic.traceback[0]
+                report.append(f"  {statistic.size / 1024:>10.1f} KB {statistic.count:>8} blocks  {os.path.basename(frame.filename)}:{frame.lineno}")
+
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(report) + '\n')
+        with open(os.path.join(self.profiles_dir, name + ".folded"), 'w', encoding='utf-8') as f:
+            for (stage, folded), count in stacks.most_common():
+                f.write(f"{stage};{folded} {count}\n")
+        return report_path
@@ -0,0 +1,371 @@
+# Use this to create functions and classes to secure the communication between devices in the Social Interact setup.
+import os
+import json
+import struct
+import socket
+import threading
+import time
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.exceptions import InvalidSignature, InvalidTag
+
+from user import User
+
+class HandshakeError(ConnectionError):
+    """
+    Raised when a peer cannot be authenticated - a bad signature, or an identity that does not match its pinned key.
+    """
+
+class SecureChannel(object):
+    """
+    Class wrapping a connected socket so that everything sent over it is encrypted and authenticated.
+    """
+    HEADER = struct.Struct('!I')
+    MAX_FRAME_SIZE = 256 * 1024
+    TAG_SIZE = 16
+
+    def __init__(self, sock:socket.socket, send_key:bytes, recv_key:bytes, peer_name:str, resumed:bool=False, peer_features:list=()):
+        """
+        Initialises the channel. \\
+        Data is sent in frames of at most `MAX_FRAME_SIZE` bytes: a 4-byte length followed by the AES-256-GCM
+        ciphertext and tag, with the length as associated data. Frames are encrypted in place into one reusable
+        buffer, so sending costs no copies besides the encryption itself. Each direction has its own key and the nonce is
+        the frame counter, so nonces are never sent, never reused, and reordered or replayed frames fail to decrypt. \\
+        The channel can be used in place of the socket: `sendall`, `recv`, `settimeout` and `close` behave the same.
+
+        Args:
+            sock (socket.socket): The connected socket.
+            send_key (bytes): The 32-byte key of outgoing frames.
+            recv_key (bytes): The 32-byte key of incoming frames.
+            peer_name (str): The authenticated name of the peer device.
+            resumed (bool): Whether the session was resumed rather than fully negotiated. Defaults to False.
+            peer_features (list): The protocol features the peer advertised in the handshake (see `SecureTransport.features`).
+        """
+        self.sock = sock
+        self.send_cipher = AESGCM(send_key)
+        self.recv_cipher = AESGCM(recv_key)
+        self.send_frame = bytearray(self.HEADER.size + self.MAX_FRAME_SIZE + self.TAG_SIZE)
+        self.send_counter = 0
+        self.recv_counter = 0
+        self.recv_frame = bytearray(self.MAX_FRAME_SIZE + self.TAG_SIZE)
+        self.recv_plaintext = bytearray(self.MAX_FRAME_SIZE)
+        self.buffer = memoryview(self.recv_plaintext)[:0] # decrypted data of the current frame not yet returned by `recv`
+        self.offset = 0
+        self.peer_name = peer_name
+        self.resumed = resumed
+        self.peer_features = frozenset(peer_features)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sendall(self, data):
+        """
+        Encrypts and sends all of the data.
+        """
+        view = memoryview(data)
+        frame = memoryview(self.send_frame)
+        for start in range(0, len(view), self.MAX_FRAME_SIZE):
+            chunk = view[start:start + self.MAX_FRAME_SIZE]
+            size = len(chunk) + self.TAG_SIZE
+            self.HEADER.pack_into(frame, 0, size)
+            nonce = self.send_counter.to_bytes(12, 'big')
+            if hasattr(self.send_cipher, 'encrypt_into'):
+                self.send_cipher.encrypt_into(nonce, chunk, frame[:self.HEADER.size], frame[self.HEADER.size:self.HEADER.size + size])
+            else: # cryptography < 45
+                frame[self.HEADER.size:self.HEADER.size + size] = self.send_cipher.encrypt(nonce, chunk, frame[:self.HEADER.size])
+            self.send_counter += 1
+            self.sock.sendall(frame[:self.HEADER.size + size])
+
+    def _recv_exactly(self, view:memoryview):
+        """
+        Fills the view from the socket. Returns False if the peer closed the connection before sending anything.
+        """
+        received = 0
+        while received < len(view):
+            count = self.sock.recv_into(view[received:], len(view) - received)
+            if not count:
+                if received == 0:
+                    return False
+                raise ConnectionResetError("Connection closed in the middle of an encrypted frame.")
+            received += count
+        return True
+
+    def recv(self, size:int):
+        """
+        Receives up to `size` bytes of decrypted data. Returns an empty bytes object once the peer closed the connection.
+
+        Raises:
+            ConnectionError: If a frame fails authentication.
+        """
+        while self.offset >= len(self.buffer):
+            header = bytearray(self.HEADER.size)
+            if not self._recv_exactly(memoryview(header)):
+                return b''
+            length, = self.HEADER.unpack(header)
+            if not self.TAG_SIZE <= length <= self.MAX_FRAME_SIZE + self.TAG_SIZE:
+                raise ConnectionError(f"Encrypted frame of {length} bytes is invalid.")
+            ciphertext = memoryview(self.recv_frame)[:length]
+            if not self._recv_exactly(ciphertext):
+                raise ConnectionResetError("Connection closed in the middle of an encrypted frame.")
+            nonce = self.recv_counter.to_bytes(12, 'big')
+            try:
+                if hasattr(self.recv_cipher, 'decrypt_into'):
+                    plaintext = memoryview(self.recv_plaintext)[:length - self.TAG_SIZE]
+                    self.recv_cipher.decrypt_into(nonce, ciphertext, header, plaintext)
+                else: # cryptography < 45
+                    plaintext = memoryview(self.recv_cipher.decrypt(nonce, ciphertext, header))
+            except InvalidTag:
+                raise ConnectionError("Encrypted frame failed authentication.")
+            self.recv_counter += 1
+            self.buffer = plaintext
+            self.offset = 0
+        data = bytes(self.buffer[self.offset:self.offset + size])
+        self.offset += len(data)
+        return data
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        self.sock.close()
+
+class SecureTransport(object):
+    """
+    Class to authenticate devices and set up encrypted channels between them.
+    """
+    MAGIC = b'IAS1'
+    HEADER = struct.Struct('!I')
+    MAX_HANDSHAKE_SIZE = 64 * 1024
+    SESSION_TTL = 24 * 3600
+    MAX_SESSIONS = 1024
+
+    def __init__(self, root_usr_dir:str, curr_device:User):
+        """
+        Initialises the transport. \\
+        Every device has a long-lived Ed25519 identity, kept in `<root_usr_dir>/keys/identity.key`, whose public key is
+        pinned to the device the first time it authenticates (trust on first use) - in `users.csv` for contacts and in
+        `keys/pinned.json` for every other device (see `User.pin_public_key`). \\
+        A full handshake exchanges ephemeral X25519 keys and signs the transcript with both identities, so the
+        session keys stay secret even if an identity key leaks later. It also hands out a session id: later
+        connections to the same device present it and derive fresh keys from the session secret and new nonces,
+        which costs one round trip and no public-key operations (see `connect` and `accept`). Sessions are kept in
+        memory for `SESSION_TTL` seconds.
+
+        Args:
+            root_usr_dir (str): The root directory where user data is stored.
+            curr_device (User): The current device.
+        """
+        assert isinstance(curr_device, User), "curr_device must be an instance of User"
+        self.curr_device = curr_device
+        keys_dir = os.path.join(root_usr_dir, "keys")
+        if not os.path.exists(keys_dir):
+            os.makedirs(keys_dir)
+        identity_file = os.path.join(keys_dir, "identity.key")
+        if os.path.exists(identity_file):
+            with open(identity_file, 'rb') as f:
+                self.identity = Ed25519PrivateKey.from_private_bytes(f.read())
+        else:
+            self.identity = Ed25519PrivateKey.generate()
+            with os.fdopen(os.open(identity_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(self.identity.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()))
+        self.public_key = self.identity.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw).hex()
+        if self.curr_device.account_exists and self.curr_device.get_public_key(self.curr_device.name) != self.public_key:
+            self.curr_device.pin_public_key(self.curr_device.name, self.public_key)
+
+        self.lock = threading.Lock()
+        self.client_sessions = {} # peer name -> (session id, secret, expiry)
+        self.server_sessions = {} # session id -> (secret, peer name, expiry)
+        # optional protocol features of the services on top (e.g. `content_store`), advertised to the devices that
+        # connect to this one; they only ever enable optimisations, so they are not part of the signed transcript
+        self.features = set()
+
+    def _send_message(self, sock, message:dict):
+        data = json.dumps(message).encode('utf-8')
+        sock.sendall(self.HEADER.pack(len(data)) + data)
+
+    def _recv_message(self, sock):
+        data = b''
+        while len(data) < self.HEADER.size:
+            chunk = sock.recv(self.HEADER.size - len(data))
+            if not chunk:
+                raise ConnectionResetError("Peer closed the connection during the handshake.")
+            data += chunk
+        size, = self.HEADER.unpack(data)
+        if size > self.MAX_HANDSHAKE_SIZE:
+            raise HandshakeError(f"Handshake message of {size} bytes is too large.")
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionResetError("Peer closed the connection during the handshake.")
+            data += chunk
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            raise HandshakeError("Malformed handshake message.")
+
+    @staticmethod
+    def _derive(secret:bytes, salt:bytes, info:bytes):
+        """
+        Derives the client-to-server key, the server-to-client key and the session secret.
+        """
+        material = HKDF(algorithm=hashes.SHA256(), length=96, salt=salt, info=info).derive(secret)
+        return material[:32], material[32:64], material[64:]
+
+    @staticmethod
+    def _transcript(hello:dict, reply:dict):
+        return b'|'.join([SecureTransport.MAGIC, hello['name'].encode('utf-8'), bytes.fromhex(hello['eph']), bytes.fromhex(hello['nonce']),
+                          reply['name'].encode('utf-8'), bytes.fromhex(reply['eph']), bytes.fromhex(reply['nonce']), bytes.fromhex(reply['session'])])
+
+    def _verify(self, name:str, identity:str, signature:str, message:bytes):
+        """
+        Verifies the signature of a peer and checks its identity against the key pinned to its name.
+
+        Raises:
+            HandshakeError: If the signature is invalid or the identity does not match the pinned key.
+        """
+        try:
+            Ed25519PublicKey.from_public_bytes(bytes.fromhex(identity)).verify(bytes.fromhex(signature), message)
+        except (InvalidSignature, ValueError):
+            raise HandshakeError(f"{name} failed to prove its identity.")
+        pinned = self.curr_device.get_public_key(name)
+        if pinned is None:
+            self.curr_device.pin_public_key(name, identity)
+        elif pinned != identity:
+            raise HandshakeError(f"The identity of {name} does not match its pinned key. Remove the key from users.csv if the device was reinstalled.")
+
+    def _remember(self, sessions:dict, key, value):
+        now = time.time()
+        with self.lock:
+            if len(sessions) >= self.MAX_SESSIONS:
+                for stale in [k for k, v in sessions.items() if v[-1] < now] or list(sessions)[:len(sessions) // 2]:
+                    del sessions[stale]
+            sessions[key] = value
+
+    def is_secure(self, sock:socket.socket, timeout:float=1.0):
+        """
+        Checks, without consuming anything, whether an accepted connection starts an encrypted session - devices
+        from before encryption send their metadata in plaintext right away. A peer that sends nothing within
+        `timeout` seconds is treated as plaintext; the timeout of the socket is restored afterwards.
+        """
+        previous_timeout = sock.gettimeout()
+        deadline = time.monotonic() + timeout
+        data = b''
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                sock.settimeout(remaining)
+                data = sock.recv(len(self.MAGIC), socket.MSG_PEEK)
+                if len(data) >= len(self.MAGIC) or not data or not self.MAGIC.startswith(data):
+                    break
+                time.sleep(0.01)
+        except socket.timeout:
+            pass
+        finally:
+            sock.settimeout(previous_timeout)
+        return data == self.MAGIC
+
+    def connect(self, sock:socket.socket, peer_name:str):
+        """
+        Sets up an encrypted channel over a connected socket, as the side that opened the connection. The session
+        with the peer is resumed if there is one.
+
+        Args:
+            sock (socket.socket): The connected socket.
+            peer_name (str): The name of the device the socket is connected to.
+
+        Returns:
+            SecureChannel: The encrypted channel.
+
+        Raises:
+            HandshakeError: If the peer cannot be authenticated.
+            ConnectionResetError: If the peer closed the connection (e.g. it does not support encryption).
+        """
+        eph = X25519PrivateKey.generate()
+        with self.lock:
+            session = self.client_sessions.get(peer_name)
+        if session is not None and session[2] < time.time():
+            session = None
+        hello = {
+            'name': self.curr_device.name,
+            'eph': eph.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw).hex(),
+            'nonce': os.urandom(16).hex(),
+            'session': session[0] if session else None
+        }
+        sock.sendall(self.MAGIC)
+        self._send_message(sock, hello)
+        reply = self._recv_message(sock)
+        salt = bytes.fromhex(hello['nonce']) + bytes.fromhex(reply['nonce'])
+
+        if reply.get('resumed'):
+            if session is None:
+                raise HandshakeError(f"{peer_name} resumed a session that was never established.")
+            send_key, recv_key, _ = self._derive(session[1], salt, b'InterAct resumption')
+            return SecureChannel(sock, send_key, recv_key, peer_name, resumed=True, peer_features=reply.get('features', ()))
+
+        transcript = self._transcript(hello, reply)
+        if reply['name'] != peer_name:
+            raise HandshakeError(f"Expected {peer_name} but {reply['name']} answered.")
+        self._verify(peer_name, reply['identity'], reply['signature'], b'server' + transcript)
+        self._send_message(sock, {'identity': self.public_key, 'signature': self.identity.sign(b'client' + transcript).hex()})
+        shared = eph.exchange(X25519PublicKey.from_public_bytes(bytes.fromhex(reply['eph'])))
+        send_key, recv_key, secret = self._derive(shared, salt, b'InterAct handshake')
+        self._remember(self.client_sessions, peer_name, (reply['session'], secret, time.time() + self.SESSION_TTL))
+        return SecureChannel(sock, send_key, recv_key, peer_name, peer_features=reply.get('features', ()))
+
+    def accept(self, sock:socket.socket):
+        """
+        Sets up an encrypted channel over an accepted socket, resuming the session the peer presents if it is known.
+
+        Args:
+            sock (socket.socket): The accepted socket.
+
+        Returns:
+            SecureChannel: The encrypted channel, whose `peer_name` is the authenticated name of the peer.
+
+        Raises:
+            HandshakeError: If the connection is not an encrypted session or the peer cannot be authenticated.
+        """
+        magic = b''
+        while len(magic) < len(self.MAGIC):
+            chunk = sock.recv(len(self.MAGIC) - len(magic))
+            if not chunk:
+                raise ConnectionResetError("Peer closed the connection during the handshake.")
+            magic += chunk
+        if magic != self.MAGIC:
+            raise HandshakeError("The peer did not start an encrypted session.")
+        hello = self._recv_message(sock)
+        nonce = os.urandom(16).hex()
+        salt = bytes.fromhex(hello['nonce']) + bytes.fromhex(nonce)
+
+        with self.lock:
+            session = self.server_sessions.get(hello.get('session'))
+        if session is not None and session[1] == hello['name'] and session[2] >= time.time():
+            self._send_message(sock, {'resumed': True, 'nonce': nonce, 'features': sorted(self.features)})
+            recv_key, send_key, _ = self._derive(session[0], salt, b'InterAct resumption')
+            return SecureChannel(sock, send_key, recv_key, hello['name'], resumed=True)
+
+        eph = X25519PrivateKey.generate()
+        reply = {
+            'resumed': False,
+            'name': self.curr_device.name,
+            'eph': eph.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw).hex(),
+            'nonce': nonce,
+            'session': os.urandom(16).hex(),
+            'identity': self.public_key,
+            'features': sorted(self.features)
+        }
+        transcript = self._transcript(hello, reply)
+        reply['signature'] = self.identity.sign(b'server' + transcript).hex()
+        self._send_message(sock, reply)
+        auth = self._recv_message(sock)
+        self._verify(hello['name'], auth['identity'], auth['signature'], b'client' + transcript)
+        shared = eph.exchange(X25519PublicKey.from_public_bytes(bytes.fromhex(hello['eph'])))
+        recv_key, send_key, secret = self._derive(shared, salt, b'InterAct handshake')
+        self._remember(self.server_sessions, reply['session'], (secret, hello['name'], time.time() + self.SESSION_TTL))
+        return SecureChannel(sock, send_key, recv_key, hello['name'])
@@ -0,0 +1,436 @@
+# Use this to simulate hundreds of devices around one InterAct device and measure how it scales.
+import os
+import sys
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import resource
+import selectors
+import threading
+import tracemalloc
+import contextlib
+import io
+from concurrent.futures import ThreadPoolExecutor, wait
+from zeroconf import ServiceInfo
+from termcolor import colored
+
+curr_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(curr_dir))
+
+from user import User
+from devices import Radar
+from data_sharing import DataSharing
+
+class SimulatedPeer(object):
+    """
+    A device of the simulation. It has its own loopback address (127.1.x.y), answers pings on it while online, and
+    sends files from it.
+    """
+    def __init__(self, name:str, ip_address:str, port:int):
+        self.name = name
+        self.ip_address = ip_address
+        self.port = port
+        self.online = False
+        self.socket = None
+
+class SimulatedNetwork(object):
+    """
+    In-process stand-in for the mDNS network between the observed device and the simulated peers. Announcements and
+    goodbyes are handed to `Radar.handle_service_info` and `Radar.remove_service` on a thread pool, as the zeroconf
+    browser does, and the pings and bandwidth probes the radar sends while resolving a device are echoed for the
+    peers that are online. \\
+    The discovery latency of an announcement is measured by watching `radar.devices`: it runs until the peer is listed
+    there as online, polled every `poll_interval` seconds while announcements are pending.
+    """
+    def __init__(self, radar:Radar, workers:int=None, poll_interval:float=0.001):
+        """
+        Args:
+            radar (Radar): The radar of the observed device. Its `ping_port` is where the peers answer pings.
+            workers (int): Size of the pool the announcements are handled on. Defaults to the size of asyncio's default executor.
+            poll_interval (float): Seconds between two looks at `radar.devices` for announced peers. Defaults to 1ms.
+        """
+        assert isinstance(radar, Radar), "radar must be an instance of Radar"
+        self.radar = radar
+        self.peers = {} # file descriptor of the peer's ping socket -> peer
+        self.selector = selectors.DefaultSelector()
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4), thread_name_prefix='Zeroconf_Sim_Thread')
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.latencies = [] # seconds from an announcement to the device being in `radar.devices`
+        self.poll_interval = poll_interval
+        self.watched = {} # peer name -> [announcement time, whether the peer must leave `radar.devices` first]
+        self.is_running = threading.Event()
+        self.is_running.set()
+        threading.Thread(target=self.serve, name='Ping_Sim_Thread', daemon=True).start()
+        threading.Thread(target=self.watch, name='Discovery_Sim_Thread', daemon=True).start()
+
+    def add_peer(self, peer:SimulatedPeer):
+        """
+        Binds the ping socket of a peer on its loopback address.
+
+        Raises:
+            OSError: If the address cannot be bound (only Linux routes the whole of 127.0.0.0/8 to the loopback interface).
+        """
+        peer.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        peer.socket.bind((peer.ip_address, self.radar.ping_port))
+        peer.socket.setblocking(False)
+        self.peers[peer.socket.fileno()] = peer
+        self.selector.register(peer.socket, selectors.EVENT_READ, peer)
+
+    def serve(self):
+        """
+        Echoes the pings sent to online peers; offline peers drop them, like a device that left the network.
+        """
+        while self.is_running.is_set():
+            for key, _ in self.selector.select(timeout=0.2):
+                peer = key.data
+                while True:
+                    try:
+                        data, address = peer.socket.recvfrom(65535)
+                    except (BlockingIOError, InterruptedError, OSError):
+                        break
+                    if peer.online and data[:4] == Radar.PING_REQUEST:
+                        try:
+                            peer.socket.sendto(Radar.PING_REPLY + data[4:], address)
+                        except OSError:
+                            pass
+
+    def _submit(self, function, *args):
+        future = self.executor.submit(function, *args)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(lambda future: self.pending.discard(future))
+        return future
+
+    def announce(self, peer:SimulatedPeer):
+        """
+        Brings a peer online and announces it to the radar.
+        """
+        peer.online = True
+        info = ServiceInfo(self.radar.service_type, f"{peer.name}.{self.radar.service_type}", port=peer.port,
+                           addresses=[socket.inet_aton(peer.ip_address)], server=f"{peer.name}.local.")
+        with self.lock:
+            # a peer still listed from before it went offline (its goodbye not handled yet) only counts once it is listed again
+            self.watched[peer.name] = [time.perf_counter(), peer.name in self._listed()]
+        self._submit(self.radar.handle_service_info, info)
+
+    def _listed(self):
+        return {device['name'] for device in list(self.radar.devices) if device['status'] == 'online'}
+
+    def _check(self):
+        """
+        Records the latency of the announced peers that are now listed online in `radar.devices`.
+        """
+        listed, now = self._listed(), time.perf_counter()
+        with self.lock:
+            for name, (announced_at, must_leave) in list(self.watched.items()):
+                if must_leave:
+                    self.watched[name][1] = name in listed
+                elif name in listed:
+                    self.latencies.append(now - announced_at)
+                    del self.watched[name]
+
+    def watch(self):
+        """
+        Looks for announced peers in `radar.devices` every `poll_interval` seconds. This method is intended to be run in a separate thread.
+        """
+        while self.is_running.is_set():
+            time.sleep(self.poll_interval)
+            if self.watched:
+                self._check()
+
+    def withdraw(self, peer:SimulatedPeer):
+        """
+        Takes a peer offline and sends its goodbye to the radar.
+        """
+        peer.online = False
+        self._submit(self.radar.remove_service, None, self.radar.service_type, f"{peer.name}.{self.radar.service_type}")
+
+    def drain(self, timeout:float=60):
+        """
+        Waits until every announcement and goodbye sent so far has been handled. Peers that are still not listed in
+        `radar.devices` by then were not discovered, and no latency is recorded for them.
+        """
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending, timeout=timeout)
+        self._check()
+        with self.lock:
+            self.watched.clear()
+
+    def close(self):
+        self.is_running.clear()
+        self.executor.shutdown(wait=True)
+        for peer in self.peers.values():
+            self.selector.unregister(peer.socket)
+            peer.socket.close()
+        self.selector.close()
+
+class Simulation(object):
+    """
+    Class running one observed InterAct device (the real `User`, `Radar` and `DataSharing`) among `num_peers`
+    simulated devices that join, churn online and offline and push files to it.
+    """
+    def __init__(self, num_peers:int, root_dir:str=None, contact_ratio:float=0.5, join_window:float=2.0, duration:float=10.0,
+                 churn_rate:float=5.0, push_rate:float=2.0, push_size:int=64*1024, seed:int=0, verbose:bool=False):
+        """
+        Initialises the simulation. Nothing runs until `run` is called.
+
+        Args:
+            num_peers (int): Number of simulated devices.
+            root_dir (str): Data directory of the observed device. Defaults to a temporary directory, deleted by `close`.
+            contact_ratio (float): Fraction of the peers that are contacts of the observed device. Defaults to 0.5.
+            join_window (float): Seconds over which the peers first announce themselves. Defaults to 2.
+            duration (float): Seconds of churn and file pushes after everyone joined. Defaults to 10.
+            churn_rate (float): Peers going offline or coming back per second. Defaults to 5.
+            push_rate (float): Files pushed to the observed device per second. Defaults to 2.
+            push_size (int): Size of each pushed file in bytes. Defaults to 64KB.
+            seed (int): Seed of the random choices, so runs are repeatable. Defaults to 0.
+            verbose (bool): Whether to let the observed device print. Defaults to False.
+
+        Raises:
+            AssertionError: If `num_peers` is not a positive integer or a rate or ratio is out of range.
+        """
+        assert isinstance(num_peers, int) and 0 < num_peers <= 250 * 250, "num_peers must be a positive integer (at most 62500)"
+        assert 0 <= contact_ratio <= 1, "contact_ratio must be between 0 and 1"
+        assert churn_rate >= 0 and push_rate >= 0 and duration >= 0 and join_window >= 0, "rates and durations must not be negative"
+        self.num_peers = num_peers
+        self.temporary = root_dir is None
+        self.root_dir = root_dir or tempfile.mkdtemp(prefix="interact_sim_")
+        self.contact_ratio = contact_ratio
+        self.join_window = join_window
+        self.duration = duration
+        self.churn_rate = churn_rate
+        self.push_rate = push_rate
+        self.push_size = push_size
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        self.pushes = {'sent': 0, 'failed': 0}
+        self.csv = {'writes': 0, 'bytes': 0, 'rows_changed': 0}
+        self.lock = threading.Lock() # the counters are updated from the pushers and the observed device's threads
+
+    def _free_port(self, kind=socket.SOCK_STREAM):
+        with socket.socket(socket.AF_INET, kind) as probe_socket:
+            probe_socket.bind(('127.0.0.1', 0))
+            return probe_socket.getsockname()[1]
+
+    def _quiet(self):
+        """
+        Silences the observed device (progress bars included) unless `verbose` is set. The redirection is process-wide,
+        so it also covers the threads the device works in.
+        """
+        if self.verbose:
+            return contextlib.nullcontext()
+        stack = contextlib.ExitStack()
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+        return stack
+
+    def setup(self):
+        """
+        Creates the observed device and the peers, and makes part of the peers contacts (in one write).
+        """
+        self.curr_device = User(root_usr_dir=self.root_dir)
+        self.file_server = socket.create_server(('127.0.0.1', 0), backlog=128)
+        self.curr_device.update_user(name="Observer", ip_address='127.0.0.1', file_transfer_port=self.file_server.getsockname()[1])
+        self.radar = Radar(root_usr_dir=self.root_dir, curr_device=self.curr_device)
+        self.radar.ping_port = self._free_port(socket.SOCK_DGRAM)
+        self.data_transferer = DataSharing(root_usr_dir=self.root_dir, curr_device=self.curr_device, radar=self.radar, file_packet_size=64*1024)
+        self.network = SimulatedNetwork(self.radar)
+        self.peers = []
+        for index in range(self.num_peers):
+            peer = SimulatedPeer(f"Peer_{index:05d}", f"127.1.{index // 250}.{index % 250 + 1}", 9000)
+            self.network.add_peer(peer)
+            self.peers.append(peer)
+        contacts = self.random.sample(self.peers, int(self.num_peers * self.contact_ratio))
+        if contacts:
+            self.curr_device.merge_contacts([{'name': peer.name, 'ip_address': peer.ip_address, 'port': peer.port} for peer in contacts])
+
+        # count what the contact store writes from here on
+        save_usr_file, update_many = self.curr_device.save_usr_file, self.curr_device.update_contacts_status_many
+        users_file = os.path.join(self.root_dir, "users.csv")
+
+        def counted_save():
+            save_usr_file()
+            with self.lock:
+                self.csv['writes'] += 1
+                self.csv['bytes'] += os.path.getsize(users_file)
+
+        def counted_update(updates):
+            with self.lock:
+                self.csv['rows_changed'] += len(updates)
+            return update_many(updates)
+        self.curr_device.save_usr_file = counted_save
+        self.curr_device.update_contacts_status_many = counted_update
+        threading.Thread(target=self.accept_files, name='File_Server_Sim_Thread', daemon=True).start()
+
+    def accept_files(self):
+        """
+        The file transfer server of the observed device, like `DataSharing.background_process` but stoppable.
+        """
+        while True:
+            try:
+                sender_socket, sender_address = self.file_server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.data_transferer.file_receiving, args=(sender_socket, sender_address), daemon=True).start()
+
+    def push(self, peer:SimulatedPeer, number:int):
+        """
+        Sends a file from a peer to the observed device (plaintext protocol, from the peer's own address).
+        """
+        try:
+            with socket.create_connection(('127.0.0.1', self.file_server.getsockname()[1]), timeout=10, source_address=(peer.ip_address, 0)) as sender_socket:
+                sender_socket.sendall(f"push_{number}.bin|{self.push_size}|{peer.name}\n".encode('utf-8') + os.urandom(self.push_size))
+            result = 'sent'
+        except OSError:
+            result = 'failed'
+        with self.lock:
+            self.pushes[result] += 1
+
+    def run(self):
+        """
+        Runs the simulation: every peer joins within `join_window`, then peers churn and push files for `duration`.
+
+        Returns:
+            dict: The measurements (see `report`).
+        """
+        with self._quiet():
+            return self._run()
+
+    def _run(self):
+        self.setup()
+        csv_before = dict(self.csv)
+        tracemalloc.start()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        peak_threads = threading.active_count()
+
+        # everyone joins
+        order = list(self.peers)
+        self.random.shuffle(order)
+        for index, peer in enumerate(order):
+            target = wall_start + self.join_window * index / len(order)
+            while (remaining := target - time.perf_counter()) > 0:
+                time.sleep(min(remaining, 0.05))
+            self.network.announce(peer)
+            peak_threads = max(peak_threads, threading.active_count())
+        self.network.drain()
+        join_seconds = time.perf_counter() - wall_start
+        discovered = sum(device['status'] == 'online' for device in self.radar.devices)
+        join_latencies = sorted(self.network.latencies)
+
+        # churn and pushes, as two Poisson processes
+        pushers = ThreadPoolExecutor(max_workers=8, thread_name_prefix='Push_Sim_Thread')
+        churn_events, pushes, now = 0, 0, time.perf_counter()
+        end = now + self.duration
+        next_churn = now + self.random.expovariate(self.churn_rate) if self.churn_rate else float('inf')
+        next_push = now + self.random.expovariate(self.push_rate) if self.push_rate else float('inf')
+        while (now := time.perf_counter()) < end:
+            if now >= next_churn:
+                peer = self.random.choice(self.peers)
+                (self.network.withdraw if peer.online else self.network.announce)(peer)
+                churn_events += 1
+                next_churn += self.random.expovariate(self.churn_rate)
+            if now >= next_push:
+                online = [peer for peer in self.peers if peer.online]
+                if online:
+                    pushers.submit(self.push, self.random.choice(online), pushes)
+                    pushes += 1
+                next_push += self.random.expovariate(self.push_rate)
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(max(min(next_churn, next_push, end) - time.perf_counter(), 0))
+        pushers.shutdown(wait=True)
+        self.network.drain()
+        deadline = time.perf_counter() + 30
+        while self.data_transferer.transfers and time.perf_counter() < deadline:
+            time.sleep(0.05)
+
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        _, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        csv = {key: self.csv[key] - csv_before[key] for key in self.csv}
+        rows = len(self.curr_device.usr_file)
+        row_bytes = os.path.getsize(os.path.join(self.root_dir, "users.csv")) / max(rows, 1)
+        with self.network.lock:
+            churn_latencies = sorted(self.network.latencies[len(join_latencies):])
+        percentile = lambda values, q: values[min(int(q * len(values)), len(values) - 1)] * 1000 if values else None
+        return {
+            'peers': self.num_peers,
+            'discovered': discovered,
+            'join_seconds': join_seconds,
+            'discovery_p50_ms': percentile(join_latencies, 0.5),
+            'discovery_p95_ms': percentile(join_latencies, 0.95),
+            'discovery_max_ms': join_latencies[-1] * 1000 if join_latencies else None,
+            'churn_events': churn_events,
+            'churn_discovery_p95_ms': percentile(churn_latencies, 0.95),
+            'pushes': self.pushes['sent'],
+            'failed_pushes': self.pushes['failed'],
+            'received': int(self.data_transferer.transfers_finished.value(direction='received', result='complete')),
+            'cpu_percent': 100 * cpu / wall,
+            'cpu_seconds': cpu,
+            'memory_peak_mb': memory_peak / 1024 / 1024,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'peak_threads': peak_threads,
+            'csv_writes': csv['writes'],
+            'csv_mb_written': csv['bytes'] / 1024 / 1024,
+            'csv_writes_per_event': csv['writes'] / max(self.num_peers + churn_events, 1),
+            # bytes written to users.csv for each byte of contact rows that actually changed
+            'write_amplification': csv['bytes'] / (csv['rows_changed'] * row_bytes) if csv['rows_changed'] else None
+        }
+
+    def close(self):
+        """
+        Stops the simulated network and the file server, and deletes the data directory if it was temporary.
+        """
+        self.file_server.close()
+        self.network.close()
+        with self._quiet():
+            self.radar.close()
+        self.curr_device.stats.close()
+        if self.temporary:
+            shutil.rmtree(self.root_dir, ignore_errors=True)
+
+def report(results:list):
+    """
+    Prints the measurements of simulations of growing size side by side.
+
+    Args:
+        results (list): The dicts returned by `Simulation.run`.
+    """
+    columns = [('peers', 'peers', '{:d}'), ('discovered', 'found', '{:d}'), ('join_seconds', 'join s', '{:.2f}'),
+               ('discovery_p50_ms', 'p50 ms', '{:.1f}'), ('discovery_p95_ms', 'p95 ms', '{:.1f}'), ('discovery_max_ms', 'max ms', '{:.1f}'),
+               ('churn_events', 'churn', '{:d}'), ('pushes', 'pushes', '{:d}'), ('received', 'recvd', '{:d}'),
+               ('cpu_percent', 'cpu %', '{:.0f}'), ('memory_peak_mb', 'heap MB', '{:.1f}'), ('max_rss_mb', 'rss MB', '{:.0f}'),
+               ('peak_threads', 'threads', '{:d}'), ('csv_writes', 'csv writes', '{:d}'), ('csv_mb_written', 'csv MB', '{:.2f}'),
+               ('csv_writes_per_event', 'w/event', '{:.2f}'), ('write_amplification', 'write amp', '{:.0f}x')]
+    widths = [max(len(title), 9) for _, title, _ in columns]
+    print(' '.join(colored(title.rjust(width), 'yellow') for (_, title, _), width in zip(columns, widths)))
+    for result in results:
+        print(' '.join((fmt.format(result[key]) if result[key] is not None else '-').rjust(width) for (key, _, fmt), width in zip(columns, widths)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many devices around one InterAct device and report how it scales.")
+    parser.add_argument('--peers', type=int, nargs='+', default=[50, 100, 250, 500], help="Numbers of simulated devices to run with.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of churn and file pushes per run.")
+    parser.add_argument('--join-window', type=float, default=2.0, help="Seconds over which the devices first join.")
+    parser.add_argument('--churn', type=float, default=5.0, help="Devices going offline or coming back per second.")
+    parser.add_argument('--push', type=float, default=2.0, help="Files pushed to the observed device per second.")
+    parser.add_argument('--push-size', type=int, default=64*1024, help="Size of each pushed file in bytes.")
+    parser.add_argument('--contacts', type=float, default=0.5, help="Fraction of the devices that are contacts.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random choices.")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the observed device.")
+    args = parser.parse_args()
+
+    results = []
+    for num_peers in args.peers:
+        print(f"Simulating {colored(num_peers, 'light_cyan')} devices...")
+        simulation = Simulation(num_peers, contact_ratio=args.contacts, join_window=args.join_window, duration=args.duration,
+                                churn_rate=args.churn, push_rate=args.push, push_size=args.push_size, seed=args.seed, verbose=args.verbose)
+        try:
+            results.append(simulation.run())
+        finally:
+            simulation.close()
+    report(results)
@@ -0,0 +1,133 @@
+# Use this to create functions and classes to handle usage statistics of devices in the Social Interact setup.
+import os
+import struct
+import threading
+
+class StatsStore(object):
+    """
+    Class to maintain per-device usage counters (transfers, bytes, discoveries, group memberships).
+    """
+    RECORD = struct.Struct('<QQIIIIIId')
+    FIELDS = ('bytes_sent', 'bytes_received', 'transfers_sent', 'transfers_received',
+              'failed_sends', 'failed_receives', 'discoveries', 'group_memberships', 'transfer_seconds')
+
+    def __init__(self, root_usr_dir:str):
+        """
+        Initialises the statistics store. \\
+        Counters are kept in memory and every update rewrites only the fixed-size (48 bytes) record of the
+        affected device in `<root_usr_dir>/stats/counters.bin`, so each event costs O(1) and a stats query
+        is a lookup rather than a recomputation. Device names are mapped to record slots in `devices.txt`.
+
+        Args:
+            root_usr_dir (str): The root directory where user data is stored.
+        """
+        self.stats_dir = os.path.join(root_usr_dir, "stats")
+        if not os.path.exists(self.stats_dir):
+            os.makedirs(self.stats_dir)
+        self.lock = threading.Lock()
+
+        self.device_ids = {}
+        self.counters = []
+        devices_file = os.path.join(self.stats_dir, "devices.txt")
+        if os.path.exists(devices_file):
+            with open(devices_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self.device_ids[line.rstrip('\n')] = len(self.device_ids)
+
+        counters_file = os.path.join(self.stats_dir, "counters.bin")
+        if os.path.exists(counters_file):
+            with open(counters_file, 'rb') as f:
+                data = f.read()
+            self.counters = [list(record) for record in self.RECORD.iter_unpack(data[:len(data) - len(data) % self.RECORD.size])]
+        while len(self.counters) < len(self.device_ids):
+            self.counters.append([0] * (len(self.FIELDS) - 1) + [0.0])
+        self.counters_file = open(counters_file, 'r+b' if os.path.exists(counters_file) else 'w+b')
+
+    def _slot(self, name:str):
+        device_id = self.device_ids.get(name)
+        if device_id is None:
+            device_id = len(self.device_ids)
+            with open(os.path.join(self.stats_dir, "devices.txt"), 'a', encoding='utf-8') as f:
+                f.write(name.replace('\n', ' ') + '\n')
+            self.device_ids[name] = device_id
+            self.counters.append([0] * (len(self.FIELDS) - 1) + [0.0])
+        return device_id
+
+    def _update(self, name:str, **deltas):
+        with self.lock:
+            device_id = self._slot(str(name))
+            record = self.counters[device_id]
+            for field, delta in deltas.items():
+                record[self.FIELDS.index(field)] += delta
+            record[self.FIELDS.index('group_memberships')] = max(record[self.FIELDS.index('group_memberships')], 0)
+            self.counters_file.seek(device_id * self.RECORD.size)
+            self.counters_file.write(self.RECORD.pack(*record))
+            self.counters_file.flush()
+
+    def record_transfer(self, name:str, direction:str, num_bytes:int, seconds:float, success:bool=True):
+        """
+        Records a finished (or failed) transfer with a device.
+
+        Args:
+            name (str): The name of the peer device.
+            direction (str): `sent` or `received`.
+            num_bytes (int): Number of bytes transferred.
+            seconds (float): Duration of the transfer in seconds.
+            success (bool): Whether the transfer completed. Defaults to True.
+
+        Raises:
+            AssertionError: If `direction` is neither `sent` nor `received`.
+        """
+        assert direction in ('sent', 'received'), "direction must be either 'sent' or 'received'"
+        deltas = {f'bytes_{direction}': max(int(num_bytes), 0), 'transfer_seconds': max(float(seconds), 0.0)}
+        if success:
+            deltas[f'transfers_{direction}'] = 1
+        else:
+            deltas['failed_sends' if direction == 'sent' else 'failed_receives'] = 1
+        self._update(name, **deltas)
+
+    def record_discovery(self, name:str):
+        """
+        Records that a device was discovered (or re-discovered) on the network.
+
+        Args:
+            name (str): The name of the device.
+        """
+        self._update(name, discoveries=1)
+
+    def record_group_membership(self, name:str, delta:int=1):
+        """
+        Records a device joining (`delta=1`) or leaving (`delta=-1`) a group.
+
+        Args:
+            name (str): The name of the device.
+            delta (int): Change in the number of groups the device belongs to. Defaults to 1.
+        """
+        self._update(name, group_memberships=delta)
+
+    def get(self, name:str):
+        """
+        Get the statistics of a device.
+
+        Args:
+            name (str): The name of the device.
+
+        Returns:
+            dict: The raw counters along with the average throughput (bytes/s) and the failure rate of transfers.
+        """
+        with self.lock:
+            device_id = self.device_ids.get(str(name))
+            record = list(self.counters[device_id]) if device_id is not None else [0] * (len(self.FIELDS) - 1) + [0.0]
+        stats = dict(zip(self.FIELDS, record))
+        total_bytes = stats['bytes_sent'] + stats['bytes_received']
+        attempts = stats['transfers_sent'] + stats['transfers_received'] + stats['failed_sends'] + stats['failed_receives']
+        stats['avg_throughput'] = total_bytes / stats['transfer_seconds'] if stats['transfer_seconds'] else 0.0
+        stats['failure_rate'] = (stats['failed_sends'] + stats['failed_receives']) / attempts if attempts else 0.0
+        return stats
+
+    def close(self):
+        """
+        Closes the counters file.
+        """
+        with self.lock:
+            self.counters_file.close()
@@ -10,9 +10,8 @@ import logging
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(curr_dir))
 
-from user import *
-from devices import *
-from data_sharing import *
+from user import User
+from daemon import InterActDaemon, DaemonClient, DaemonError
 
 f = Figlet(font='slant')
 print(f.renderText('InterAct'))
@@ -27,73 +26,72 @@ class InterActTerminal(cmd.Cmd):
         intro = "\nWelcome to InterAct - Social media platform for devices!\n"
         print(intro)
 
-        self.curr_device = User(root_usr_dir="./Data")
+        # the terminal is a client of the daemon's API; if no daemon is running, one is started in this process
+        self.client = DaemonClient(root_dir="./Data")
+        self.daemon = None
+        if self.client.is_running():
+            print(f"Connected to the running {colored('InterAct daemon', 'magenta')}.")
+        else:
+            self.start_daemon()
 
-        self.account_exists = self.curr_device.account_exists
-        if not self.account_exists:
+        status = self.client.call('status')
+        print(f"Hey, {colored(status['name'], 'green')}! What's up?")
+        print(f"Type {colored('help', 'yellow', attrs=['underline'])} or {colored('?', 'yellow', attrs=['underline'])} to see the available commands.\n")
+        print("You can now discover nearby devices and share files with them!")
+
+    def start_daemon(self):
+        """
+        Starts the daemon - device discovery, file transfer and the API - in this process.
+        """
+        curr_device = User(root_usr_dir="./Data")
+        if not curr_device.account_exists:
             print("Hey! You seem to be new on the platform.")
             print(f"Enter the name of your device - you will be visible to others by this name.")
             new_name = input("Enter your device name: ").strip()
             if new_name:
-                self.curr_device.update_user(name=new_name)
+                curr_device.update_user(name=new_name)
             else:
                 print("No name entered. Using default name based on IP address.")
-                self.curr_device.update_user(name=f'Device_{self.curr_device.ip_address}')
+                curr_device.update_user(name=f'Device_{curr_device.ip_address}')
             print("\n")
-        print(f"Hey, {colored(self.curr_device.name, 'green')}! What's up?")
-        self.curr_device.update_user()
-        print(f"Type {colored('help', 'yellow', attrs=['underline'])} or {colored('?', 'yellow', attrs=['underline'])} to see the available commands.\n")
 
-        self.radar = Radar(root_usr_dir="./Data", curr_device=self.curr_device)
-        self.data_transferer = DataSharing(root_usr_dir="./Data", curr_device=self.curr_device, radar=self.radar)
-        self.initiate_background_processes()
-    
-    def initiate_background_processes(self):
+        print("Initiating background processes for device discovery and file transfer...")
+        self.daemon = InterActDaemon(root_dir="./Data", curr_device=curr_device)
+        self.daemon.start()
+
+    def call(self, method:str, **params):
+        """
+        Calls the daemon's API, printing the error if the call fails.
+
+        Returns:
+            The result of the call, or None if it failed.
         """
-        Initiates background processes for device discovery and file transfer.
+        try:
+            return self.client.call(method, **params)
+        except DaemonError as e:
+            print(colored(str(e), 'red'))
+            return None
+
+    def print_devices(self, devices:list):
         """
-        print("Initiating background processes for device discovery and file transfer...")
-        ping_thread = threading.Thread(target=self.radar.pinger,
-                                       name='Ping_Thread',
-                                       daemon=True).start()
-        background_thread = threading.Thread(target=self.data_transferer.background_process,
-                                             name='Background_Thread',
-                                            daemon=True).start()
-        
-        self.do_browse(arg='') 
-        print("You can now discover nearby devices and share files with them!")
+        Prints the discovered devices.
+        """
+        if not devices:
+            print("No devices discovered yet.")
+            return
+        print("Discovered devices:")
+        for device in devices:
+            status_color = 'green' if device['status'] == 'online' else 'red'
+            print(f" - {colored(device['name'], 'blue')} (IP: {colored(device['ip_address'], 'cyan')}, Port: {colored(device['port'], 'light_cyan')}, Status: {colored(device['status'], status_color)}, RTT: {colored(device['rtt'], 'light_yellow')}, Link: {colored(device['link'], 'light_yellow')})")
+
+    def print_job(self, job:dict):
+        """
+        Prints a transfer job.
+        """
+        status_color = {'done': 'green', 'partial': 'light_red', 'failed': 'red', 'running': 'light_cyan'}.get(job['status'], 'yellow')
+        target = job.get('receiver') or job.get('community')
+        print(f" - #{job['id']} {job['type']} '{colored(os.path.basename(job['file']), 'yellow')}' to {colored(target, 'blue')}: {colored(job['status'], status_color)} (submitted {job['submitted']}" + (f", finished {job['finished']}" if job['finished'] else "") + ")" + (f" - {job['error']}" if job['error'] else ""))
 
-    def check_for_send(self, file_path, receiver_name):
-        self.send_file_flag = False
-        receiver_info = self.curr_device.get_contacts_by_name(receiver_name)
-        if receiver_info.empty:
-            print(f"Receiver {colored(receiver_name, 'blue')} not found in contacts. Do you wish to continue? ({colored('y[es]}', 'green')}/{colored('n[o])', 'red')}")
-            choice = input().strip().lower()
-            if choice != 'y':
-                print(colored("File sharing cancelled.", 'red'))
-                return None, None
-            print(f"Checking for Receiver {colored(receiver_name, 'blue')} availability...")
-            
-            for device in self.radar.devices:
-                if device['name'] == receiver_name:
-                    receiver_ip = device['ip_address']
-                    receiver_port = device['port']
-                    self.send_file_flag = device['status'] == 'online'
-                    break
-        else:
-            print(f"Receiver {colored(receiver_name, 'blue')} found in contacts. Checking availability...")
-            self.send_file_flag = (receiver_info['status'] == 'online').values[0]
-            receiver_ip = receiver_info['ip_address'].values[0]
-            receiver_port = int(receiver_info['port'].values[0])
-        if not self.send_file_flag:
-            print(f"Receiver {colored(receiver_name, 'blue')} is {colored('offline', 'red')}. Please check the device and try again.")
-            return None, None
-        
-        print(colored("Receiver is online.", 'green'))
-        print(f"Initiating file transfer to {colored(receiver_name, 'blue')} at {colored(receiver_ip, 'cyan')}...")
-
-        return receiver_ip, receiver_port
-    
     # def do_register(self, arg):
     #     """Register this device with a name: register <device_name>"""
     #     name = arg.strip()
@@ -105,67 +103,65 @@ class InterActTerminal(cmd.Cmd):
     #             print(f"Device registered as '{colored(name, 'blue')}'")
     #         else:
     #             print(f"Device is already registered as '{colored(name, 'blue')}'")
-    
+
     def do_self_config(self, arg):
         """
         Display your device's IP address.
         """
+        status = self.call('status')
+        if status is None:
+            return
         print("Details of your device:")
-        for index, row in self.curr_device.identify.iterrows():
-            print(f" - {colored(row['name'], 'blue')} (IP: {row['ip_address']}, Port: {row['port']}, Status: {row['status']}, Last Active: {row['last_active']}, Mode: {row['mode']})")
-        return
+        print(f" - {colored(status['name'], 'blue')} (IP: {status['ip_address']}, Port: {status['port']}, Addresses: {', '.join(status['addresses'])})")
+        print(f"   Browsing: {status['browsing']}, Announcing: {status['announcing']}, Heartbeats: {status['heartbeating']}, Gossip: {status['gossiping']}, Up for {status['uptime_seconds']:.0f}s")
 
     def do_show_contacts(self, arg):
         """
         Lists your contacts: list of known devices.
         """
-        self.contacts = self.curr_device.contacts
-        if self.contacts.empty:
+        contacts = self.call('contacts')
+        if contacts is None:
+            return
+        if not contacts:
             print("You have no contacts yet. Discover nearby devices or add them manually.")
         else:
-            if self.radar.is_browsing.is_set():
-                print("Your contacts:")
-                for index, row in self.contacts.iterrows():
-                    if row['status'] == 'online':
-                        status_color = 'green'
-                    else:
-                        status_color = 'red'
-                    print(f" - {colored(row['name'], 'blue')} (IP: {colored(row['ip_address'], 'cyan')}, Port: {colored(row['port'], 'light_cyan')}, Status: {colored(row['status'], status_color)}, Last Active: {colored(row['last_active'], 'light_yellow')}, Mode: {colored(row['mode'], 'yellow')})")
-            else:
-                for index, row in self.contacts.iterrows():
-                    self.radar.verify(row['name'], row['ip_address'], int(row['port']))
+            print("Your contacts:")
+            for contact in contacts:
+                status_color = 'green' if contact['status'] == 'online' else 'red'
+                print(f" - {colored(contact['name'], 'blue')} (IP: {colored(contact['ip_address'], 'cyan')}, Port: {colored(contact['port'], 'light_cyan')}, Status: {colored(contact['status'], status_color)}, Last Active: {colored(contact['last_active'], 'light_yellow')}, Mode: {colored(contact['mode'], 'yellow')}, RTT: {colored(contact['rtt'], 'light_yellow')}, Link: {colored(contact['link'], 'light_yellow')})")
 
-        if not self.radar.is_browsing.is_set():
+        status = self.call('status')
+        if status is not None and not status['browsing']:
             print(f"No nearby devices to show because browsing is not active. Use {colored('browse', 'yellow', attrs=['underline'])} to discover devices.")
-        else:
-            self.radar.show_devices()
-    
+        elif status is not None:
+            self.print_devices(self.call('devices') or [])
+
     def do_browse(self, arg):
         """Discover nearby devices."""
-        self.radar.browse()
-        print("Browsing...")
-    
+        if self.call('browse'):
+            print("Browsing...")
+
     def do_stop_browsing(self, arg):
         """Stop discovering devices."""
-        self.radar.stop_browsing()
-    
+        self.call('stop_browsing')
+
     def do_announce(self, arg):
         """
         Announce your device to nearby devices.
         """
-        self.radar.announce()
-    
+        self.call('announce')
+
     def do_stop_announce(self, arg):
         """
         Stop announcing your device to nearby devices.
         """
-        self.radar.stop_announcing()
-    
+        self.call('stop_announce')
+
     def do_share(self, arg):
         """
         Share a file with a device: share <device_name> <file_path>
         """
-    
+
     def do_add_manually(self, arg):
         """
         Manually add device to your contacts: add <device_name> <ip_address> <port>
@@ -175,16 +171,16 @@ class InterActTerminal(cmd.Cmd):
             print("Usage: add_manual <device_name> <ip_address> <port>")
             return
         device_name, ip_address, port = parts
-        device_info = self.curr_device.get_contacts_by_name(device_name)
-        if device_info.empty:
-            device_reachable = self.radar.verify(device_name, ip_address, int(port))
-            if device_reachable:
-                self.curr_device.add_manually(device_name, ip_address, port)
-                print(f"Device '{colored(device_name, 'blue')}' added to contacts.")
-        else:
+        result = self.call('add_contact', name=device_name, ip_address=ip_address, port=int(port))
+        if result is None:
+            return
+        if result['existed']:
             print(f"Device '{colored(device_name, 'blue')}' already exists in contacts.")
-            self.curr_device.update_contacts_status(ip_address, status='online', port=int(port), name=device_name)
-    
+        elif result['added']:
+            print(f"Device '{colored(device_name, 'blue')}' added to contacts.")
+        else:
+            print(f"Device '{colored(device_name, 'blue')}' is {colored('not reachable', 'red')}. It was not added.")
+
     def do_add(self, arg):
         """
         Add a device to your contacts: add <indices>
@@ -195,8 +191,8 @@ class InterActTerminal(cmd.Cmd):
             return
         indices_str = arg.strip()
         indices = indices_str.split(' ')
-        self.radar.save_devices_as_contacts([int(i) for i in indices if i.isdigit()])
-    
+        self.call('save_devices', indices=[int(i) for i in indices if i.isdigit()])
+
     def do_send(self, arg):
         """
         Send a file to a device: send <device_name> <file_path>
@@ -210,11 +206,47 @@ class InterActTerminal(cmd.Cmd):
         if not os.path.isfile(file_path):
             print(f"File '{file_path}' does not exist.")
             return
-        
-        receiver_ip, receiver_port = self.check_for_send(file_path, receiver_name)
-        if self.send_file_flag:
-            self.data_transferer.file_sharing(file_path, receiver_name, receiver_ip, receiver_port)
-    
+        job = self.call('send', receiver=receiver_name, file_path=os.path.abspath(file_path))
+        if job is not None:
+            print(f"Transfer to {colored(receiver_name, 'blue')} queued as job {colored('#' + str(job['id']), 'light_cyan')}. Use {colored('jobs', 'yellow', attrs=['underline'])} to follow it.")
+
+    def do_broadcast(self, arg):
+        """
+        Send a file to every device of a community (once per device): broadcast <community_name> <file_path>
+        """
+        parts = arg.split()
+        if len(parts) != 2:
+            print("Usage: broadcast <community_name> <file_path>")
+            return
+        community_name, file_path = parts
+
+        if not os.path.isfile(file_path):
+            print(f"File '{file_path}' does not exist.")
+            return
+        job = self.call('broadcast', community=community_name, file_path=os.path.abspath(file_path))
+        if job is not None:
+            print(f"Broadcast to {colored(community_name, 'blue')} queued as job {colored('#' + str(job['id']), 'light_cyan')}. Use {colored('jobs', 'yellow', attrs=['underline'])} to follow it.")
+
+    def do_jobs(self, arg):
+        """
+        List the transfers queued on the daemon, or show one of them: jobs [job_id]
+        """
+        if arg.strip():
+            if not arg.strip().isdigit():
+                print("Usage: jobs [job_id]")
+                return
+            job = self.call('job', job_id=int(arg))
+            if job is not None:
+                self.print_job(job)
+                if job['type'] == 'broadcast' and job['result']:
+                    print(f"   Delivered to: {', '.join(member for member, success in job['result'].items() if success) or 'nobody'}")
+            return
+        jobs = self.call('jobs')
+        if jobs is not None and not jobs:
+            print("No transfers yet.")
+        for job in jobs or []:
+            self.print_job(job)
+
     def do_ping(self, arg):
         """
         Ping a device to check its availability: ping <device_name> <ip_address> <port>
@@ -224,8 +256,111 @@ class InterActTerminal(cmd.Cmd):
             print("Usage: ping <device_name> <ip_address> <port>")
             return
         device_name, ip_address, port = parts
-        self.radar.verify(device_name, ip_address, int(port))
-    
+        result = self.call('ping', name=device_name, ip_address=ip_address, port=int(port))
+        if result is not None:
+            print(f"Device {colored(device_name, 'blue')} is {colored('online', 'green') if result['online'] else colored('offline', 'red')}.")
+
+    def do_heartbeat(self, arg):
+        """
+        Tune or toggle the heartbeat failure detector: heartbeat [on|off] [interval_seconds] [phi_threshold]
+        """
+        parts = arg.split()
+        if parts and parts[0] == 'off':
+            if self.call('heartbeat', enabled=False) is not None:
+                print("Heartbeats stopped.")
+            return
+        try:
+            interval = float(parts[1]) if len(parts) > 1 else None
+            phi_threshold = float(parts[2]) if len(parts) > 2 else None
+        except ValueError:
+            print("Usage: heartbeat [on|off] [interval_seconds] [phi_threshold]")
+            return
+        result = self.call('heartbeat', enabled=True, interval=interval, phi_threshold=phi_threshold)
+        if result is not None:
+            print(f"Heartbeats every {colored(result['interval'], 'light_cyan')}s, failure threshold phi = {colored(result['phi_threshold'], 'light_cyan')}.")
+
+    def do_sync(self, arg):
+        """
+        Sync groups, communities and contacts with a device right away: sync <device_name> [ip_address]
+        """
+        parts = arg.split()
+        if not parts or len(parts) > 2:
+            print("Usage: sync <device_name> [ip_address]")
+            return
+        device_name = parts[0]
+        result = self.call('sync', name=device_name, ip_address=parts[1] if len(parts) == 2 else None)
+        if result is None:
+            return
+        if result['in_sync']:
+            print(f"Already in sync with {colored(device_name, 'blue')}.")
+        else:
+            print(f"Synced with {colored(device_name, 'blue')}: {colored(result['received'], 'green')} change(s) received, {colored(result['sent'], 'green')} sent.")
+
+    def do_stats(self, arg):
+        """
+        Show the metrics of your device: transfers, connections, discovery, verification latency and CSV writes.
+        """
+        stats = self.call('stats')
+        if stats is None:
+            return
+
+        def samples(name):
+            return stats.get(name, {'samples': []})['samples']
+
+        def total(name, **labels):
+            return sum(sample['value'] for sample in samples(name) if all(sample['labels'].get(key) == value for key, value in labels.items()))
+
+        def size(num_bytes):
+            for unit in ('B', 'KB', 'MB', 'GB'):
+                if num_bytes < 1024 or unit == 'GB':
+                    return f"{num_bytes:.1f} {unit}"
+                num_bytes /= 1024
+
+        minutes = max(stats['uptime_seconds'] / 60, 1e-9)
+        print(f"Metrics of the last {colored(f'{minutes:.1f}', 'light_cyan')} minute(s):")
+        for direction in ('sent', 'received'):
+            print(f" - {direction.capitalize()}: {colored(size(total('transfer_bytes_total', direction=direction)), 'light_yellow')} in "
+                  f"{colored(total('transfers_total', direction=direction, result='complete'), 'green')} complete and "
+                  f"{colored(total('transfers_total', direction=direction, result='incomplete'), 'red')} incomplete transfer(s)")
+        print(f" - Not transferred because the receiver had the content: {colored(size(total('transfer_bytes_deduplicated_total', direction='sent')), 'green')} sent, "
+              f"{colored(size(total('transfer_bytes_deduplicated_total', direction='received')), 'green')} received")
+        print(f" - Active connections: {colored(total('active_connections', direction='sent'), 'light_cyan')} sending, "
+              f"{colored(total('active_connections', direction='received'), 'light_cyan')} receiving "
+              f"({colored(total('receive_threads'), 'light_cyan')} receive thread(s))")
+        for sample in samples('transfer_rate_bytes_per_second'):
+            labels = sample['labels']
+            print(f"   {labels['direction']} '{colored(labels['file'], 'yellow')}' {'to' if labels['direction'] == 'sent' else 'from'} {colored(labels['peer'], 'blue')}: {colored(size(sample['value']) + '/s', 'light_yellow')}")
+        added, removed = total('discovery_events_total', event='added'), total('discovery_events_total', event='removed')
+        print(f" - Discovery events: {colored(added, 'green')} resolved, {colored(removed, 'red')} removed ({(added + removed) / minutes:.1f}/min)")
+        for sample in samples('verify_latency_seconds'):
+            latency = sample['value']
+            if latency['count']:
+                print(f" - Verify latency ({sample['labels']['result']}): {latency['count']} probe(s), mean {latency['mean'] * 1000:.1f} ms, "
+                      f"p50 {latency['p50'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms")
+        print(f" - CSV writes: " + (', '.join(f"{sample['labels']['file']} {colored(sample['value'], 'light_cyan')}" for sample in samples('csv_writes_total')) or "none"))
+        if samples('jobs'):
+            print(f" - Jobs: " + ', '.join(f"{colored(sample['value'], 'light_cyan')} {sample['labels']['status']}" for sample in samples('jobs')))
+
+    def do_profile(self, arg):
+        """
+        Profile transfers and discovery, writing the results under Data/profiles when switched off: profile [on|off]
+        """
+        arg = arg.strip().lower()
+        if arg not in ('', 'on', 'off'):
+            print("Usage: profile [on|off]")
+            return
+        status = self.call('profile', enabled={'on': True, 'off': False}.get(arg))
+        if status is None:
+            return
+        if status['report']:
+            print(f"Profile written to {colored(status['report'], 'cyan')}.")
+        if status['profiling']:
+            print(f"Profiling {colored('on', 'green')} since {status['since']}: {status['samples']} sample(s) so far.")
+            for stage, calls in status['calls'].items():
+                print(f" - {colored(stage, 'blue')}: {calls} call(s)")
+        elif not status['report']:
+            print(f"Profiling is {colored('off', 'red')}. Use {colored('profile on', 'yellow', attrs=['underline'])} or set {colored('INTERACT_PROFILE=1', 'yellow')} to switch it on.")
+
     def do_clear(self, arg):
         """
         Clear the terminal screen.
@@ -234,11 +369,15 @@ class InterActTerminal(cmd.Cmd):
 
     def do_exit(self, arg):
         """
-        Exit the terminal
+        Exit the terminal. A daemon started by this terminal is shut down; a separately started one keeps running.
         """
-        self.do_stop_announce(arg='')
+        self.client.close()
+        if self.daemon is not None:
+            self.daemon.stop()
+        else:
+            print(f"The {colored('InterAct daemon', 'magenta')} keeps running in the background.")
         print("Goodbye!")
         return True
-    
+
 if __name__ == "__main__":
     InterActTerminal().cmdloop()
@@ -0,0 +1,60 @@
+import os
+import sys
+import socket
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user import User
+from devices import Radar
+from data_sharing import DataSharing
+from group import GroupStore
+
+class Device(object):
+    """
+    A device of the tests: the `User`, `Radar` and `DataSharing` of one data directory, with nothing started.
+    """
+    def __init__(self, root_dir:str, name:str, groups:bool=False):
+        self.root_dir = str(root_dir)
+        self.user = User(root_usr_dir=self.root_dir)
+        self.user.update_user(name=name, ip_address='127.0.0.1', file_transfer_port=0)
+        self.radar = Radar(root_usr_dir=self.root_dir, curr_device=self.user)
+        self.group_store = GroupStore(root_grp_dir=self.root_dir, user_class=self.user) if groups else None
+        self.data_sharing = DataSharing(root_usr_dir=self.root_dir, curr_device=self.user, radar=self.radar, group_store=self.group_store)
+
+    def serve_once(self):
+        """
+        Accepts one connection on a free loopback port in the background.
+
+        Returns:
+            tuple: The port and the thread receiving the file.
+        """
+        server = socket.create_server(('127.0.0.1', 0))
+
+        def receive():
+            with server:
+                sock, address = server.accept()
+                self.data_sharing.file_receiving(sock, address)
+        thread = threading.Thread(target=receive, daemon=True)
+        thread.start()
+        return server.getsockname()[1], thread
+
+@pytest.fixture
+def make_device(tmp_path):
+    def make(name:str, groups:bool=False):
+        return Device(tmp_path / name, name, groups=groups)
+    return make
+
+def send_plaintext(port:int, metadata:bytes, data:bytes=b'', reply:bool=False):
+    """
+    Sends a file the way devices from before encryption do, and returns what the receiver answered.
+    """
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(metadata + data)
+        sock.shutdown(socket.SHUT_WR)
+        answer = b''
+        while chunk := sock.recv(4096):
+            answer += chunk
+        return answer
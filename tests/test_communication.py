@@ -0,0 +1,149 @@
+import socket
+import threading
+
+import pytest
+
+from communication import GossipSync
+
+def gossip(device, port=0):
+    return GossipSync(device.root_dir, device.user, device.radar, device.group_store, device.data_sharing.transport, sync_port=port)
+
+def serve_once(sync):
+    """
+    Answers one reconciliation on a free loopback port, which becomes the sync port of the devices.
+    """
+    server = socket.create_server(('127.0.0.1', 0))
+
+    def serve():
+        with server:
+            sock, address = server.accept()
+            sync._serve(sock, address)
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return server.getsockname()[1], thread
+
+def befriend(first, second):
+    """
+    Makes two devices contacts of each other with their identities pinned.
+    """
+    first.user.add_manually(second.user.name, '127.0.0.1', 9000)
+    first.user.pin_public_key(second.user.name, second.data_sharing.transport.public_key)
+    second.user.add_manually(first.user.name, '127.0.0.1', 9000)
+    second.user.pin_public_key(first.user.name, first.data_sharing.transport.public_key)
+
+def test_trusted_devices_converge(make_device):
+    alice, bob = make_device('Alice', groups=True), make_device('Bob', groups=True)
+    befriend(alice, bob)
+    alice.group_store.create_group('Friends', description='close ones')
+    alice.group_store.add_members('Friends', ['Alice', 'Bob', 'Carol'])
+    alice.group_store.set_roles('Friends', {'Alice': 'admin'})
+
+    port, thread = serve_once(gossip(alice))
+    result = gossip(bob, port).sync_with('Alice', '127.0.0.1')
+    thread.join(5)
+    assert result['received'] >= 1
+    assert bob.group_store.get_members('Friends') == ['Alice', 'Bob', 'Carol']
+
+    port, thread = serve_once(gossip(alice))
+    assert gossip(bob, port).sync_with('Alice', '127.0.0.1')['in_sync']
+    thread.join(5)
+
+def test_untrusted_device_can_neither_push_nor_pull(make_device):
+    alice, mallory = make_device('Alice', groups=True), make_device('Mallory', groups=True)
+    mallory.user.add_manually('Alice', '127.0.0.1', 9000)
+    mallory.user.pin_public_key('Alice', alice.data_sharing.transport.public_key)
+    mallory.group_store.create_group('Takeover')
+    mallory.group_store.add_members('Takeover', ['Alice'])
+
+    port, thread = serve_once(gossip(alice))
+    with pytest.raises((ConnectionError, OSError, ValueError)):
+        gossip(mallory, port).sync_with('Alice', '127.0.0.1')
+    thread.join(5)
+    assert alice.group_store.get_group('Takeover') is None
+
+    state = gossip(alice).state
+    entries = {'group:Takeover': [[100, 'Mallory'], mallory.group_store.export_group('Takeover')]}
+    assert state.apply(entries, 'Mallory') == 0
+    assert alice.group_store.get_group('Takeover') is None
+
+def test_gossip_never_moves_a_pinned_contact(make_device):
+    alice, bob = make_device('Alice', groups=True), make_device('Bob', groups=True)
+    befriend(alice, bob)
+    alice.user.add_manually('Carol', '10.0.0.3', 9000)
+    alice.user.pin_public_key('Carol', 'cd' * 32)
+    alice.user.add_manually('Dave', '10.0.0.4', 9000)
+
+    state = gossip(alice).state
+    state.refresh()
+    applied = state.apply({'contact:Carol': [[100, 'Bob'], {'ip_address': '10.6.6.6', 'port': 6666}],
+                           'contact:Dave': [[100, 'Bob'], {'ip_address': '10.0.0.44', 'port': 9001}]}, 'Bob')
+    assert applied == 1
+    assert alice.user.get_contacts_by_name('Carol')['ip_address'].values[0] == '10.0.0.3'
+    assert alice.user.get_contacts_by_name('Dave')['ip_address'].values[0] == '10.0.0.44'
+    assert state.versions['contact:Carol'][:2] == [100, 'Bob'] # acknowledged, so it is not asked for again
+    state.refresh()
+    assert state.versions['contact:Carol'][:2] == [100, 'Bob']
+
+def shared_group(device):
+    """
+    Gives a device the group `Friends`, run by Alice, with Bob as a member and Victor as a viewer.
+    """
+    store = device.group_store
+    store.create_group('Friends')
+    store.add_members('Friends', ['Alice', 'Bob', 'Victor', device.user.name])
+    store.set_roles('Friends', {'Alice': 'admin', 'Victor': 'viewer'})
+    store.set_datatypes('Friends', ['image'])
+    return store
+
+def takeover(store, sender):
+    group = store.export_group('Friends')
+    group['members'][sender] = 'admin'
+    group['datatypes'] = 127
+    return group
+
+def test_only_admins_may_change_a_group(make_device):
+    owner = make_device('Owner', groups=True)
+    store = shared_group(owner)
+    owner.user.add_manually('Pinned', '127.0.0.1', 9000)
+    owner.user.pin_public_key('Pinned', 'ab' * 32)
+    state = gossip(owner).state
+    state.refresh()
+    before = store.export_group('Friends')
+
+    for sender in ('Victor', 'Bob', 'Pinned'):
+        assert state.trusts(sender)
+        assert state.apply({'group:Friends': [[50, sender], takeover(store, sender)]}, sender) == 0
+        assert state.apply({'group:Friends': [[51, sender], None]}, sender) == 0
+    assert state.apply({'group:Others': [[52, 'Pinned'], dict(before, members={'Pinned': 'admin', 'Bob': 'member'})]}, 'Pinned') == 0
+    assert state.apply({'group:Others': [[53, 'Victor'], dict(before, members={'Victor': 'admin', 'Owner': 'member'})]}, 'Victor') == 0
+    assert store.export_group('Friends') == before and store.get_group('Others') is None
+
+    invitation = dict(before, members={'Pinned': 'admin', 'Owner': 'member'})
+    assert state.apply({'group:Invited': [[54, 'Pinned'], invitation]}, 'Pinned') == 1
+    assert store.export_group('Invited') == invitation
+
+    renamed = dict(before, description='renamed')
+    assert state.apply({'group:Friends': [[55, 'Alice'], renamed]}, 'Alice') == 1
+    assert store.export_group('Friends') == renamed
+
+def test_admins_may_not_change_their_own_role(make_device):
+    owner = make_device('Owner', groups=True)
+    store = shared_group(owner)
+    state = gossip(owner).state
+    state.refresh()
+
+    group = store.export_group('Friends')
+    group['members']['Alice'] = 'member'
+    assert state.apply({'group:Friends': [[50, 'Alice'], group]}, 'Alice') == 0
+    assert store.get_group('Friends')['roles']['Alice'] == 'admin'
+
+def test_versions_far_ahead_of_the_local_clock_are_rejected(make_device):
+    owner = make_device('Owner', groups=True)
+    store = shared_group(owner)
+    state = gossip(owner).state
+    state.refresh()
+
+    group = dict(store.export_group('Friends'), description='forever')
+    assert state.apply({'group:Friends': [[state.clock + state.MAX_CLOCK_STEP + 1, 'Alice'], group]}, 'Alice') == 0
+    assert state.apply({'group:Friends': [[state.clock + state.MAX_CLOCK_STEP, 'Alice'], group]}, 'Alice') == 1
+    assert store.get_group('Friends')['description'] == 'forever'
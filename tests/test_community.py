@@ -0,0 +1,81 @@
+import time
+import threading
+
+from community import Community, BroadcastPlanner
+
+def community_of(device):
+    """
+    A community of two groups sharing a member, plus a direct member, the current device and an offline member.
+    """
+    store = device.group_store
+    store.create_group('Family')
+    store.create_group('Friends')
+    store.add_members('Family', ['Mum', 'Dad', 'Owner'])
+    store.add_members('Friends', ['Dad', 'Sam', 'Gone'])
+    community = Community(store)
+    community.create_community('Close', description="Everyone close")
+    community.add_groups('Family', 'Friends')
+    community.add_members('Remote')
+    return community
+
+def test_communities_are_persisted(make_device):
+    device = make_device('Owner', groups=True)
+    community_of(device)
+
+    loaded = Community(device.group_store, name='Close')
+    assert loaded.description == "Everyone close"
+    assert loaded.groups == ['Family', 'Friends'] and loaded.members == ['Remote']
+
+def test_members_in_several_groups_appear_once(make_device):
+    community = community_of(make_device('Owner', groups=True))
+    members = community.get_members()
+
+    assert sorted(members) == ['Dad', 'Gone', 'Mum', 'Owner', 'Remote', 'Sam']
+
+def test_plan_groups_reachable_devices_by_network(make_device):
+    device = make_device('Owner', groups=True)
+    community = community_of(device)
+    device.radar.devices += [
+        {'name': 'Mum', 'ip_address': '192.168.1.10', 'addresses': ['192.168.1.10'], 'port': 9000, 'status': 'online'},
+        {'name': 'Dad', 'ip_address': '192.168.1.11', 'addresses': ['192.168.1.11'], 'port': 9000, 'status': 'online'},
+        {'name': 'Sam', 'ip_address': 'fd00::1:5', 'addresses': ['fd00::1:5'], 'port': 9000, 'status': 'online'}
+    ]
+    device.user.add_manually('Remote', '10.0.0.7', 9000, status='online')
+    device.user.add_manually('Gone', '10.0.0.8', 9000, status='offline')
+
+    plan = BroadcastPlanner(device.data_sharing).plan(community)
+    assert plan['networks'] == {
+        '192.168.1.0/24': [('Mum', '192.168.1.10', 9000), ('Dad', '192.168.1.11', 9000)],
+        'fd00::/64': [('Sam', 'fd00::1:5', 9000)],
+        '10.0.0.0/24': [('Remote', '10.0.0.7', 9000)]
+    }
+    assert plan['unreachable'] == ['Gone']
+
+def test_broadcast_delivers_once_per_device_within_the_network_limit(make_device, tmp_path):
+    device = make_device('Owner', groups=True)
+    store = device.group_store
+    store.create_group('Office')
+    store.add_members('Office', [f"Desk_{index}" for index in range(6)])
+    community = Community(store)
+    community.create_community('Work')
+    community.add_groups('Office')
+    for index in range(6):
+        device.radar.devices.append({'name': f"Desk_{index}", 'ip_address': f"192.168.1.{index + 10}", 'port': 9000, 'status': 'online'})
+
+    lock, in_flight, deliveries = threading.Lock(), [0], []
+    def file_sharing(filepath, receiver_name, receiver_ip, receiver_port):
+        with lock:
+            in_flight[0] += 1
+            deliveries.append((receiver_name, in_flight[0]))
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return receiver_name != 'Desk_5'
+    device.data_sharing.file_sharing = file_sharing
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'minutes')
+
+    results = BroadcastPlanner(device.data_sharing, max_workers=8, per_network_limit=2).broadcast(str(source), community)
+    assert sorted(name for name, _ in deliveries) == [f"Desk_{index}" for index in range(6)]
+    assert max(concurrent for _, concurrent in deliveries) <= 2
+    assert results == dict({f"Desk_{index}": True for index in range(5)}, Desk_5=False)
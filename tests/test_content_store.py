@@ -0,0 +1,84 @@
+import os
+import hashlib
+
+from content_store import ContentStore
+from conftest import send_plaintext
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = ContentStore(str(tmp_path), str(tmp_path))
+    first, second = tmp_path / "a.bin", tmp_path / "b.bin"
+    first.write_bytes(b'x' * 1000)
+    second.write_bytes(b'x' * 1000)
+    digest = hashlib.sha256(b'x' * 1000).hexdigest()
+    store.add(str(first), digest)
+    store.add(str(second), digest)
+    assert os.path.samefile(first, second)
+    assert store.lookup(digest, 1000) == store.path_of(digest)
+
+def test_lookup_rejects_anything_but_a_digest(tmp_path):
+    store = ContentStore(str(tmp_path), str(tmp_path))
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+    for offer in (str(victim), '../victim.txt', 'A' * 64, 'a' * 63, 'a' * 64 + '\n'):
+        assert store.lookup(offer, 12345) is None
+    assert victim.read_text() == "keep me"
+
+def test_lookup_never_deletes_a_stale_entry(tmp_path):
+    store = ContentStore(str(tmp_path), str(tmp_path))
+    digest = hashlib.sha256(b'original').hexdigest()
+    stored = store.path_of(digest)
+    os.makedirs(os.path.dirname(stored))
+    with open(stored, 'wb') as f:
+        f.write(b'modified')
+    assert store.lookup(digest, len(b'modified')) is None
+    assert os.path.exists(stored)
+
+def test_plaintext_offer_is_not_answered(make_device):
+    receiver = make_device('Receiver')
+    received = receiver.data_sharing.received_files_dir
+    data = b'secret content'
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(received, 'Someone', 'known.txt')
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+    receiver.data_sharing.content_store.add(path, digest)
+
+    port, thread = receiver.serve_once()
+    answer = send_plaintext(port, f"probe.txt|{len(data)}|Prober|offer={digest}\n".encode('utf-8'), data)
+    thread.join(5)
+    assert b'HAVE' not in answer
+
+def test_sender_name_cannot_leave_its_directory(make_device, tmp_path):
+    receiver = make_device('Receiver')
+    received = receiver.data_sharing.received_files_dir
+    for sender_name in ('..', '../.store/ab', '.store', '../../outside'):
+        port, thread = receiver.serve_once()
+        send_plaintext(port, f"evil.txt|4|{sender_name}\n".encode('utf-8'), b'evil')
+        thread.join(5)
+    written = [os.path.join(root, name) for root, _, names in os.walk(receiver.root_dir) for name in names if name == 'evil.txt']
+    assert written
+    for path in written:
+        assert os.path.dirname(os.path.dirname(path)) == received
+        assert os.path.basename(os.path.dirname(path)) != ContentStore.DIRNAME
+    assert not (tmp_path / 'outside').exists()
+
+def test_file_name_is_reduced_to_one_component(make_device):
+    receiver = make_device('Receiver')
+    port, thread = receiver.serve_once()
+    send_plaintext(port, b"../../escape.txt|4|Sender\n", b'data')
+    thread.join(5)
+    assert not os.path.exists(os.path.join(receiver.root_dir, 'escape.txt'))
+    assert not os.path.exists(os.path.join(receiver.data_sharing.received_files_dir, 'escape.txt'))
+
+def test_authenticated_resend_is_deduplicated(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    source = tmp_path / 'photo.jpg'
+    source.write_bytes(os.urandom(200 * 1024))
+    for _ in range(2):
+        port, thread = receiver.serve_once()
+        assert sender.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.1', port)
+        thread.join(5)
+    received = os.path.join(receiver.data_sharing.received_files_dir, 'Sender', 'photo.jpg')
+    assert open(received, 'rb').read() == source.read_bytes()
+    assert sender.data_sharing.bytes_deduplicated.value(direction='sent') == source.stat().st_size
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from daemon import InterActDaemon, DaemonClient, DaemonError
+from community import Community
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = InterActDaemon(root_dir=str(tmp_path), name="Headless", metrics_port=None)
+    yield daemon
+    daemon.executor.shutdown(wait=False)
+
+def request(daemon, method, **params):
+    return daemon.handle({'jsonrpc': '2.0', 'id': 7, 'method': method, 'params': dict(params, token=daemon.token)})
+
+def test_requests_need_the_token(daemon):
+    response = daemon.handle({'jsonrpc': '2.0', 'id': 1, 'method': 'status', 'params': {'token': 'guess'}})
+    assert response['error']['code'] == -32001
+
+def test_unknown_methods_and_bad_params_are_rejected(daemon):
+    assert request(daemon, 'format_disk')['error']['code'] == -32601
+    assert request(daemon, 'status', verbose=True)['error']['code'] == -32602
+
+def test_failed_checks_are_reported_as_errors(daemon):
+    response = request(daemon, 'sync', name="Nobody")
+    assert response['id'] == 7
+    assert response['error']['code'] == -32000
+    assert "Nobody" in response['error']['message']
+
+def test_unexpected_exceptions_are_internal_errors(daemon):
+    daemon.methods['broken'] = lambda: {}['missing']
+    response = request(daemon, 'broken')
+    assert response['error']['code'] == -32603
+    assert "KeyError" in response['error']['message']
+
+def test_a_failing_call_does_not_drop_the_client(daemon):
+    daemon.methods['broken'] = lambda: None.name
+    daemon._bind()
+    daemon.is_running.set()
+    threading.Thread(target=daemon.serve, daemon=True).start()
+    client = DaemonClient(daemon.root_dir, timeout=5)
+    try:
+        with pytest.raises(DaemonError, match="Internal error"):
+            client.call('broken')
+        assert client.call('status')['name'] == "Headless"
+    finally:
+        client.close()
+        daemon.is_running.clear()
+        daemon.rpc_socket.close()
+
+def wait_for(daemon, job):
+    daemon.executor.shutdown(wait=True)
+    return daemon.get_job(job['id'])
+
+def community_of(daemon, members):
+    daemon.group_store.create_group('Family')
+    daemon.group_store.add_members('Family', list(members))
+    for name, status in members.items():
+        daemon.curr_device.add_manually(name, '127.0.0.2', 9000, status=status)
+    community = Community(daemon.group_store)
+    community.create_community('Home')
+    community.add_groups('Family')
+
+def test_a_broadcast_nobody_received_is_failed(daemon, tmp_path):
+    community_of(daemon, {'Mum': 'offline', 'Dad': 'offline'})
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'minutes')
+
+    job = wait_for(daemon, daemon.broadcast('Home', str(source)))
+    assert job['result'] == {'Mum': False, 'Dad': False}
+    assert job['status'] == 'failed'
+
+def test_a_broadcast_some_members_received_is_partial(daemon, tmp_path):
+    community_of(daemon, {'Mum': 'online', 'Dad': 'offline'})
+    daemon.data_transferer.file_sharing = lambda filepath, receiver_name, receiver_ip, receiver_port: True
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'minutes')
+
+    job = wait_for(daemon, daemon.broadcast('Home', str(source)))
+    assert job['result'] == {'Mum': True, 'Dad': False}
+    assert job['status'] == 'partial'
+    assert InterActDaemon._job_status({'Mum': True}) == 'done' and InterActDaemon._job_status({}) == 'failed'
@@ -0,0 +1,93 @@
+import time
+import socket
+import types
+import threading
+
+from zeroconf import ServiceInfo, DNSService, DNSText, DNSAddress
+from zeroconf._cache import DNSCache
+from zeroconf.const import _TYPE_SRV, _TYPE_TXT, _TYPE_A, _CLASS_IN
+
+from devices import Radar
+
+SERVICE_TYPE = "_interact._tcp.local."
+
+def cached_service(radar, name:str, srv_ttl:int, txt_ttl:int, address_ttl:int):
+    """
+    Puts the records of a resolved service in a zeroconf cache used by the radar, and returns its `ServiceInfo`.
+    """
+    service_name = f"{name}.{SERVICE_TYPE}"
+    server = f"{name}.local."
+    cache = DNSCache()
+    cache.async_add_records([
+        DNSService(service_name, _TYPE_SRV, _CLASS_IN, srv_ttl, 0, 0, 12345, server),
+        DNSText(service_name, _TYPE_TXT, _CLASS_IN, txt_ttl, b'\x00'),
+        DNSAddress(server, _TYPE_A, _CLASS_IN, address_ttl, socket.inet_aton('127.0.0.1'))
+    ])
+    radar.aiozc = types.SimpleNamespace(zeroconf=types.SimpleNamespace(cache=cache))
+    return ServiceInfo(SERVICE_TYPE, service_name, port=12345, addresses=[socket.inet_aton('127.0.0.1')], server=server)
+
+def test_cached_services_expire_with_their_first_announced_record(make_device):
+    radar = make_device("Observer").radar
+    info = cached_service(radar, "Peer", srv_ttl=4500, txt_ttl=4500, address_ttl=30)
+
+    remaining = radar._cache_expiry(info) - time.monotonic()
+    assert 25 < remaining <= 30
+
+def test_ttls_are_not_taken_from_the_service_info_defaults(make_device):
+    radar = make_device("Observer").radar
+    info = cached_service(radar, "Peer", srv_ttl=600, txt_ttl=900, address_ttl=900)
+
+    assert (info.host_ttl, info.other_ttl) == (120, 4500)
+    assert 590 < radar._cache_expiry(info) - time.monotonic() <= 600
+
+def test_services_without_cached_records_are_resolved_again(make_device):
+    radar = make_device("Observer").radar
+    cached_service(radar, "Peer", srv_ttl=600, txt_ttl=600, address_ttl=600)
+    other = ServiceInfo(SERVICE_TYPE, f"Other.{SERVICE_TYPE}", port=1, server="Other.local.")
+
+    assert radar._cache_expiry(other) <= time.monotonic()
+
+def test_peers_are_cached_across_sessions_until_they_expire(make_device):
+    device = make_device("Observer")
+    radar = device.radar
+    radar.remember_peer("Fresh", '127.0.0.1', 40001, save=False)
+    radar.remember_peer("Stale", '127.0.0.1', 40002, save=False)
+    radar.remember_peer("Observer", '127.0.0.1', 40003, save=False)
+    radar.peers["Stale"]['expires'] = time.time() - 1
+    radar.save_peers(force=True)
+
+    reloaded = Radar(root_usr_dir=device.root_dir, curr_device=device.user)
+    assert set(reloaded.load_peers()) == {"Fresh"}
+
+def test_warm_start_lists_cached_peers_right_away(make_device):
+    device = make_device("Observer")
+    device.radar.remember_peer("Fresh", '127.0.0.1', 40001)
+    device.radar.save_peers(force=True)
+
+    reloaded = Radar(root_usr_dir=device.root_dir, curr_device=device.user)
+    reloaded.verify_many = lambda targets, verbose=True: None # no revalidation over the network
+    reloaded.warm_start()
+    assert [(peer['name'], peer['port'], peer['status']) for peer in reloaded.devices] == [("Fresh", 40001, 'online')]
+    assert set(reloaded.peers) == {"Fresh"}
+
+def test_peers_can_be_remembered_from_many_threads(make_device):
+    radar = make_device("Observer").radar
+    errors = []
+
+    def remember(worker):
+        try:
+            for i in range(200):
+                radar.remember_peer(f"Peer_{worker}_{i}", '127.0.0.1', 40000 + i, save=False)
+                if i % 20 == 0:
+                    radar.save_peers(force=True)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=remember, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    radar.save_peers(force=True)
+    assert len(radar.load_peers()) == 8 * 200
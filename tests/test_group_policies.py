@@ -0,0 +1,90 @@
+import os
+
+from group import GroupStore
+from community import Community, BroadcastPlanner
+
+def test_permissions_compile_to_masks(tmp_path, make_device):
+    store = make_device('Device', groups=True).group_store
+    store.create_group('Family')
+    store.add_members('Family', ['Mum', 'Kid'])
+    store.set_roles('Family', {'Kid': 'viewer'})
+    store.set_member_permissions('Family', {'Mum': ['image', 'document']})
+    assert store.allows('Mum', 'photo.JPG') and store.allows('Mum', 'notes.pdf')
+    assert not store.allows('Mum', 'movie.mp4')
+    assert not store.allows('Kid', 'photo.jpg')
+
+def test_devices_in_no_group_may_still_send_once_groups_exist(make_device):
+    store = make_device('Device', groups=True).group_store
+    assert store.allows('Stranger', 'photo.jpg') # no policies yet
+    store.create_group('Family')
+    store.add_members('Family', ['Kid'])
+    store.set_roles('Family', {'Kid': 'viewer'})
+    assert store.allows('Stranger', 'photo.jpg') and store.allows('Stranger', 'movie.mp4')
+    assert not store.allows('Kid', 'photo.jpg')
+
+def test_devices_in_no_group_can_be_denied_everything(make_device):
+    device = make_device('Device')
+    store = GroupStore(device.root_dir, user_class=device.user, default_datatypes=[])
+    assert store.allows('Stranger', 'photo.jpg') # no policies yet
+    store.create_group('Family')
+    assert not store.allows('Stranger', 'photo.jpg') and not store.allows('Stranger', 'notes.txt')
+
+def test_a_device_in_no_group_can_send_to_a_device_with_groups(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver', groups=True)
+    receiver.group_store.create_group('Family')
+    receiver.group_store.add_members('Family', ['Mum'])
+    photo = tmp_path / 'photo.jpg'
+    photo.write_bytes(os.urandom(1024))
+
+    port, thread = receiver.serve_once()
+    assert sender.data_sharing.file_sharing(str(photo), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+    assert os.listdir(os.path.join(receiver.data_sharing.received_files_dir, 'Sender')) == ['photo.jpg']
+
+def test_default_datatypes_are_configurable(make_device):
+    device = make_device('Device')
+    store = GroupStore(device.root_dir, user_class=device.user, default_datatypes=['document'])
+    store.create_group('Family')
+    assert store.allows('Stranger', 'notes.txt')
+    assert not store.allows('Stranger', 'photo.jpg')
+
+def test_rejected_file_is_reported_to_the_sender(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver', groups=True)
+    receiver.group_store.create_group('Work')
+    receiver.group_store.add_members('Work', ['Sender'])
+    receiver.group_store.set_member_permissions('Work', {'Sender': ['document']})
+    photo, notes = tmp_path / 'photo.jpg', tmp_path / 'notes.txt'
+    photo.write_bytes(os.urandom(1024))
+    notes.write_bytes(b'minutes')
+
+    port, thread = receiver.serve_once()
+    assert not sender.data_sharing.file_sharing(str(photo), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+    port, thread = receiver.serve_once()
+    assert sender.data_sharing.file_sharing(str(notes), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+    folder = os.path.join(receiver.data_sharing.received_files_dir, 'Sender')
+    assert os.listdir(folder) == ['notes.txt']
+    assert sender.data_sharing.transfers_finished.value(direction='sent', result='incomplete') == 1
+
+def test_broadcast_counts_only_accepted_deliveries(make_device, tmp_path):
+    sender = make_device('Sender', groups=True)
+    friend, picky = make_device('Friend'), make_device('Picky', groups=True)
+    picky.group_store.default_mask = 0 # devices in no group may send nothing
+    picky.group_store.create_group('Closed')
+    friend_port, friend_thread = friend.serve_once()
+    picky_port, picky_thread = picky.serve_once()
+    sender.user.add_manually('Friend', '127.0.0.1', friend_port, status='online')
+    sender.user.add_manually('Picky', '127.0.0.1', picky_port, status='online')
+    sender.group_store.create_group('Everyone')
+    sender.group_store.add_members('Everyone', ['Friend', 'Picky'])
+    community = Community(sender.group_store)
+    community.create_community('Town')
+    community.add_groups('Everyone')
+
+    source = tmp_path / 'flyer.pdf'
+    source.write_bytes(b'%PDF' + os.urandom(512))
+    results = BroadcastPlanner(sender.data_sharing).broadcast(str(source), community)
+    friend_thread.join(5)
+    picky_thread.join(5)
+    assert results == {'Friend': True, 'Picky': False}
@@ -0,0 +1,92 @@
+import json
+
+from group import GroupStore, Group, datatype_mask
+
+def test_changes_survive_a_restart_through_the_journal(make_device):
+    device = make_device("Owner", groups=True)
+    store = device.group_store
+    store.create_group("Friends", description="Close ones", max_num_members=5)
+    store.add_members("Friends", ["Alice", "Bob"])
+    store.set_roles("Friends", {"Alice": "admin"})
+    store.set_datatypes("Friends", ["image"])
+
+    with open(store.journal_file, encoding='utf-8') as f:
+        assert len(f.readlines()) == 4
+    reloaded = GroupStore(root_grp_dir=device.root_dir, user_class=device.user)
+    assert reloaded.get_group("Friends") == store.get_group("Friends")
+    assert reloaded.journal_entries == 4
+    assert reloaded.allows("Bob", "photo.jpg") and not reloaded.allows("Bob", "notes.txt")
+
+def test_compaction_rewrites_the_snapshot_and_empties_the_journal(make_device):
+    device = make_device("Owner")
+    store = GroupStore(root_grp_dir=device.root_dir, user_class=device.user, compact_after=3)
+    store.create_group("Friends")
+    store.add_members("Friends", ["Alice"])
+    store.add_members("Friends", ["Bob"])
+
+    assert store.journal_entries == 0
+    with open(store.journal_file, encoding='utf-8') as f:
+        assert f.read() == ''
+    reloaded = GroupStore(root_grp_dir=device.root_dir, user_class=device.user)
+    assert set(reloaded.get_members("Friends")) == {"Alice", "Bob"}
+
+def test_a_torn_journal_line_is_ignored(make_device):
+    device = make_device("Owner", groups=True)
+    device.group_store.create_group("Friends")
+    with open(device.group_store.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add_members", "gro')
+
+    reloaded = GroupStore(root_grp_dir=device.root_dir, user_class=device.user)
+    assert reloaded.get_members("Friends") == []
+
+def test_replaying_changes_to_a_compacted_away_group_does_not_fail(make_device):
+    device = make_device("Owner", groups=True)
+    store = device.group_store
+    store.create_group("Friends")
+    store.compact()
+    store.add_members("Friends", ["Alice"])
+    store.set_datatypes("Friends", ["image"])
+    store.delete_group("Friends")
+    # a crash after the snapshot is replaced but before the journal is emptied
+    with open(store.journal_file, encoding='utf-8') as f:
+        journal = f.read()
+    store.compact()
+    with open(store.journal_file, 'w', encoding='utf-8') as f:
+        f.write(journal)
+
+    reloaded = GroupStore(root_grp_dir=device.root_dir, user_class=device.user)
+    assert reloaded.get_group("Friends") is None
+    assert reloaded.journal_entries == 3
+    assert reloaded.permission_masks == {}
+
+def test_default_group_ids_are_not_reused_after_a_deletion(make_device):
+    device = make_device("Owner", groups=True)
+    store = device.group_store
+    names = []
+    for _ in range(3):
+        group = Group(device.root_dir, device.root_dir, store=store)
+        group.create_group(tagline="Hi", max_num_members=5)
+        names.append(group.name)
+    assert names == ["Group_0", "Group_1", "Group_2"]
+
+    store.delete_group("Group_2")
+    store.compact()
+    reloaded = GroupStore(root_grp_dir=device.root_dir, user_class=device.user)
+    group = Group(device.root_dir, device.root_dir, store=reloaded)
+    group.create_group(tagline="Hi", max_num_members=5)
+    assert group.name == "Group_3"
+    with open(reloaded.ids_file, encoding='utf-8') as f:
+        assert json.load(f) == {'next': 4}
+
+def test_permissions_compile_over_every_group_of_a_member(make_device):
+    store = make_device("Owner", groups=True).group_store
+    store.create_group("Photos")
+    store.create_group("Docs")
+    store.add_members("Photos", ["Alice"])
+    store.add_members("Docs", ["Alice"])
+    store.set_datatypes("Photos", ["image"])
+    store.set_datatypes("Docs", ["document"])
+
+    assert store.permission_masks["Alice"] == datatype_mask(["image", "document"])
+    store.remove_members("Docs", ["Alice"])
+    assert store.permission_masks["Alice"] == datatype_mask(["image"])
@@ -0,0 +1,56 @@
+import time
+import socket
+import threading
+
+from devices import PhiAccrualDetector
+
+def test_suspicion_grows_with_silence():
+    detector = PhiAccrualDetector(first_interval=1.0)
+    start = detector.last_heartbeat
+    for beat in range(1, 11):
+        detector.heartbeat(now=start + beat)
+    last = start + 10
+
+    assert detector.phi(now=last + 0.5) < 1
+    assert detector.phi(now=last + 2) < detector.phi(now=last + 3) < detector.phi(now=last + 4)
+    assert detector.phi(now=last + 4) > 8
+
+def test_jittery_peers_are_suspected_later():
+    steady, jittery = PhiAccrualDetector(first_interval=1.0), PhiAccrualDetector(first_interval=1.0)
+    start = steady.last_heartbeat = jittery.last_heartbeat
+    moment = start
+    for beat in range(20):
+        steady.heartbeat(now=start + beat + 1)
+        moment += 0.2 if beat % 2 else 1.8
+        jittery.heartbeat(now=moment)
+
+    assert jittery.phi(now=moment + 2.5) < steady.phi(now=start + 20 + 2.5)
+
+def test_acceptable_pause_delays_suspicion():
+    strict, tolerant = PhiAccrualDetector(), PhiAccrualDetector(acceptable_pause=2.0)
+    now = strict.last_heartbeat = tolerant.last_heartbeat
+
+    assert tolerant.phi(now=now + 3) < strict.phi(now=now + 3)
+
+def test_heartbeats_keep_live_peers_online_and_catch_silent_ones(make_device):
+    observer, peer = make_device("Observer"), make_device("Peer")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe_socket:
+        probe_socket.bind(('127.0.0.1', 0))
+        observer.radar.ping_port = peer.radar.ping_port = probe_socket.getsockname()[1]
+    threading.Thread(target=peer.radar.pinger, daemon=True).start()
+    observer.user.add_manually("Peer", '127.0.0.1', 9000, status='online')
+    observer.user.add_manually("Gone", '100::1', 9000, status='online') # the IPv6 discard prefix never answers
+
+    observer.radar.start_heartbeats(interval=0.1, phi_threshold=3.0)
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            statuses = dict(zip(observer.user.contacts['name'], observer.user.contacts['status']))
+            if statuses["Gone"] == 'offline':
+                break
+            time.sleep(0.1)
+        assert statuses == {"Peer": 'online', "Gone": 'offline'}
+        assert observer.radar.is_alive("Peer") and not observer.radar.is_alive("Gone")
+        assert observer.radar.rtts["Peer"] is not None
+    finally:
+        observer.radar.stop_heartbeats()
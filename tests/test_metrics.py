@@ -0,0 +1,92 @@
+import os
+import re
+import cmd
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, MetricsServer, TransferMeter
+from terminal import InterActTerminal
+
+def test_counters_and_gauges_render_in_the_text_format():
+    registry = MetricsRegistry()
+    transfers = registry.counter('transfers_total', "Finished transfers.", ('direction', 'result'))
+    transfers.inc(direction='sent', result='complete')
+    transfers.inc(2, direction='sent', result='complete')
+    registry.gauge('peers', "Known peers.", function=lambda: 4)
+    registry.counter('files_total', "Files by name.", ('file',)).inc(file='say "hi"\n.txt')
+
+    text = registry.render()
+    assert "# HELP interact_transfers_total Finished transfers.\n# TYPE interact_transfers_total counter\n" in text
+    assert 'interact_transfers_total{direction="sent",result="complete"} 3\n' in text
+    assert "interact_peers 4\n" in text
+    assert 'interact_files_total{file="say \\"hi\\"\\n.txt"} 1\n' in text
+    assert re.search(r"^interact_uptime_seconds \d+\.\d{3}$", text, re.MULTILINE)
+
+def test_histograms_render_cumulative_buckets_and_estimate_quantiles():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert 'interact_latency_seconds_bucket{le="0.1"} 2\n' in text
+    assert 'interact_latency_seconds_bucket{le="1.0"} 3\n' in text
+    assert 'interact_latency_seconds_bucket{le="+Inf"} 4\n' in text
+    assert "interact_latency_seconds_sum 5.6\n" in text and "interact_latency_seconds_count 4\n" in text
+    assert latency.quantile(0.5) == pytest.approx(0.1)
+    assert registry.snapshot()['latency_seconds']['samples'][0]['value']['mean'] == pytest.approx(1.4)
+
+def test_metrics_are_declared_once_per_name():
+    registry = MetricsRegistry()
+    counter = registry.counter('events_total', "Events.", ('event',))
+    assert registry.counter('events_total', "Events.", ('event',)) is counter
+    with pytest.raises(AssertionError):
+        registry.gauge('events_total', "Events.", ('event',))
+    with pytest.raises(AssertionError):
+        counter.inc(-1, event='added')
+
+def test_transfer_meters_fold_bytes_in_batches():
+    registry = MetricsRegistry()
+    counter = registry.counter('transfer_bytes_total', "Bytes.", ('direction',))
+    meter = TransferMeter(counter, "Peer", "big.bin", flush_bytes=1000, direction='sent')
+    for _ in range(9):
+        meter.add(100)
+    assert counter.value(direction='sent') == 0
+    meter.add(100)
+    meter.add(50)
+    assert counter.value(direction='sent') == 1000
+    meter.flush()
+    assert counter.value(direction='sent') == 1050 and meter.bytes == 1050
+
+def test_the_server_only_serves_metrics():
+    registry = MetricsRegistry()
+    registry.counter('events_total', "Events.").inc()
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert b"interact_events_total 1\n" in response.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/", timeout=5)
+    finally:
+        server.stop()
+
+def test_transfers_show_up_in_the_stats_command(make_device, tmp_path, capsys):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    port, thread = receiver.serve_once()
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(os.urandom(64 * 1024))
+    assert sender.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+
+    terminal = InterActTerminal.__new__(InterActTerminal) # without connecting to a daemon
+    cmd.Cmd.__init__(terminal)
+    terminal.call = lambda method, **params: sender.user.metrics.snapshot()
+    capsys.readouterr()
+    terminal.do_stats('')
+    output = re.sub(r'\x1b\[[0-9;]*m', '', capsys.readouterr().out)
+    assert " - Sent: 64.0 KB in 1 complete and 0 incomplete transfer(s)" in output
+    assert " - Active connections: 0 sending, 0 receiving" in output
@@ -0,0 +1,131 @@
+import os
+import time
+import socket
+import threading
+
+import pytest
+from tqdm import tqdm
+
+from devices import Radar, LinkEstimate
+
+def test_ipv4_mapped_addresses_are_normalized():
+    assert Radar.normalize_address('::ffff:192.168.1.7') == '192.168.1.7'
+    assert Radar.normalize_address('192.168.1.7') == '192.168.1.7'
+    assert Radar.normalize_address('fe80::1') == 'fe80::1'
+    assert Radar.normalize_address('not an address') == 'not an address'
+
+def test_passive_estimates_reach_the_ranking(make_device):
+    radar = make_device('Device').radar
+    radar.record_throughput('::ffff:10.0.0.2', 10 * 1024 * 1024, 0.1) # fast path, seen through a dual-stack server
+    radar.record_throughput('10.0.0.3', 10 * 1024 * 1024, 10.0)
+    assert '10.0.0.2' in radar.links and '::ffff:10.0.0.2' not in radar.links
+    assert radar._rank_paths(['10.0.0.3', '10.0.0.2']) == ['10.0.0.2', '10.0.0.3']
+
+def test_small_transfers_do_not_count(make_device):
+    radar = make_device('Device').radar
+    radar.record_throughput('10.0.0.2', 1024, 0.001)
+    assert '10.0.0.2' not in radar.links
+
+def test_transfer_plan_sizes_chunks_from_the_bdp(make_device):
+    radar = make_device('Device').radar
+    assert radar.transfer_plan('Unknown', '10.0.0.9') == {'chunk_size': 64 * 1024}
+    radar._update_rtt('Peer', 20.0, '10.0.0.2')
+    radar.links['10.0.0.2'].add_bandwidth(1e9)
+    radar.devices.append({'name': 'Peer', 'ip_address': '10.0.0.2', 'addresses': ['10.0.0.2'], 'port': 9000, 'status': 'online'})
+    plan = radar.transfer_plan('Peer')
+    assert set(plan) == {'chunk_size'}
+    assert plan['chunk_size'] == 1024 * 1024 # 2.5MB in flight, capped
+
+@pytest.mark.skipif(not socket.has_dualstack_ipv6(), reason="needs a dual-stack socket")
+def test_received_transfer_is_recorded_under_the_ipv4_address(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    server = socket.create_server(('', 0), family=socket.AF_INET6, dualstack_ipv6=True)
+
+    def receive():
+        with server:
+            sock, address = server.accept()
+            receiver.data_sharing.file_receiving(sock, address)
+    thread = threading.Thread(target=receive, daemon=True)
+    thread.start()
+    source = tmp_path / 'big.bin'
+    source.write_bytes(os.urandom(1024 * 1024))
+    assert sender.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.1', server.getsockname()[1])
+    thread.join(5)
+    assert '127.0.0.1' in receiver.radar.links
+    assert not any(address.startswith('::ffff:') for address in receiver.radar.links)
+
+def test_paths_are_ranked_with_unmeasured_ones_last(make_device):
+    radar = make_device('Device').radar
+    radar.devices.append({'name': 'Peer', 'ip_address': '10.0.0.3', 'addresses': ['10.0.0.3', '10.0.0.2', 'fd00::2'], 'port': 9000, 'status': 'online'})
+    radar._update_rtt('Peer', 50.0, '10.0.0.3')
+    radar._update_rtt('Peer', 5.0, 'fd00::2')
+
+    assert radar.paths('Peer') == ['fd00::2', '10.0.0.3', '10.0.0.2']
+    assert radar.paths('Peer', preferred='10.0.0.9')[-1] == '10.0.0.9'
+    assert radar.paths('Stranger', preferred='10.0.0.9') == ['10.0.0.9']
+
+def test_a_dead_path_fails_over_to_the_next_address(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    port, thread = receiver.serve_once()
+    # 127.0.0.2 looks like the best path, but nothing listens there
+    sender.radar.devices.append({'name': 'Receiver', 'ip_address': '127.0.0.2', 'addresses': ['127.0.0.2', '127.0.0.1'], 'port': port, 'status': 'online'})
+    sender.radar._update_rtt('Receiver', 1.0, '127.0.0.2')
+    sender.radar._update_rtt('Receiver', 9.0, '127.0.0.1')
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(os.urandom(200 * 1024))
+
+    assert sender.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.2', port)
+    thread.join(5)
+    received = os.path.join(receiver.data_sharing.received_files_dir, 'Sender', 'notes.txt')
+    assert open(received, 'rb').read() == source.read_bytes()
+
+def test_a_resumed_transfer_continues_from_what_arrived(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    content = os.urandom(300 * 1024)
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(content)
+    partial_dir = os.path.join(receiver.data_sharing.received_files_dir, 'Sender')
+    os.makedirs(partial_dir, exist_ok=True)
+    with open(os.path.join(partial_dir, 'notes.txt'), 'wb') as f:
+        f.write(content[:100 * 1024]) # what arrived over the path that died
+    port, thread = receiver.serve_once()
+
+    progress = {'sent': 120 * 1024, 'transferred': 120 * 1024}
+    with tqdm(total=len(content), disable=True) as bar:
+        sender.data_sharing._send_file(str(source), 'notes.txt', len(content), 'Receiver', '127.0.0.1', port, progress, bar)
+    thread.join(5)
+
+    assert progress['sent'] == len(content)
+    assert progress['transferred'] == 120 * 1024 + 200 * 1024 # only the missing part went over the new path
+    assert open(os.path.join(partial_dir, 'notes.txt'), 'rb').read() == content
+
+def test_a_resume_takes_over_from_the_connection_it_replaces(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    content = os.urandom(300 * 1024)
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(content)
+    partial = os.path.join(receiver.data_sharing.received_files_dir, 'Sender', 'notes.txt')
+
+    port, stale_thread = receiver.serve_once()
+    stale = sender.data_sharing._connect('Receiver', '127.0.0.1', port)
+    stale.sendall(f"notes.txt|{len(content)}|Sender\n".encode('utf-8') + content[:100 * 1024])
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not receiver.data_sharing.receiving:
+        time.sleep(0.01)
+    time.sleep(0.1) # the path dies here, leaving the receive waiting for more data
+
+    port, thread = receiver.serve_once()
+    progress = {'sent': 100 * 1024, 'transferred': 100 * 1024}
+    start = time.monotonic()
+    try:
+        with tqdm(total=len(content), disable=True) as bar:
+            sender.data_sharing._send_file(str(source), 'notes.txt', len(content), 'Receiver', '127.0.0.1', port, progress, bar)
+        thread.join(5)
+        stale_thread.join(5)
+    finally:
+        stale.close()
+
+    assert time.monotonic() - start < receiver.data_sharing.RECEIVE_TIMEOUT / 2 # the stale receive was cut off, not waited out
+    assert not stale_thread.is_alive() and receiver.data_sharing.receiving == {}
+    assert progress['transferred'] == 100 * 1024 + 200 * 1024
+    assert open(partial, 'rb').read() == content
@@ -0,0 +1,65 @@
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from devices import Radar
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe_socket:
+        probe_socket.bind(('127.0.0.1', 0))
+        return probe_socket.getsockname()[1]
+
+def start_pinger(make_device):
+    observer, peer = make_device("Observer"), make_device("Peer")
+    observer.radar.ping_port = peer.radar.ping_port = free_port()
+    threading.Thread(target=peer.radar.pinger, daemon=True).start()
+    time.sleep(0.1)
+    return observer.radar
+
+def test_udp_pings_are_echoed_with_their_nonce(make_device):
+    radar = start_pinger(make_device)
+    rtt = radar.probe('127.0.0.1', timeout=1.0)
+
+    assert rtt is not None and 0 < rtt < 500
+    assert radar.verify_latency.value(result='online')['count'] == 1
+
+def test_the_pinger_answers_a_burst_of_probes(make_device):
+    radar = start_pinger(make_device)
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        rtts = list(executor.map(lambda _: radar.probe('127.0.0.1', timeout=2.0), range(64)))
+
+    assert all(rtt is not None for rtt in rtts)
+
+def test_replies_to_other_probes_are_ignored(make_device):
+    radar = make_device("Observer").radar
+    radar.ping_port = free_port()
+    stale_server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stale_server.bind(('127.0.0.1', radar.ping_port))
+
+    def answer_with_another_nonce():
+        data, address = stale_server.recvfrom(65535)
+        magic, nonce = Radar.PING_PACKET.unpack_from(data)
+        stale_server.sendto(Radar.PING_PACKET.pack(Radar.PING_REPLY, nonce + 1), address)
+    threading.Thread(target=answer_with_another_nonce, daemon=True).start()
+    try:
+        assert radar.probe('127.0.0.1', timeout=0.5) is None
+    finally:
+        stale_server.close()
+
+def test_tcp_only_ping_servers_are_still_reachable(make_device):
+    radar = make_device("Observer").radar
+    radar.ping_port = free_port()
+    with socket.create_server(('127.0.0.1', radar.ping_port)):
+        start = time.perf_counter()
+        rtt = radar.probe('127.0.0.1', timeout=0.4)
+
+    assert rtt is not None
+    assert time.perf_counter() - start >= 0.2 # the UDP attempt gets half of the timeout first
+
+def test_rtts_are_smoothed(make_device):
+    radar = make_device("Observer").radar
+    radar._update_rtt("Peer", 10.0)
+    radar._update_rtt("Peer", 30.0)
+
+    assert radar.rtts["Peer"] == 10.0 + Radar.RTT_SMOOTHING * 20.0
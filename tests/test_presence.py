@@ -0,0 +1,80 @@
+import os
+import time
+import datetime
+
+from presence import PresenceLog
+
+HOUR = 3600
+
+def test_unchanged_statuses_are_not_written(tmp_path):
+    log = PresenceLog(str(tmp_path))
+    assert log.record("Alice", 'online', timestamp=100.0)
+    assert not log.record("Alice", 'online', timestamp=200.0)
+    assert log.record("Alice", 'offline', timestamp=300.0)
+    log.close()
+
+    assert os.path.getsize(os.path.join(log.log_dir, "segment_000000.bin")) == 2 * PresenceLog.RECORD.size
+
+def test_history_survives_a_restart_and_a_torn_record(tmp_path):
+    now = time.time()
+    log = PresenceLog(str(tmp_path))
+    log.record("Alice", 'online', timestamp=now - 2 * HOUR)
+    log.record("Bob", 'online', timestamp=now - 2 * HOUR)
+    log.record("Alice", 'offline', timestamp=now - HOUR)
+    log.close()
+    with open(os.path.join(log.log_dir, "segment_000000.bin"), 'ab') as f:
+        f.write(b'\x01\x02\x03') # a crash in the middle of a record
+
+    reopened = PresenceLog(str(tmp_path))
+    assert [status for _, status in reopened.events("Alice")] == ['online', 'offline']
+    assert [status for _, status in reopened.events("Bob")] == ['online']
+    assert os.path.getsize(os.path.join(log.log_dir, "segment_000000.bin")) == 3 * PresenceLog.RECORD.size
+    reopened.close()
+
+def test_segments_rotate_and_expire(tmp_path):
+    old = time.time() - 40 * 86400
+    log = PresenceLog(str(tmp_path), segment_size=2 * PresenceLog.RECORD.size, retention_days=30)
+    for i in range(4):
+        log.record("Alice", 'online' if i % 2 == 0 else 'offline', timestamp=old + i)
+    log.record("Alice", 'online')
+    log.close()
+    assert len(log._segments()) == 3
+
+    reopened = PresenceLog(str(tmp_path), segment_size=2 * PresenceLog.RECORD.size, retention_days=30)
+    assert len(reopened._segments()) == 1
+    assert [status for _, status in reopened.events("Alice")] == ['online']
+    reopened.close()
+
+def test_uptime_and_windows_are_clipped_to_the_range(tmp_path):
+    end = datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(hours=10)
+    log = PresenceLog(str(tmp_path))
+    log.record("Alice", 'online', timestamp=start.timestamp() - HOUR) # online since before the range
+    log.record("Alice", 'offline', timestamp=start.timestamp() + 2 * HOUR)
+    log.record("Alice", 'online', timestamp=start.timestamp() + 6 * HOUR)
+
+    assert log.online_windows("Alice", start, end) == [
+        (start.timestamp(), start.timestamp() + 2 * HOUR), (start.timestamp() + 6 * HOUR, end.timestamp())]
+    uptime, availability = log.uptime("Alice", start, end)
+    assert uptime == 6 * HOUR and abs(availability - 0.6) < 1e-9
+    assert log.uptime("Nobody", start, end) == (0, 0)
+    log.close()
+
+def test_a_clock_stepping_back_keeps_the_history_ordered(tmp_path):
+    log = PresenceLog(str(tmp_path))
+    log.record("Alice", 'online', timestamp=1000.0)
+    log.record("Alice", 'offline', timestamp=900.0)
+
+    assert [moment.timestamp() for moment, _ in log.events("Alice")] == [1000.0, 1000.0]
+    log.close()
+
+def test_user_stats_report_contact_uptime(make_device):
+    user = make_device("Owner").user
+    user.add_manually("Alice", '127.0.0.2', 9000, status='online')
+    now = time.time()
+    user.presence.record("Alice", 'online', timestamp=now - 2 * HOUR)
+    user.presence.record("Alice", 'offline', timestamp=now - HOUR)
+
+    stats = user.get_user_stats(days=1)["Alice"]
+    assert abs(stats['uptime_seconds'] - HOUR) < 1
+    assert len(stats['online_windows']) == 1
@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+
+import pytest
+
+from profiling import Profiler
+
+class Stages(object):
+    def __init__(self):
+        self.started = threading.Event()
+        self.go_on = threading.Event()
+
+    def allocate(self, size:int):
+        block = bytearray(size)
+        return len(block)
+
+    def allocate_and_wait(self, size:int):
+        block = bytearray(size)
+        del block
+        self.started.set()
+        self.go_on.wait(5)
+
+    def sleep(self, seconds:float):
+        time.sleep(seconds)
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(root_usr_dir=str(tmp_path), interval=0.001)
+    yield profiler
+    profiler.stop()
+
+def test_stages_are_timed_and_unwrapped_when_stopped(profiler):
+    stages = Stages()
+    profiler.register(stages, 'sleep')
+    profiler.start()
+    assert 'sleep' in vars(stages)
+    stages.sleep(0.05)
+    stages.sleep(0.05)
+
+    assert profiler.status()['calls'] == {'Stages.sleep': 2}
+    calls, wall, cpu, max_wall, _ = profiler.timings['Stages.sleep']
+    assert wall >= 0.1 and max_wall >= 0.05 and cpu < wall
+    report = profiler.stop()
+    assert 'sleep' not in vars(stages)
+    with open(report, encoding='utf-8') as f:
+        text = f.read()
+    assert "proc peak KB" in text and "Stages.sleep" in text
+    assert os.path.exists(report[:-len(".txt")] + ".folded")
+
+def test_samples_are_attributed_to_their_stage(profiler):
+    stages = Stages()
+    profiler.register(stages, 'sleep', stage="nap")
+    profiler.start()
+    stages.sleep(0.2)
+
+    assert profiler.status()['samples'] > 0
+    assert {stage for stage, _ in profiler.categories} == {"nap"}
+
+def test_peak_memory_covers_the_allocations_of_the_call(profiler):
+    stages = Stages()
+    profiler.register(stages, 'allocate')
+    profiler.start()
+    stages.allocate(4 * 1024 * 1024)
+
+    assert profiler.timings['Stages.allocate'][4] >= 4 * 1024 * 1024
+
+def test_a_call_starting_in_another_thread_does_not_reset_a_running_peak(profiler):
+    stages = Stages()
+    profiler.register(stages, 'allocate_and_wait')
+    profiler.register(stages, 'sleep')
+    profiler.start()
+    worker = threading.Thread(target=stages.allocate_and_wait, args=(4 * 1024 * 1024,))
+    worker.start()
+    stages.started.wait(5)
+    stages.sleep(0.01) # would reset the process-wide peak if it were the first stage
+    stages.go_on.set()
+    worker.join()
+
+    assert profiler.timings['Stages.allocate_and_wait'][4] >= 4 * 1024 * 1024
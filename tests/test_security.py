@@ -0,0 +1,90 @@
+import os
+import socket
+import time
+
+import pytest
+
+from security import SecureTransport, HandshakeError
+from conftest import send_plaintext
+
+def received_files(device):
+    root = device.data_sharing.received_files_dir
+    return sorted(os.path.relpath(os.path.join(path, name), root) for path, _, names in os.walk(root)
+                  for name in names if '.store' not in path)
+
+def test_encrypted_transfer_pins_a_device_that_is_not_a_contact(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'hello' * 1000)
+    port, thread = receiver.serve_once()
+    assert sender.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+    assert received_files(receiver) == [os.path.join('Sender', 'notes.txt')]
+    assert receiver.user.get_contacts_by_name('Sender').empty
+    assert receiver.user.get_public_key('Sender') == sender.data_sharing.transport.public_key
+    assert sender.user.get_public_key('Receiver') == receiver.data_sharing.transport.public_key
+
+def test_impostor_of_a_pinned_device_fails_the_handshake(make_device, tmp_path):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    receiver.user.pin_public_key('Sender', sender.data_sharing.transport.public_key)
+    impostor = make_device('Impostor')
+    impostor.user.update_user(name='Sender', ip_address='127.0.0.1')
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'x')
+    port, thread = receiver.serve_once()
+    assert not impostor.data_sharing.file_sharing(str(source), 'Receiver', '127.0.0.1', port)
+    thread.join(5)
+    assert received_files(receiver) == []
+
+def test_plaintext_under_a_pinned_name_is_refused(make_device):
+    sender, receiver = make_device('Sender'), make_device('Receiver')
+    receiver.user.pin_public_key('Sender', sender.data_sharing.transport.public_key)
+    port, thread = receiver.serve_once()
+    send_plaintext(port, b"spoofed.txt|4|Sender\n", b'evil')
+    thread.join(5)
+    assert received_files(receiver) == []
+
+def test_plaintext_is_filed_under_the_address_not_the_claimed_name(make_device):
+    receiver = make_device('Receiver')
+    port, thread = receiver.serve_once()
+    send_plaintext(port, b"old.txt|4|OldDevice\n", b'data')
+    thread.join(5)
+    assert received_files(receiver) == [os.path.join('Unknown_(127.0.0.1)', 'old.txt')]
+
+def test_pins_of_devices_that_are_not_contacts_persist(make_device):
+    device = make_device('Device')
+    device.user.pin_public_key('Stranger', 'ab' * 32)
+    from user import User
+    assert User(device.root_dir).get_public_key('Stranger') == 'ab' * 32
+
+def test_is_secure_gives_up_on_a_silent_peer(make_device):
+    transport = make_device('Device').data_sharing.transport
+    first, second = socket.socketpair()
+    with first, second:
+        start = time.monotonic()
+        assert not transport.is_secure(first, timeout=0.2)
+        assert time.monotonic() - start < 1
+        assert first.gettimeout() is None
+        second.sendall(SecureTransport.MAGIC)
+        assert transport.is_secure(first, timeout=0.2)
+
+def test_receiver_drops_a_silent_sender(make_device, monkeypatch):
+    receiver = make_device('Receiver')
+    monkeypatch.setattr(receiver.data_sharing, 'RECEIVE_TIMEOUT', 0.3)
+    port, thread = receiver.serve_once()
+    with socket.create_connection(('127.0.0.1', port)):
+        thread.join(5)
+        assert not thread.is_alive()
+
+def test_tampered_frame_fails_authentication(make_device):
+    from security import SecureChannel
+    first, second = socket.socketpair()
+    key_a, key_b = os.urandom(32), os.urandom(32)
+    sender, receiver = SecureChannel(first, key_a, key_b, 'B'), SecureChannel(second, key_b, key_a, 'A')
+    with sender, receiver:
+        sender.sendall(b'payload')
+        assert receiver.recv(100) == b'payload'
+        sender.send_counter = 0 # a replayed nonce
+        sender.sendall(b'replayed')
+        with pytest.raises(ConnectionError):
+            receiver.recv(100)
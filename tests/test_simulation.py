@@ -0,0 +1,44 @@
+import time
+
+from simulation import Simulation, SimulatedNetwork, SimulatedPeer
+
+def test_a_small_simulation_discovers_every_peer_and_receives_every_push():
+    simulation = Simulation(10, join_window=0.5, duration=2.0, churn_rate=3.0, push_rate=4.0, push_size=4096, seed=1)
+    try:
+        result = simulation.run()
+    finally:
+        simulation.close()
+
+    assert result['discovered'] == 10
+    assert result['discovery_p50_ms'] is not None and result['discovery_p50_ms'] <= result['discovery_max_ms']
+    assert result['failed_pushes'] == 0
+    assert result['received'] == result['pushes'] > 0
+
+def test_discovery_latency_ends_when_the_device_is_listed(make_device):
+    radar = make_device("Observer").radar
+
+    def slow_handler(info):
+        radar.devices.append({'name': info.name.split('.')[0], 'status': 'online'})
+        time.sleep(0.3) # e.g. probing and writing the contacts after the device is listed
+
+    radar.handle_service_info = slow_handler
+    network = SimulatedNetwork(radar, workers=2)
+    try:
+        network.announce(SimulatedPeer("Peer", '127.0.0.1', 9000))
+        network.drain()
+    finally:
+        network.close()
+
+    assert len(network.latencies) == 1 and network.latencies[0] < 0.2
+
+def test_peers_that_never_get_listed_have_no_latency(make_device):
+    radar = make_device("Observer").radar
+    radar.handle_service_info = lambda info: None
+    network = SimulatedNetwork(radar, workers=2)
+    try:
+        network.announce(SimulatedPeer("Peer", '127.0.0.1', 9000))
+        network.drain()
+    finally:
+        network.close()
+
+    assert network.latencies == [] and network.watched == {}
@@ -0,0 +1,54 @@
+import os
+
+from stats import StatsStore
+
+def test_counters_and_derived_rates(tmp_path):
+    store = StatsStore(str(tmp_path))
+    store.record_transfer("Alice", 'sent', 3000, 1.0)
+    store.record_transfer("Alice", 'received', 1000, 1.0)
+    store.record_transfer("Alice", 'sent', 500, 0.5, success=False)
+    store.record_discovery("Alice")
+
+    stats = store.get("Alice")
+    assert (stats['bytes_sent'], stats['bytes_received']) == (3500, 1000)
+    assert (stats['transfers_sent'], stats['transfers_received'], stats['failed_sends']) == (1, 1, 1)
+    assert stats['discoveries'] == 1
+    assert stats['avg_throughput'] == 4500 / 2.5
+    assert abs(stats['failure_rate'] - 1 / 3) < 1e-9
+    store.close()
+
+def test_each_update_rewrites_one_fixed_size_record(tmp_path):
+    store = StatsStore(str(tmp_path))
+    for name in ("Alice", "Bob", "Carol"):
+        store.record_discovery(name)
+    store.record_discovery("Bob")
+    store.close()
+
+    assert os.path.getsize(os.path.join(store.stats_dir, "counters.bin")) == 3 * StatsStore.RECORD.size
+    reopened = StatsStore(str(tmp_path))
+    assert [reopened.get(name)['discoveries'] for name in ("Alice", "Bob", "Carol")] == [1, 2, 1]
+    reopened.close()
+
+def test_group_memberships_never_go_negative(tmp_path):
+    store = StatsStore(str(tmp_path))
+    store.record_group_membership("Alice", 1)
+    store.record_group_membership("Alice", -1)
+    store.record_group_membership("Alice", -1)
+
+    assert store.get("Alice")['group_memberships'] == 0
+    store.close()
+
+def test_unknown_devices_have_empty_stats(tmp_path):
+    store = StatsStore(str(tmp_path))
+    stats = store.get("Nobody")
+    assert stats['bytes_sent'] == 0 and stats['avg_throughput'] == 0.0 and stats['failure_rate'] == 0.0
+    store.close()
+
+def test_group_changes_update_membership_counters(make_device):
+    device = make_device("Owner", groups=True)
+    device.group_store.create_group("Friends")
+    device.group_store.add_members("Friends", ["Alice", "Bob"])
+    device.group_store.remove_members("Friends", ["Bob"])
+
+    assert device.user.stats.get("Alice")['group_memberships'] == 1
+    assert device.user.stats.get("Bob")['group_memberships'] == 0
@@ -0,0 +1,52 @@
+import time
+import socket
+import threading
+
+import pytest
+
+OFFLINE_ADDRESSES = ['100::1', '100::2', '100::3', '100::4'] # the IPv6 discard prefix: probes get no answer and time out
+
+@pytest.fixture
+def observer(make_device):
+    """
+    A device whose contacts are one online device (answering pings on loopback) and four offline ones.
+    """
+    observer, peer = make_device("Observer"), make_device("Peer")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe_socket:
+        probe_socket.bind(('127.0.0.1', 0))
+        observer.radar.ping_port = peer.radar.ping_port = probe_socket.getsockname()[1]
+    threading.Thread(target=peer.radar.pinger, daemon=True).start()
+    time.sleep(0.1)
+    observer.user.add_manually("Peer", '127.0.0.1', 9000)
+    for index, ip_address in enumerate(OFFLINE_ADDRESSES):
+        observer.user.add_manually(f"Gone_{index}", ip_address, 9000, status='online')
+    return observer
+
+def test_a_sweep_takes_about_one_timeout(observer):
+    targets = [(row['name'], row['ip_address'], int(row['port'])) for _, row in observer.user.contacts.iterrows()]
+    start = time.perf_counter()
+    results = observer.radar.verify_many(targets, timeout=0.5, verbose=False)
+
+    assert time.perf_counter() - start < 0.5 * 2 # one probe after another would take 0.5s per offline contact
+    assert results[("Peer", '127.0.0.1', 9000)] is not None
+    assert all(results[(f"Gone_{index}", ip_address, 9000)] is None for index, ip_address in enumerate(OFFLINE_ADDRESSES))
+
+def test_a_sweep_writes_the_contacts_once(observer):
+    targets = [(row['name'], row['ip_address'], int(row['port'])) for _, row in observer.user.contacts.iterrows()]
+    writes = observer.user.csv_writes.value(file='users.csv')
+    observer.radar.verify_many(targets, timeout=0.5, verbose=False)
+
+    assert observer.user.csv_writes.value(file='users.csv') == writes + 1
+    statuses = dict(zip(observer.user.contacts['name'], observer.user.contacts['status']))
+    assert statuses == dict({"Peer": 'online'}, **{f"Gone_{index}": 'offline' for index in range(len(OFFLINE_ADDRESSES))})
+
+def test_batched_updates_add_unknown_contacts(make_device):
+    user = make_device("Observer").user
+    user.add_manually("Alice", '127.0.0.2', 9000)
+    user.update_contacts_status_many([
+        {'ip_address': '127.0.0.2', 'status': 'online', 'name': "Alice"},
+        {'ip_address': '127.0.0.3', 'status': 'online', 'name': "Bob", 'port': 9001}
+    ])
+
+    statuses = dict(zip(user.contacts['name'], user.contacts['status']))
+    assert statuses == {"Alice": 'online', "Bob": 'online'}
@@ -4,6 +4,11 @@ import pandas as pd
 import json
 import socket
 import datetime
+import threading
+
+from presence import PresenceLog
+from stats import StatsStore
+from metrics import MetricsRegistry
 
 class User(object):
     """
@@ -18,12 +23,24 @@ class User(object):
             root_usr_dir (str): The root directory where user data is stored.
         """
         self.root_usr_dir = root_usr_dir
+        self.lock = threading.RLock() # contacts are updated from the discovery, heartbeat and terminal threads
         if not(os.path.exists(self.root_usr_dir)):
             os.makedirs(self.root_usr_dir)
         if not(os.path.exists(self.root_usr_dir + "/users.csv")):
-            self.usr_file = pd.DataFrame(columns=['name', 'ip_address', 'port', 'self', 'status', 'last_active', 'mode']).to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+            self.usr_file = pd.DataFrame(columns=['name', 'ip_address', 'port', 'self', 'status', 'last_active', 'mode', 'public_key']).to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
     
+        self.metrics = MetricsRegistry()
+        self.csv_writes = self.metrics.counter('csv_writes_total', "Rewrites of the CSV files under the user directory.", ('file',))
         self.usr_file = pd.read_csv(os.path.join(self.root_usr_dir, "users.csv"))
+        if 'public_key' not in self.usr_file.columns: # user files from before identities were pinned
+            self.usr_file['public_key'] = None
+        self.pinned_keys_file = os.path.join(self.root_usr_dir, "keys", "pinned.json")
+        self.pinned_keys = {} # device name -> public key, for devices that are not in the user file
+        if os.path.exists(self.pinned_keys_file):
+            with open(self.pinned_keys_file, 'r', encoding='utf-8') as f:
+                self.pinned_keys = json.load(f)
+        self.presence = PresenceLog(self.root_usr_dir)
+        self.stats = StatsStore(self.root_usr_dir)
         self.make_all_offline()
         
         self.identify = self.usr_file[self.usr_file['self'] == 1]
@@ -57,14 +74,47 @@ class User(object):
             s.close()
         return ip
 
+    def get_ips(self):
+        """
+        Get all the local IP addresses (IPv4 and IPv6) of the device through which it may be reachable.
+        The address returned by `get_ip` comes first.
+        """
+        ips = [self.get_ip()]
+        try:
+            for family, _, _, _, sockaddr in socket.getaddrinfo(socket.gethostname(), None):
+                if family in (socket.AF_INET, socket.AF_INET6):
+                    ips.append(sockaddr[0])
+        except socket.gaierror:
+            pass
+        s = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) if socket.has_ipv6 else None
+        if s is not None:
+            try:
+                s.connect(('2001:db8::1', 1)) # documentation prefix, nothing is sent
+                ips.append(s.getsockname()[0])
+            except OSError:
+                pass
+            finally:
+                s.close()
+        ips = [ip for ip in dict.fromkeys(ips) if not ip.startswith('127.') and ip != '::1' and not ip.lower().startswith('fe80')]
+        return ips or ['127.0.0.1']
+
+    def save_usr_file(self):
+        """
+        Writes the user file (the account and all contacts) to disk. Every call rewrites the whole file.
+        """
+        self.usr_file.to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+        self.csv_writes.inc(file='users.csv')
+
     def make_all_offline(self):
         """
         Sets all the contacts to `offline` status in the user file. 
         """
         if not self.usr_file.empty:
+            for name in self.usr_file.loc[self.usr_file['self'] == 0, 'name']:
+                self.record_presence(name, 'offline')
             self.usr_file['status'] = 'offline'
             self.usr_file.loc[self.usr_file['self'] == 1, ['status']] = ['online']
-            self.usr_file.to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+            self.save_usr_file()
     
     def update_user(self, **kwargs):
         """
@@ -96,7 +146,7 @@ class User(object):
                 self.name, self.ip_address, self.file_transfer_port, kwargs.get('status', 'online'), datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             ]
         
-        self.usr_file.to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+        self.save_usr_file()
         self.identify = self.usr_file[self.usr_file['self'] == 1]
         self.contacts = self.usr_file[self.usr_file['self'] == 0]
     
@@ -131,22 +181,48 @@ class User(object):
             status (str): The new status to set for the contact.
             kwargs: Additional keyword arguments to update other fields (like port, last_active, etc.).
         """
-        contact_exists = self.contacts[self.contacts['ip_address'] == ip_address]
-        if contact_exists.empty:
-            self.add_manually(name=kwargs.get('name', 'Unknown'), ip_address=ip_address, port=kwargs.get('port'), mode=kwargs.get('mode', 'auto'), status=status)
-        else:
-            self.contacts.loc[self.contacts['ip_address'] == ip_address, 'status'] = status
-            if 'port' in kwargs:
-                self.contacts.loc[self.contacts['ip_address'] == ip_address, 'port'] = kwargs['port']
-            if 'last_active' in kwargs:
-                self.contacts.loc[self.contacts['ip_address'] == ip_address, 'last_active'] = kwargs['last_active']
-            else:
-                self.contacts.loc[self.contacts['ip_address'] == ip_address, 'last_active'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.usr_file = pd.concat([self.identify, self.contacts], ignore_index=True)
-            self.usr_file.to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+        self.update_contacts_status_many([dict(kwargs, ip_address=ip_address, status=status)])
 
-            self.identify = self.usr_file[self.usr_file['self'] == 1]
-            self.contacts = self.usr_file[self.usr_file['self'] == 0]
+    def update_contacts_status_many(self, updates:list):
+        """
+        Updates the status of several contacts at once, writing the user file only once for the whole batch. \\
+        Contacts that do not exist yet are added to the contact list.
+
+        Args:
+            updates (list): A list of dicts, each with `ip_address` and `status` keys and optionally
+            `name`, `port`, `last_active` and `mode`.
+        """
+        with self.lock:
+            new_contacts = []
+            changed = False
+            for update in updates:
+                ip_address, status = update['ip_address'], update['status']
+                contact_mask = self.contacts['ip_address'] == ip_address
+                contact_exists = self.contacts[contact_mask]
+                contact_name = update.get('name', contact_exists['name'].values[0] if not contact_exists.empty else 'Unknown')
+                self.record_presence(contact_name, status)
+                if contact_exists.empty:
+                    new_contacts.append(update)
+                    continue
+
+                self.contacts.loc[contact_mask, 'status'] = status
+                if 'port' in update:
+                    self.contacts.loc[contact_mask, 'port'] = update['port']
+                if 'last_active' in update:
+                    self.contacts.loc[contact_mask, 'last_active'] = update['last_active']
+                else:
+                    self.contacts.loc[contact_mask, 'last_active'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                changed = True
+
+            if changed:
+                self.usr_file = pd.concat([self.identify, self.contacts], ignore_index=True)
+                self.save_usr_file()
+
+                self.identify = self.usr_file[self.usr_file['self'] == 1]
+                self.contacts = self.usr_file[self.usr_file['self'] == 0]
+
+            for update in new_contacts:
+                self.add_manually(name=update.get('name', 'Unknown'), ip_address=update['ip_address'], port=update.get('port'), mode=update.get('mode', 'auto'), status=update['status'])
     
     def add_manually(self, name:str, ip_address:str, port:int, mode:str='manual', status:str='offline'):
         """
@@ -159,27 +235,134 @@ class User(object):
         """
         if not self.account_exists:
             raise ValueError("User account does not exist. Please create an account first.")
+        with self.lock:
+            new_contact = pd.DataFrame({
+                'name': [name],
+                'ip_address': [ip_address],
+                'port': [port],
+                'self': [0],
+                'status': [status],
+                'last_active': [datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
+                'mode': [mode]
+            })
         
-        new_contact = pd.DataFrame({
-            'name': [name],
-            'ip_address': [ip_address],
-            'port': [port],
-            'self': [0],
-            'status': [status],
-            'last_active': [datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-            'mode': [mode]
-        })
-        
-        self.usr_file = pd.concat([self.usr_file, new_contact], ignore_index=True)
-        self.usr_file.to_csv(os.path.join(self.root_usr_dir, "users.csv"), index=False)
+            self.usr_file = pd.concat([self.usr_file, new_contact], ignore_index=True)
+            self.save_usr_file()
 
-        self.contacts = self.usr_file[self.usr_file['self'] == 0]
+            self.contacts = self.usr_file[self.usr_file['self'] == 0]
+
+    def merge_contacts(self, contacts:list):
+        """
+        Adds or updates contacts learned from other devices, writing the user file only once for the whole batch. \
+        The status of existing contacts is kept; new contacts are added as `offline` until they are seen.
 
-    def get_user_stats(self):
+        Args:
+            contacts (list): A list of dicts with `name`, `ip_address` and `port` keys.
+        """
+        with self.lock:
+            new_contacts = []
+            for contact in contacts:
+                if contact['name'] == self.name:
+                    continue
+                contact_mask = self.contacts['name'] == contact['name']
+                if not contact_mask.any():
+                    new_contacts.append({
+                        'name': contact['name'],
+                        'ip_address': contact['ip_address'],
+                        'port': contact['port'],
+                        'self': 0,
+                        'status': 'offline',
+                        'last_active': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        'mode': 'auto'
+                    })
+                    continue
+                self.contacts.loc[contact_mask, 'ip_address'] = contact['ip_address']
+                self.contacts.loc[contact_mask, 'port'] = contact['port']
+
+            self.usr_file = pd.concat([self.identify, self.contacts, pd.DataFrame(new_contacts, columns=self.usr_file.columns)], ignore_index=True)
+            self.save_usr_file()
+            self.identify = self.usr_file[self.usr_file['self'] == 1]
+            self.contacts = self.usr_file[self.usr_file['self'] == 0]
+
+    def get_public_key(self, name:str):
+        """
+        Get the identity key pinned to a device.
+
+        Args:
+            name (str): The name of the device (the current device included).
+
+        Returns:
+            str: The hex-encoded public key, or None if no key has been pinned yet.
+        """
+        with self.lock:
+            keys = self.usr_file.loc[self.usr_file['name'] == name, 'public_key'].dropna()
+            return str(keys.values[0]) if not keys.empty else self.pinned_keys.get(name)
+
+    def pin_public_key(self, name:str, public_key:str):
+        """
+        Pins an identity key to a device. Devices are pinned the first time they authenticate and must present the
+        same key afterwards. The keys of contacts are kept in the user file; devices that are not contacts are pinned
+        in `keys/pinned.json`, so their names cannot be taken over either.
+
+        Args:
+            name (str): The name of the device (the current device included).
+            public_key (str): The hex-encoded public key.
+
+        Returns:
+            bool: True if the key was pinned in the user file, False if it was pinned in `keys/pinned.json`.
+        """
+        with self.lock:
+            mask = self.usr_file['name'] == name
+            if not mask.any():
+                self.pinned_keys[name] = public_key
+                os.makedirs(os.path.dirname(self.pinned_keys_file), exist_ok=True)
+                with open(self.pinned_keys_file + ".tmp", 'w', encoding='utf-8') as f:
+                    json.dump(self.pinned_keys, f)
+                os.replace(self.pinned_keys_file + ".tmp", self.pinned_keys_file)
+                return False
+            self.usr_file['public_key'] = self.usr_file['public_key'].astype(object)
+            self.usr_file.loc[mask, 'public_key'] = public_key
+            self.save_usr_file()
+            self.identify = self.usr_file[self.usr_file['self'] == 1]
+            self.contacts = self.usr_file[self.usr_file['self'] == 0]
+        return True
+
+    def record_presence(self, name:str, status:str):
+        """
+        Appends a presence change of a device to the presence log. Repeated statuses are not recorded again.
+
+        Args:
+            name (str): The name of the device.
+            status (str): The new status of the device - `online` or `offline`.
+        """
+        if status in PresenceLog.STATUS_CODES:
+            self.presence.record(name, status)
+
+    def get_user_stats(self, days:int=7):
         """
         Call to get the user statistics such as number of groups joined, number of connections, etc.
+
+        Args:
+            days (int): Number of past days to compute presence statistics over. Defaults to 7.
+
+        Returns:
+            dict: Per-contact statistics keyed by contact name - transfer counters (bytes, counts, average throughput,
+            failure rate, group memberships), uptime in seconds, availability (online fraction) and the online
+            windows as `(from, to)` datetime pairs.
         """
-        pass 
+        end = datetime.datetime.now()
+        start = end - datetime.timedelta(days=days)
+        stats = {}
+        for name in self.contacts['name']:
+            uptime, availability = self.presence.uptime(name, start, end)
+            stats[name] = self.stats.get(name)
+            stats[name].update({
+                'uptime_seconds': uptime,
+                'availability': availability,
+                'online_windows': [(datetime.datetime.fromtimestamp(from_ts), datetime.datetime.fromtimestamp(to_ts))
+                                   for from_ts, to_ts in self.presence.online_windows(name, start, end)]
+            })
+        return stats
 
     # Add more functions later
 